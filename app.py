@@ -13,18 +13,37 @@ Author: Paramvir (Vick) Gill
 File: app.py (Enhanced Version)
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from openai import OpenAI
+import httpx
 import requests
-from bs4 import BeautifulSoup
 import os
 from datetime import datetime
 import json
+import csv
+import io
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import quote_plus, urlparse
 import logging
 from dotenv import load_dotenv
-import math
+import threading
+import time
+
+from crawler import SiteCrawler, changed_and_removed
+from knowledge import KnowledgeBundle
+from llm_client import BREAKER_STATES, CircuitBreaker, LLMClient, LLMUnavailable
+from metrics import Metrics
+from page_parser import PageParser
+from product_store import ProductStore, load_products
+from prompt_builder import PromptBuilder, TokenCounter
+from query_matcher import KeywordMatcher, QueryMatcher
+from refresher import KnowledgeRefresher, RefreshJobs
+from response_cache import ResponseCache
+from search_index import estimate_tokens
+from singleflight import AsyncSingleFlight, SingleFlight, prompt_key
+from snapshot import RefreshLeader, SnapshotError, SnapshotLock, read_snapshot, read_snapshot_header, write_snapshot
+from store_locator import DEFAULT_STORES, StoreLocator, format_distance
+from vector_index import HashingEmbedder, OpenAIEmbedder, VectorIndex, fuse_hits, prune_vector_files, vectors_path
 
 # Load environment variables
 load_dotenv()
@@ -35,19 +54,150 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# OpenAI API Configuration
+# OpenAI API Configuration (the client is created once the LLM client settings below are read)
 api_key = os.getenv('OPENAI_API_KEY')
+
+# Nestlé website base URL (overridable to crawl a local copy of the site)
+BASE_URL = os.getenv('NESTLE_BASE_URL', "https://www.madewithnestle.ca").rstrip('/')
+
+# Retrieval configuration: passage size/overlap in words, context budget in tokens
+PASSAGE_WORDS = int(os.getenv('PASSAGE_WORDS', 120))
+PASSAGE_OVERLAP = int(os.getenv('PASSAGE_OVERLAP', 30))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', 400))
+
+# Retrieval mode: 'lexical' (BM25), 'dense' (embedding cosine top-k) or 'hybrid' (both, blended by HYBRID_DENSE_WEIGHT)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'lexical').lower()
+HYBRID_DENSE_WEIGHT = float(os.getenv('HYBRID_DENSE_WEIGHT', 0.5))
+
+# Passage embeddings: 'hashing' (local, deterministic, no network) or 'openai'; vector search 'exact' or 'int8'
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing').lower()
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 256))
+VECTOR_SEARCH = os.getenv('VECTOR_SEARCH', 'exact').lower()
+
+# Word runs of this length already in the prompt are dropped from later passages (0 keeps repeated boilerplate)
+PROMPT_DEDUPE_WORDS = int(os.getenv('PROMPT_DEDUPE_WORDS', 8))
+
+# Crawler configuration: concurrency, link depth, page budget and per-host rate limit
+CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', 8))
+CRAWL_MAX_DEPTH = int(os.getenv('CRAWL_MAX_DEPTH', 1))
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', 50))
+CRAWL_RATE_PER_HOST = float(os.getenv('CRAWL_RATE_PER_HOST', 10.0))
+
+# Parser processes fed by the fetch threads (0 parses inline in the fetch threads); defaults to the spare cores, up to 4
+CRAWL_PARSE_WORKERS = int(os.getenv('CRAWL_PARSE_WORKERS', max(0, min(4, (os.cpu_count() or 1) - 1))))
+
+# Page extraction: 'fast' (single-pass html_extract.py) or 'soup' (BeautifulSoup tree)
+HTML_EXTRACTOR = os.getenv('HTML_EXTRACTOR', 'fast').lower()
+
+# Knowledge base snapshot loaded at startup so workers don't wait on a crawl
+KB_SNAPSHOT_PATH = os.getenv(
+    'KB_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'knowledge_snapshot.bin')
+)
+KB_SNAPSHOT_COMPRESS = os.getenv('KB_SNAPSHOT_COMPRESS', 'false').lower() == 'true'
+
+# How often (seconds) each worker checks for a snapshot generation published by another worker
+KB_SYNC_INTERVAL = float(os.getenv('KB_SYNC_INTERVAL', 5))
+
+# Background refresh schedule: seconds between crawls (0 = only on request), spread by +/- this fraction
+KNOWLEDGE_REFRESH_INTERVAL = float(os.getenv('KNOWLEDGE_REFRESH_INTERVAL', 21600))
+KNOWLEDGE_REFRESH_JITTER = float(os.getenv('KNOWLEDGE_REFRESH_JITTER', 0.2))
+
+# Response cache: entries, time-to-live (seconds) and optional near-duplicate similarity (0 disables)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv('RESPONSE_CACHE_SIMILARITY', 0))
+
+# Store locator: catalogue file (.csv/.json; empty = demo stores), search radius and results per answer
+STORE_CATALOGUE_PATH = os.getenv('STORE_CATALOGUE_PATH', '')
+STORE_SEARCH_RADIUS_KM = float(os.getenv('STORE_SEARCH_RADIUS_KM', 25))
+STORE_RESULTS = int(os.getenv('STORE_RESULTS', 5))
+STORE_QUERY_LIMIT = int(os.getenv('STORE_QUERY_LIMIT', 100))
+STORE_REPORT_MAX_ORIGINS = int(os.getenv('STORE_REPORT_MAX_ORIGINS', 10000))
+
+# Product catalogue file (.csv/.json; empty = PRODUCT_DATA only), /products page sizes and cached pages
+PRODUCT_CATALOGUE_PATH = os.getenv('PRODUCT_CATALOGUE_PATH', '')
+PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 50))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 200))
+PRODUCTS_PAGE_CACHE = int(os.getenv('PRODUCTS_PAGE_CACHE', 256))
+
+# Stage latency metrics at /metrics; p50/p95/p99 cover the last one to two windows of this many seconds
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_QUANTILE_WINDOW = float(os.getenv('METRICS_QUANTILE_WINDOW', 300))
+
+# OpenAI chat completion settings shared by the sync, streaming and async serving paths
+LLM_COMPLETION_PARAMS = {'model': "gpt-3.5-turbo", 'max_tokens': 500, 'temperature': 0.7}
+
+# Streamed completions end with a usage chunk so token counts are logged for every answer
+LLM_STREAM_PARAMS = dict(LLM_COMPLETION_PARAMS, stream=True, stream_options={'include_usage': True})
+
+# Concurrent requests with identical prompts share one in-flight completion (see singleflight.py)
+LLM_COALESCE = os.getenv('LLM_COALESCE', 'true').lower() == 'true'
+
+# LLM client policy (see llm_client.py): pooled connections, total deadline and per-attempt timeout (seconds),
+# retries with jittered exponential backoff, hedging delay (0 = off) and circuit breaker threshold/cool-down
+LLM_POOL_CONNECTIONS = int(os.getenv('LLM_POOL_CONNECTIONS', 100))
+LLM_POOL_KEEPALIVE = int(os.getenv('LLM_POOL_KEEPALIVE', 20))
+LLM_POLICY = {
+    'deadline': float(os.getenv('LLM_DEADLINE', 20)),
+    'attempt_timeout': float(os.getenv('LLM_ATTEMPT_TIMEOUT', 10)),
+    'max_retries': int(os.getenv('LLM_MAX_RETRIES', 2)),
+    'backoff_base': float(os.getenv('LLM_BACKOFF_BASE', 0.25)),
+    'backoff_max': float(os.getenv('LLM_BACKOFF_MAX', 4)),
+    'hedge_after': float(os.getenv('LLM_HEDGE_AFTER', 0))
+}
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30))
+
+# Passages quoted in the retrieval-only answer given while the LLM is unavailable
+LLM_FALLBACK_PASSAGES = int(os.getenv('LLM_FALLBACK_PASSAGES', 3))
+
+def llm_http_limits():
+    """Connection pool limits of the httpx clients under the OpenAI SDK"""
+    return httpx.Limits(max_connections=LLM_POOL_CONNECTIONS, max_keepalive_connections=LLM_POOL_KEEPALIVE)
+
+# One breaker per worker, shared by the sync and async clients: both talk to the same upstream
+LLM_BREAKER = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
 if api_key:
-    openai_client = OpenAI(api_key=api_key)
+    # Retries are the LLM client's job; the SDK's own are turned off
+    openai_client = OpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=httpx.Client(limits=llm_http_limits(), timeout=LLM_POLICY['attempt_timeout'])
+    )
+    llm_client = LLMClient(openai_client, LLM_BREAKER, attempt_workers=LLM_POOL_CONNECTIONS, **LLM_POLICY)
     logger.info("OpenAI API key configured successfully")
 else:
     openai_client = None
+    llm_client = None
     logger.warning("OPENAI_API_KEY not found in environment variables")
 
-# Nestlé website base URL
-BASE_URL = "https://www.madewithnestle.ca"
+AI_UNAVAILABLE_MESSAGE = "I'm sorry, the AI service is currently unavailable. Please try again later or visit www.madewithnestle.ca for more information."
+GENERIC_ERROR_MESSAGE = "I'm sorry, I'm having trouble processing your request right now. Please try again later or visit www.madewithnestle.ca for more information."
+
+# Query intent keywords in priority order (first matching intent wins; otherwise 'general')
+QUERY_INTENT_KEYWORDS = [
+    ('location', ['near me', 'nearby', 'close by', 'where can i buy', 'stores near', 'in my area']),
+    ('count', ['how many', 'count', 'number of', 'total products']),
+    ('purchase', ['buy online', 'amazon', 'purchase', 'order online'])
+]
 
-# Product data with Amazon links
+# Categories a count question can ask about
+COUNT_CATEGORY_KEYWORDS = [
+    ('coffee', ['coffee']),
+    ('chocolate', ['chocolate']),
+    ('recipe', ['recipe'])
+]
+
+# Categories assigned to scraped products by name
+PRODUCT_CATEGORY_KEYWORDS = [
+    ('coffee', ['coffee', 'espresso', 'nescafe']),
+    ('chocolate', ['kitkat', 'smarties', 'aero', 'quality']),
+    ('recipe', ['recipe', 'baking', 'cookie'])
+]
+
+# Product data with Amazon links (the default catalogue; see PRODUCT_CATALOGUE_PATH)
 PRODUCT_DATA = {
     "kitkat": {
         "name": "KitKat",
@@ -86,141 +236,77 @@ PRODUCT_DATA = {
     }
 }
 
+def load_product_catalogue():
+    """Index the configured product catalogue, falling back to PRODUCT_DATA"""
+    # Category words a scraped product's one-word name may not take over in product detection
+    reserved_words = [category for category, keywords in COUNT_CATEGORY_KEYWORDS + PRODUCT_CATEGORY_KEYWORDS]
+    if PRODUCT_CATALOGUE_PATH:
+        try:
+            store = ProductStore(load_products(PRODUCT_CATALOGUE_PATH), page_cache_size=PRODUCTS_PAGE_CACHE,
+                                 reserved_words=reserved_words)
+            logger.info(f"Loaded {len(store)} products from {PRODUCT_CATALOGUE_PATH}")
+            return store
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load product catalogue {PRODUCT_CATALOGUE_PATH}: {str(e)}")
+    return ProductStore((dict(product, key=key) for key, product in PRODUCT_DATA.items()),
+                        page_cache_size=PRODUCTS_PAGE_CACHE, reserved_words=reserved_words)
+
+# Catalogue products; each knowledge base generation adds the products scraped from its pages
+PRODUCT_STORE = load_product_catalogue()
+
+# Keyword automatons built once at startup (see query_matcher.py)
+QUERY_MATCHER = QueryMatcher(QUERY_INTENT_KEYWORDS, PRODUCT_STORE, COUNT_CATEGORY_KEYWORDS)
+PRODUCT_CATEGORY_MATCHER = KeywordMatcher().add_table('category', PRODUCT_CATEGORY_KEYWORDS).build()
+
+# Stage latency histograms shared by the sync and async serving paths (see metrics.py)
+METRICS = Metrics(enabled=METRICS_ENABLED, window_seconds=METRICS_QUANTILE_WINDOW)
+
 class EnhancedNestleWebScraper:
     def __init__(self):
-        self.scraped_content = {}
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-        self.product_count_cache = {}
+        self.page_parser = PageParser(
+            BASE_URL,
+            PRODUCT_CATEGORY_MATCHER,
+            passage_words=PASSAGE_WORDS,
+            passage_overlap=PASSAGE_OVERLAP,
+            extractor=HTML_EXTRACTOR
+        )
+        self.crawler = SiteCrawler(
+            self.session,
+            self.page_parser.parse_page,
+            allowed_prefix=BASE_URL,
+            max_workers=CRAWL_WORKERS,
+            max_depth=CRAWL_MAX_DEPTH,
+            max_pages=CRAWL_MAX_PAGES,
+            requests_per_second=CRAWL_RATE_PER_HOST,
+            parse_workers=CRAWL_PARSE_WORKERS
+        )
+        self.last_crawl_stats = {}
     
     def scrape_page(self, url):
         """Scrape content from a single page"""
         try:
             response = self.session.get(url, timeout=10)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Extract text content
-            text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            # Extract product information for counting
-            products = self.extract_products_from_page(soup)
-            
-            # Extract links
-            links = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                if href.startswith('/'):
-                    href = urljoin(BASE_URL, href)
-                if BASE_URL in href:
-                    links.append({
-                        'url': href,
-                        'text': link.get_text(strip=True)
-                    })
-            
-            # Extract images
-            images = []
-            for img in soup.find_all('img', src=True):
-                src = img['src']
-                if src.startswith('/'):
-                    src = urljoin(BASE_URL, src)
-                images.append({
-                    'src': src,
-                    'alt': img.get('alt', ''),
-                    'title': img.get('title', '')
-                })
-            
-            return {
-                'url': url,
-                'title': soup.title.string if soup.title else '',
-                'text': text,
-                'links': links,
-                'images': images,
-                'products': products,
-                'scraped_at': datetime.now().isoformat()
-            }
-            
+            return self.parse_page(url, response.content)
         except Exception as e:
             logger.error(f"Error scraping {url}: {str(e)}")
             return None
     
-    def extract_products_from_page(self, soup):
-        """Extract product information for structured queries"""
-        products = []
-        
-        # Look for product cards, product listings, etc.
-        product_selectors = [
-            '.product-card', '.product-item', '.product-tile',
-            '[data-product]', '.recipe-card', '.recipe-item'
-        ]
-        
-        for selector in product_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                product_name = self.extract_product_name(element)
-                if product_name:
-                    products.append({
-                        'name': product_name,
-                        'category': self.categorize_product(product_name),
-                        'url': self.extract_product_url(element)
-                    })
-        
-        return products
-    
-    def extract_product_name(self, element):
-        """Extract product name from HTML element"""
-        # Try different methods to extract product name
-        name_selectors = ['h3', 'h4', '.product-title', '.product-name', '[data-product-name]']
-        
-        for selector in name_selectors:
-            name_element = element.select_one(selector)
-            if name_element:
-                return name_element.get_text(strip=True)
-        
-        # Fallback to element text
-        text = element.get_text(strip=True)
-        if len(text) < 100:  # Reasonable product name length
-            return text
-        
-        return None
+    def parse_page(self, url, html):
+        """Parse raw page HTML into a knowledge base record"""
+        return self.page_parser.parse_page(url, html)
     
-    def categorize_product(self, product_name):
-        """Categorize product based on name"""
-        product_lower = product_name.lower()
-        
-        if any(word in product_lower for word in ['coffee', 'espresso', 'nescafe']):
-            return 'coffee'
-        elif any(word in product_lower for word in ['kitkat', 'smarties', 'aero', 'quality']):
-            return 'chocolate'
-        elif any(word in product_lower for word in ['recipe', 'baking', 'cookie']):
-            return 'recipe'
-        else:
-            return 'other'
-    
-    def extract_product_url(self, element):
-        """Extract product URL from element"""
-        link = element.find('a', href=True)
-        if link:
-            href = link['href']
-            if href.startswith('/'):
-                href = urljoin(BASE_URL, href)
-            return href
-        return None
-    
-    def scrape_main_sections(self):
+    def scrape_main_sections(self, previous=None):
         """Scrape main sections of the Nestlé website"""
+        pages, _ = self.crawl_main_sections(previous or {})
+        return pages
+    
+    def crawl_main_sections(self, previous, on_parsed=None):
+        """Crawl the main sections, handing each newly parsed page to on_parsed as soon as it is ready"""
         main_urls = [
             f"{BASE_URL}/",
             f"{BASE_URL}/search/products",
@@ -230,132 +316,459 @@ class EnhancedNestleWebScraper:
             f"{BASE_URL}/sustainability"
         ]
         
-        total_products = 0
-        products_by_category = {}
+        # Fetch the main sections concurrently and follow their links; validators
+        # from the previous crawl make unchanged pages cheap to revisit
+        pages, stats = self.crawler.crawl(main_urls, previous=previous, on_parsed=on_parsed)
         
-        for url in main_urls:
-            content = self.scrape_page(url)
-            if content:
-                self.scraped_content[url] = content
-                
-                # Count products
-                if content.get('products'):
-                    total_products += len(content['products'])
-                    
-                    for product in content['products']:
-                        category = product.get('category', 'other')
-                        if category not in products_by_category:
-                            products_by_category[category] = 0
-                        products_by_category[category] += 1
-                
-                logger.info(f"Successfully scraped {url}")
+        stats['changed'], stats['removed'] = changed_and_removed(previous, pages, stats)
+        for page in stats['pages']:
+            if 'fetch_ms' in page:
+                METRICS.observe('fetch', page['fetch_ms'] / 1000)
+            if page.get('status') == 'reparsed':
+                METRICS.observe('parse', page['parse_ms'] / 1000)
+        self.last_crawl_stats = stats
+        return pages, stats
+
+class EnhancedNestleChatbot:
+    def __init__(self, snapshot_path=KB_SNAPSHOT_PATH):
+        self.scraper = EnhancedNestleWebScraper()
+        self.embedder = self.load_embedder()
+        self.knowledge = KnowledgeBundle(
+            products=PRODUCT_STORE,
+            vector_index=VectorIndex(self.embedder.dimensions, self.embedder.signature) if self.embedder else None,
+            passage_words=PASSAGE_WORDS,
+            passage_overlap=PASSAGE_OVERLAP
+        )
+        self.store_locator = self.load_store_locator()
+        self.response_cache = ResponseCache(
+            max_entries=RESPONSE_CACHE_SIZE,
+            ttl_seconds=RESPONSE_CACHE_TTL,
+            similarity_threshold=RESPONSE_CACHE_SIMILARITY
+        )
+        self.prompt_builder = PromptBuilder(
+            TokenCounter(LLM_COMPLETION_PARAMS['model']),
+            context_budget=RETRIEVAL_TOKEN_BUDGET,
+            shingle_words=PROMPT_DEDUPE_WORDS
+        )
+        # Sync threads and async tasks (asgi.py) coalesce identical LLM calls separately
+        self.llm_flights = SingleFlight(enabled=LLM_COALESCE)
+        self.async_llm_flights = AsyncSingleFlight(enabled=LLM_COALESCE)
+        self.fallback_answers = 0
+        self.snapshot_path = snapshot_path
+        self.refresh_lock = threading.Lock()
+        self.last_refresh = None
+        METRICS.add_collector(self.collect_metrics)
+        
+        # One worker per snapshot runs the refresh schedule; the others load what it publishes
+        self.refresh_leader = RefreshLeader(snapshot_path) if snapshot_path else None
+        leads = self.refresh_leader.acquire() if self.refresh_leader else True
+        
+        # Refresh jobs are recorded next to the snapshot so any worker can report on them
+        self.refresher = KnowledgeRefresher(
+            self.refresh_knowledge,
+            RefreshJobs(os.path.join(os.path.dirname(snapshot_path), 'refresh_jobs') if snapshot_path else None),
+            interval=KNOWLEDGE_REFRESH_INTERVAL,
+            jitter=KNOWLEDGE_REFRESH_JITTER,
+            leads=self.refresh_leader.acquire if self.refresh_leader else None
+        )
+        
+        # Start from the last snapshot when there is one (the leader then refreshes it in
+        # the background); otherwise crawl the site before serving, or wait for the worker
+        # that is crawling it and load its generation
+        started = time.perf_counter()
+        if self.load_snapshot():
+            source = 'snapshot'
+            if leads:
+                self.refresher.request('startup')
+        else:
+            source = 'crawl'
+            self.refresh_knowledge('startup', requested_at=0.0)
+        self.refresher.start()
         
-        # Cache product counts
-        self.product_count_cache = {
-            'total_products': total_products,
-            'products_by_category': products_by_category,
-            'last_updated': datetime.now().isoformat()
+        self.startup_stats = {
+            'source': source,
+            'ready_ms': round((time.perf_counter() - started) * 1000, 2),
+            'generation': self.generation
         }
+        logger.info(f"Knowledge base ready in {self.startup_stats['ready_ms']:.0f} ms from {source} (generation {self.generation})")
         
-        return self.scraped_content
+        # Follow generations published by whichever worker refreshes next
+        if self.snapshot_path and KB_SYNC_INTERVAL > 0:
+            threading.Thread(target=self.watch_snapshot, args=(KB_SYNC_INTERVAL,),
+                             name='snapshot-watcher', daemon=True).start()
+    
+    @property
+    def knowledge_base(self):
+        """Pages of the published generation"""
+        return self.knowledge.pages
+    
+    @property
+    def generation(self):
+        """Number of the published knowledge base generation"""
+        return self.knowledge.generation
     
     def get_product_counts(self):
-        """Get cached product counts"""
-        return self.product_count_cache
-
-class EnhancedNestleChatbot:
-    def __init__(self):
-        self.scraper = EnhancedNestleWebScraper()
-        self.knowledge_base = {}
-        self.refresh_knowledge()
+        """Product counts of the published generation"""
+        return self.knowledge.product_counts
     
-    def refresh_knowledge(self):
-        """Refresh the knowledge base by scraping the website"""
+    def collect_metrics(self):
+        """Gauges exported at /metrics: knowledge base size, last refresh, response cache and LLM call coalescing"""
+        knowledge = self.knowledge
+        yield ('knowledge_generation', 'Knowledge base generation being served', 'gauge', {}, knowledge.generation)
+        yield ('knowledge_pages', 'Pages in the knowledge base', 'gauge', {}, len(knowledge.pages))
+        yield ('knowledge_passages', 'Passages in the BM25 index', 'gauge', {}, len(knowledge.search_index))
+        if self.last_refresh:
+            yield ('last_refresh_duration_seconds', 'Duration of the last refresh this worker ran', 'gauge', {},
+                   round(self.last_refresh['duration_seconds'], 6))
+            yield ('last_refresh_timestamp_seconds', 'Unix time the last refresh this worker ran finished', 'gauge', {},
+                   round(self.last_refresh['finished_at'], 3))
+        
+        cache = self.response_cache.stats()
+        yield ('response_cache_hit_ratio', 'Share of response cache lookups answered from the cache', 'gauge', {}, cache['hit_rate'])
+        yield ('response_cache_entries', 'Answers held in the response cache', 'gauge', {}, cache['entries'])
+        for result, key in (('hit', 'hits'), ('miss', 'misses')):
+            yield ('response_cache_lookups_total', 'Response cache lookups by result', 'counter', {'result': result}, cache[key])
+        yield ('response_cache_near_duplicate_hits_total', 'Cache hits answered by a similar earlier question', 'counter', {},
+               cache['near_duplicate_hits'])
+        
+        flights = {'sync': self.llm_flights.stats(), 'async': self.async_llm_flights.stats()}
+        for mode, stats in flights.items():
+            yield ('llm_upstream_calls_total', 'LLM completions requested from OpenAI', 'counter', {'mode': mode}, stats['calls'])
+        for mode, stats in flights.items():
+            yield ('llm_coalesced_requests_total', 'Requests answered by joining an identical in-flight completion', 'counter',
+                   {'mode': mode}, stats['coalesced'])
+        
+        breaker = LLM_BREAKER.stats()
+        yield ('llm_circuit_state', 'LLM circuit breaker state (0 closed, 1 half-open, 2 open)', 'gauge', {},
+               BREAKER_STATES[breaker['state']])
+        yield ('llm_circuit_opened_total', 'Times the LLM circuit breaker opened', 'counter', {}, breaker['opened'])
+        yield ('llm_circuit_rejected_total', 'LLM calls failed fast while the circuit was open', 'counter', {}, breaker['rejected'])
+        if llm_client is not None:
+            client = llm_client.stats()
+            yield ('llm_retries_total', 'LLM attempts retried after a timeout, connection error, 429 or 5xx', 'counter', {},
+                   client['retries'])
+            yield ('llm_hedged_requests_total', 'Hedged LLM requests sent because the first was slow', 'counter', {},
+                   client['hedges'])
+        yield ('llm_fallback_answers_total', 'Answers built from retrieval alone while the LLM was unavailable', 'counter', {},
+               self.fallback_answers)
+    
+    def refresh_knowledge(self, trigger='api', requested_at=None, job_id=None):
+        """Crawl the site into a new knowledge base generation and publish it
+        
+        Runs on the refresher thread (or at startup when there is no snapshot).
+        requested_at is when the refresh was asked for (default: now; 0 takes
+        any refresh another worker has completed). Returns
+        a summary dict whose status is 'published', 'unchanged', 'coalesced'
+        (another worker's crawl started after it was requested; covered_by
+        describes that crawl) or 'failed'.
+        """
+        # Only a crawl that started after the request can have seen what prompted it.
+        # Workers share a schedule loosely, so a scheduled run also accepts one that
+        # started within the last half interval
+        max_age = KNOWLEDGE_REFRESH_INTERVAL / 2 if trigger == 'schedule' else 0
+        requested_at = (time.time() if requested_at is None else requested_at) - max_age
         try:
-            self.knowledge_base = self.scraper.scrape_main_sections()
-            logger.info("Knowledge base refreshed successfully")
+            with self.refresh_lock:
+                if not self.snapshot_path:
+                    return self.crawl_and_publish()
+                
+                # Only one worker crawls and writes the shared snapshot at a time
+                with SnapshotLock(self.snapshot_path) as snapshot_lock:
+                    self.sync_snapshot()
+                    last = snapshot_lock.last_refresh()
+                    if self.generation and last.get('started_at', 0.0) >= requested_at:
+                        logger.info(f"Knowledge base already refreshed by another worker (generation {self.generation})")
+                        return {
+                            'status': 'coalesced',
+                            'generation': self.generation,
+                            'covered_by': {
+                                'job_id': last.get('job_id'),
+                                'pid': last.get('pid'),
+                                'generation': last.get('generation'),
+                                'started_at': datetime.fromtimestamp(last['started_at']).isoformat()
+                            }
+                        }
+                    
+                    started_at = time.time()
+                    result = self.crawl_and_publish(save=True)
+                    snapshot_lock.mark_refreshed(result['generation'], started_at, job_id)
+                    return result
         except Exception as e:
             logger.error(f"Error refreshing knowledge base: {str(e)}")
+            return {'status': 'failed', 'generation': self.generation, 'error': str(e)}
     
-    def search_knowledge_base(self, query):
-        """Search through scraped content for relevant information"""
-        relevant_content = []
-        query_lower = query.lower()
+    def crawl_and_publish(self, save=False):
+        """Build the next generation off to the side, save it if asked, then swap it in"""
+        started = time.perf_counter()
+        knowledge, stats, changed = self.crawl_and_apply()
+        if save and (changed or stats['restamped']):
+            self.save_snapshot(knowledge)
         
-        for url, content in self.knowledge_base.items():
-            if content and content.get('text'):
-                text_lower = content['text'].lower()
-                
-                # Simple relevance scoring
-                score = 0
-                query_words = query_lower.split()
-                for word in query_words:
-                    if word in text_lower:
-                        score += text_lower.count(word)
-                
-                if score > 0:
-                    relevant_content.append({
-                        'url': url,
-                        'title': content.get('title', ''),
-                        'text': content['text'][:500] + '...' if len(content['text']) > 500 else content['text'],
-                        'score': score,
-                        'links': content.get('links', [])[:3],
-                        'products': content.get('products', [])
-                    })
-        
-        # Sort by relevance score
-        relevant_content.sort(key=lambda x: x['score'], reverse=True)
-        return relevant_content[:3]
+        # One reference swap; questions already holding the old generation finish with it
+        self.knowledge = knowledge
+        duration = time.perf_counter() - started
+        METRICS.observe('refresh', duration)
+        self.last_refresh = {'finished_at': time.time(), 'duration_seconds': duration}
+        
+        logger.info(
+            f"Knowledge base refreshed successfully: {len(stats['changed'])} changed, "
+            f"{len(stats['removed'])} removed ({len(knowledge.search_index)} passages indexed, "
+            f"generation {knowledge.generation})"
+        )
+        return {
+            'status': 'published' if changed else 'unchanged',
+            'generation': knowledge.generation,
+            'pages': len(knowledge.pages),
+            'changed': len(stats['changed']),
+            'removed': len(stats['removed']),
+            'duration_ms': round(duration * 1000, 2)
+        }
     
-    def detect_query_type(self, user_message):
-        """Detect the type of query to provide appropriate response"""
-        message_lower = user_message.lower()
+    def crawl_and_apply(self):
+        """Crawl the site into a fork of the published generation; returns (knowledge, stats, changed)"""
+        knowledge = self.knowledge.fork()
+        
+        # Changed pages are merged into the fork as the parse stage delivers them
+        pages, stats = self.scraper.crawl_main_sections(
+            knowledge.pages,
+            on_parsed=lambda url, content: self.merge_page(knowledge, url, content)
+        )
+        for url in stats['removed']:
+            knowledge.remove_page(url)
+        for url in stats['changed']:
+            if knowledge.pages.get(url) is not pages[url]:
+                self.merge_page(knowledge, url, pages[url])
+        # Same content under new validators: keep them so the next crawl can get a 304
+        stats['restamped'] = [page['url'] for page in stats['pages'] if page.get('status') == 'unchanged']
+        for url in stats['restamped']:
+            knowledge.restamp_page(url, pages[url])
+        knowledge.finish_refresh()
+        
+        changed = bool(stats['changed'] or stats['removed'])
+        if changed:
+            knowledge.products = self.build_product_store(knowledge)
+        if changed or not knowledge.generation:
+            knowledge.generation += 1
+        return knowledge, stats, changed
+    
+    def build_product_store(self, knowledge):
+        """The catalogue plus the products scraped from a generation's pages"""
+        return PRODUCT_STORE.with_products(
+            product for content in knowledge.pages.values() for product in content.get('products', [])
+        )
+    
+    def merge_page(self, knowledge, url, content):
+        """Merge and index one freshly parsed page into an unpublished generation"""
+        knowledge.merge_page(url, content, self.embed_passages(knowledge, content))
+    
+    def sync_snapshot(self):
+        """Load a newer generation published by another worker, if there is one"""
+        try:
+            generation, _ = read_snapshot_header(self.snapshot_path)
+        except (OSError, SnapshotError):
+            return False
         
-        # Location-based queries
-        location_keywords = ['near me', 'nearby', 'close by', 'where can i buy', 'stores near', 'in my area']
-        if any(keyword in message_lower for keyword in location_keywords):
-            return 'location'
+        if generation <= self.generation:
+            return False
+        return self.load_snapshot()
+    
+    def watch_snapshot(self, interval):
+        """Poll the shared snapshot header and load new generations as they appear"""
+        while True:
+            time.sleep(interval)
+            # A refresh in progress syncs before it crawls and publishes after
+            if not self.refresh_lock.acquire(blocking=False):
+                continue
+            try:
+                self.sync_snapshot()
+            except Exception as e:
+                logger.error(f"Error syncing knowledge base snapshot: {str(e)}")
+            finally:
+                self.refresh_lock.release()
+    
+    def load_snapshot(self):
+        """Restore the knowledge base from the on-disk snapshot if there is a usable one"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
         
-        # Product count queries
-        count_keywords = ['how many', 'count', 'number of', 'total products']
-        if any(keyword in message_lower for keyword in count_keywords):
-            return 'count'
+        try:
+            generation, created, state = read_snapshot(self.snapshot_path)
+        except SnapshotError as e:
+            logger.warning(f"Ignoring knowledge base snapshot: {str(e)}")
+            return False
         
-        # Amazon/purchase queries
-        purchase_keywords = ['buy online', 'amazon', 'purchase', 'order online']
-        if any(keyword in message_lower for keyword in purchase_keywords):
-            return 'purchase'
+        knowledge = KnowledgeBundle.from_snapshot(
+            state, generation, passage_words=PASSAGE_WORDS, passage_overlap=PASSAGE_OVERLAP
+        )
+        knowledge.vector_index = self.restore_vector_index(knowledge)
+        knowledge.products = self.build_product_store(knowledge)
+        self.knowledge = knowledge
         
-        return 'general'
+        logger.info(f"Loaded knowledge base snapshot generation {generation} ({len(knowledge.pages)} pages, "
+                    f"written {datetime.fromtimestamp(created).isoformat()})")
+        return True
     
-    def extract_product_from_message(self, message):
-        """Extract product name from user message"""
-        message_lower = message.lower()
+    def save_snapshot(self, knowledge):
+        """Write a knowledge base generation and its indexes to the on-disk snapshot"""
+        if not self.snapshot_path:
+            return
         
-        for product_key, product_data in PRODUCT_DATA.items():
-            if product_key in message_lower or product_data['name'].lower() in message_lower:
-                return product_key, product_data
+        try:
+            started = time.perf_counter()
+            generation = knowledge.generation
+            # Vectors go to their own file, mapped back by every worker that loads this generation
+            if knowledge.vector_index is not None:
+                knowledge.vector_index.save(vectors_path(self.snapshot_path, generation))
+            size = write_snapshot(self.snapshot_path, knowledge.snapshot_state(), generation, compress=KB_SNAPSHOT_COMPRESS)
+            # Keep the previous generation's vectors for workers still loading it
+            prune_vector_files(self.snapshot_path, keep=(generation, generation - 1))
+            logger.info(f"Saved knowledge base snapshot generation {generation} "
+                        f"({size / 1024:.0f} KiB in {(time.perf_counter() - started) * 1000:.0f} ms)")
+        except OSError as e:
+            logger.error(f"Error saving knowledge base snapshot: {str(e)}")
+    
+    def load_embedder(self):
+        """Passage embedder for dense and hybrid retrieval; None in lexical mode"""
+        if RETRIEVAL_MODE == 'lexical':
+            return None
+        if EMBEDDING_BACKEND == 'openai':
+            if llm_client is not None:
+                # Same deadline, retries and circuit breaker as the chat completions
+                return OpenAIEmbedder(llm_client, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+            logger.warning("EMBEDDING_BACKEND=openai needs OPENAI_API_KEY; using local hashing embeddings")
+        return HashingEmbedder(EMBEDDING_DIMENSIONS)
+    
+    def embed_passages(self, knowledge, content):
+        """Vectors for a page's passages (None in lexical mode or when embedding fails)"""
+        if knowledge.vector_index is None:
+            return None
+        try:
+            texts = [passage['text'] for passage in knowledge.get_passages(content)]
+            return knowledge.vector_index.embed_texts(self.embedder, texts)
+        except Exception as e:
+            logger.error(f"Error embedding passages, page will only be found by keyword search: {str(e)}")
+            return None
+    
+    def restore_vector_index(self, knowledge):
+        """Use a snapshot's vectors if they came from the configured embedder, else re-embed the knowledge base"""
+        if self.embedder is None:
+            return None
+        vector_index = knowledge.vector_index
+        if vector_index is not None and vector_index.signature == self.embedder.signature:
+            return vector_index
         
-        return None, None
+        logger.info(f"Embedding {sum(knowledge.indexed_passages.values())} passages with {self.embedder.signature}")
+        knowledge.vector_index = VectorIndex(self.embedder.dimensions, self.embedder.signature)
+        for url, content in knowledge.pages.items():
+            vectors = self.embed_passages(knowledge, content)
+            if vectors is not None:
+                for position, passage in enumerate(knowledge.get_passages(content)):
+                    knowledge.vector_index.add((url, position), passage['text'], vectors[position])
+        return knowledge.vector_index
     
-    def handle_count_query(self, user_message):
+    def rank_passages(self, knowledge, query, query_vector, limit):
+        """Top (doc_id, score) passages of a generation for a query under RETRIEVAL_MODE"""
+        if query_vector is None:
+            return knowledge.search_index.search(query, limit=limit)
+        
+        dense_hits = knowledge.vector_index.search(query_vector, limit=limit, quantized=VECTOR_SEARCH == 'int8')
+        if RETRIEVAL_MODE == 'dense':
+            return dense_hits
+        return fuse_hits(knowledge.search_index.search(query, limit=limit), dense_hits, HYBRID_DENSE_WEIGHT, limit)
+    
+    def embed_query(self, query):
+        """Unit vector for a question in dense/hybrid mode; None means BM25 only"""
+        if self.embedder is None:
+            return None
+        try:
+            return self.embedder.embed([query])[0]
+        except Exception as e:
+            logger.error(f"Error embedding query, using keyword search: {str(e)}")
+            return None
+    
+    def search_knowledge_base(self, query, token_budget=RETRIEVAL_TOKEN_BUDGET, knowledge=None):
+        """Search through scraped content for the best passages within a token budget (None: no budget)"""
+        relevant_content = []
+        selected_spans = {}
+        tokens_used = 0
+        
+        # Read the published generation once; a refresh swapping in the next one
+        # mid-search can't mix pages from two crawls into one answer
+        knowledge = knowledge or self.knowledge
+        query_vector = self.embed_query(query)
+        hits = self.rank_passages(knowledge, query, query_vector, limit=20)
+        pages = knowledge.pages
+        
+        for (url, position), score in hits:
+            content = pages[url]
+            passage = content['passages'][position]
+            
+            # Skip windows overlapping a better passage from the same page
+            spans = selected_spans.setdefault(url, [])
+            if any(passage['start'] < end and start < passage['end'] for start, end in spans):
+                continue
+            
+            passage_tokens = estimate_tokens(passage['text'])
+            if token_budget is not None and tokens_used + passage_tokens > token_budget:
+                if relevant_content:
+                    continue
+                # Always return the best hit, trimmed to fit the budget
+                passage = dict(passage, text=passage['text'][:token_budget * 4])
+                passage_tokens = estimate_tokens(passage['text'])
+            
+            spans.append((passage['start'], passage['end']))
+            tokens_used += passage_tokens
+            relevant_content.append({
+                'url': url,
+                'title': content.get('title', ''),
+                'text': passage['text'],
+                'start': passage['start'],
+                'end': passage['end'],
+                'score': score,
+                'links': content.get('links', [])[:3],
+                'products': content.get('products', [])
+            })
+        
+        return relevant_content
+    
+    def analyze_query(self, user_message):
+        """Query type, mentioned product and count category of a message, in one pass
+        
+        Computed once per request and passed along to the handlers.
+        """
+        with METRICS.timer('intent'):
+            return QUERY_MATCHER.analyze(user_message, self.knowledge.products)
+    
+    def detect_query_type(self, user_message):
+        """Detect the type of query to provide appropriate response"""
+        return self.analyze_query(user_message)['query_type']
+    
+    def extract_product_from_message(self, message, query=None):
+        """Extract product name from user message"""
+        product_key = (query or self.analyze_query(message))['product_key']
+        product_data = self.knowledge.products.get(product_key) if product_key else None
+        if product_data is None:
+            return None, None
+        return product_key, product_data
+    
+    def handle_count_query(self, user_message, query=None):
         """Handle product count queries"""
-        message_lower = user_message.lower()
-        product_counts = self.scraper.get_product_counts()
+        category = (query or self.analyze_query(user_message))['category']
+        product_counts = self.get_product_counts()
         
         if not product_counts:
             return "I don't have current product count information. Let me refresh my knowledge base and try again."
         
         # Check for specific categories
-        if 'coffee' in message_lower:
+        if category == 'coffee':
             coffee_count = product_counts.get('products_by_category', {}).get('coffee', 0)
             return f"Based on my latest scan of the Made with Nestlé Canada website, I found {coffee_count} coffee-related products listed."
         
-        elif 'chocolate' in message_lower:
+        elif category == 'chocolate':
             chocolate_count = product_counts.get('products_by_category', {}).get('chocolate', 0)
             return f"I found {chocolate_count} chocolate products currently listed on the website."
         
-        elif 'recipe' in message_lower:
+        elif category == 'recipe':
             recipe_count = product_counts.get('products_by_category', {}).get('recipe', 0)
             return f"There are {recipe_count} recipes currently available on the Made with Nestlé Canada website."
         
@@ -371,14 +784,15 @@ class EnhancedNestleChatbot:
             response += f"\n*Last updated: {product_counts.get('last_updated', 'Unknown')}*"
             return response
     
-    def handle_purchase_query(self, user_message):
+    def handle_purchase_query(self, user_message, query=None):
         """Handle purchase/Amazon queries"""
-        product_key, product_data = self.extract_product_from_message(user_message)
+        product_key, product_data = self.extract_product_from_message(user_message, query)
         
         if product_data:
             response = f"You can purchase {product_data['name']} online:\n\n"
-            response += f"🛒 **Amazon Canada**: [{product_data['name']}]({product_data['amazon_url']})\n\n"
-            response += f"📦 Available sizes: {', '.join(product_data['available_sizes'])}\n\n"
+            response += f"🛒 **Amazon Canada**: [{product_data['name']}]({amazon_link(product_data)})\n\n"
+            if product_data['available_sizes']:
+                response += f"📦 Available sizes: {', '.join(product_data['available_sizes'])}\n\n"
             response += "💡 *Tip: Check for local availability and delivery options at checkout.*"
             return response
         else:
@@ -389,94 +803,285 @@ class EnhancedNestleChatbot:
             response += "Would you like me to help you find a specific product?"
             return response
     
-    def generate_response(self, user_message, user_location=None):
+    def generate_response(self, user_message, user_location=None, query=None):
         """Generate chatbot response using OpenAI and scraped content"""
+        plan = None
         try:
             # Check if OpenAI client is available
-            if not openai_client:
-                return "I'm sorry, the AI service is currently unavailable. Please try again later or visit www.madewithnestle.ca for more information."
-            
-            # Detect query type
-            query_type = self.detect_query_type(user_message)
-            
-            # Handle specific query types
-            if query_type == 'count':
-                return self.handle_count_query(user_message)
-            elif query_type == 'purchase':
-                return self.handle_purchase_query(user_message)
-            elif query_type == 'location' and user_location:
-                return self.handle_location_query(user_message, user_location)
-            
-            # Search knowledge base
-            relevant_info = self.search_knowledge_base(user_message)
-            
-            # Prepare context from scraped content
-            context = ""
-            reference_links = []
-            
-            if relevant_info:
-                context = "Based on information from the Made with Nestlé Canada website:\n\n"
-                for info in relevant_info:
-                    context += f"From {info['title']}: {info['text']}\n\n"
-                    reference_links.extend(info['links'])
-            
-            # Create the prompt for OpenAI
-            system_prompt = """You are SMARTIE, a helpful assistant for the Made with Nestlé Canada website. 
-            You help users find information about Nestlé products, recipes, nutrition, sustainability practices, and general inquiries.
-            
-            Always be friendly, helpful, and provide accurate information based on the context provided.
-            If you don't have specific information, suggest where users might find it on the website.
-            Keep responses conversational but informative.
-            
-            When providing information, always try to include relevant links when available.
-            
-            You can also help users find stores, purchase products online, and get product counts."""
-            
-            user_prompt = f"""User question: {user_message}
+            if llm_client is None:
+                return AI_UNAVAILABLE_MESSAGE
             
-            Context from website:
-            {context}
+            plan = self.plan_response(user_message, user_location, query)
+            if plan['response'] is not None:
+                return plan['response']
             
-            Please provide a helpful response to the user's question. If you reference specific information, mention that it comes from the Made with Nestlé Canada website."""
-            
-            # Call OpenAI API
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
+            # Call OpenAI API, or join an identical call (or /chat/stream stream) already in flight
+            bot_response, shared = self.llm_flights.do(
+                prompt_key(plan['messages'], LLM_COMPLETION_PARAMS),
+                lambda: self.complete(plan),
+                lambda chunks: self.streamed_answer(plan, chunks)
             )
+            return self.remember_response(plan, bot_response) if shared else bot_response
             
-            bot_response = response.choices[0].message.content.strip()
-            
-            # Include reference links
-            if reference_links:
-                bot_response += "\n\nHere are some helpful links:\n"
-                for link in reference_links[:2]:
-                    if link['text'] and link['url']:
-                        bot_response += f"• [{link['text']}]({link['url']})\n"
-            
-            return bot_response
-            
+        except LLMUnavailable as e:
+            logger.warning(f"LLM unavailable ({e.reason}); answering from retrieval only")
+            return self.fallback_response(plan)
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return "I'm sorry, I'm having trouble processing your request right now. Please try again later or visit www.madewithnestle.ca for more information."
+            logger.error(f"Error generating response: {type(e).__name__}: {str(e)}")
+            return GENERIC_ERROR_MESSAGE
     
-    def handle_location_query(self, user_message, user_location):
-        """Handle location-based queries (placeholder for frontend implementation)"""
-        # This will be primarily handled by the frontend LocationUI
-        product_key, product_data = self.extract_product_from_message(user_message)
+    def complete(self, plan):
+        """One OpenAI completion for a plan, turned into the final answer"""
+        with METRICS.timer('llm'):
+            response = llm_client.complete(plan['messages'], **LLM_COMPLETION_PARAMS)
+        return self.finish_response(plan, response.choices[0].message.content, response.usage)
+    
+    def fallback_response(self, plan):
+        """Answer from the retrieved passages alone while the LLM is unavailable (never cached)"""
+        self.fallback_answers += 1
+        passages = plan.get('passages', [])[:LLM_FALLBACK_PASSAGES]
+        if not passages:
+            return AI_UNAVAILABLE_MESSAGE
         
-        if product_data:
-            response = f"I can help you find stores near you that carry {product_data['name']}! "
-            response += "The location service will show you nearby stores with distances and contact information. "
-            response += f"You can also order online: [{product_data['name']} on Amazon]({product_data['amazon_url']})"
-            return response
-        else:
+        response = "Our AI assistant is temporarily unavailable, but here is what I found on madewithnestle.ca:\n\n"
+        for passage in passages:
+            text = ' '.join(passage['text'].split())
+            if len(text) > 300:
+                text = text[:300].rsplit(' ', 1)[0] + '…'
+            response += f"**{passage['title'] or passage['url']}**: {text} [Read more]({passage['url']})\n\n"
+        return response.rstrip() + self.format_reference_links(plan['reference_links'])
+    
+    def plan_response(self, user_message, user_location=None, query=None):
+        """Do everything short of calling the LLM for a message
+        
+        Returns a plan dict. When plan['response'] is set (cached answer, or a
+        count/purchase/location reply) it is final; otherwise plan['messages'] are
+        ready to send to OpenAI and finish_response() turns the completion into the
+        answer. Shared by the sync, streaming and async serving paths.
+        """
+        if query is None:
+            query = self.analyze_query(user_message)
+        query_type = query['query_type']
+        # Cache lookups and retrieval all use the generation published when the question arrived
+        knowledge = self.knowledge
+        
+        # Answers that depend on the user's location are never shared
+        plan = {
+            'message': user_message,
+            'query_type': query_type,
+            'generation': knowledge.generation,
+            'cacheable': not (query_type == 'location' and user_location),
+            'response': None
+        }
+        if plan['cacheable']:
+            with METRICS.timer('cache_lookup'):
+                plan['response'] = self.response_cache.get(user_message, plan['generation'], scope=query_type)
+            if plan['response'] is not None:
+                return plan
+        
+        with METRICS.timer('local_answer'):
+            local_response = self.compose_response(user_message, user_location, query)
+        if local_response is not None:
+            plan['response'] = self.remember_response(plan, local_response)
+            return plan
+        
+        plan['messages'], plan['reference_links'], plan['prompt_tokens'], plan['passages'] = self.build_llm_messages(
+            user_message, knowledge
+        )
+        return plan
+    
+    def finish_response(self, plan, completion_text, usage=None, shared=False):
+        """Turn an LLM completion for a plan into the final, cached answer
+        
+        shared: the completion came from another request's call, whose tokens that request logs.
+        """
+        with METRICS.timer('post_processing'):
+            if not shared:
+                self.log_usage(plan, completion_text, usage)
+            return self.remember_response(plan, self.format_answer(plan, completion_text))
+    
+    def format_answer(self, plan, completion_text):
+        """The answer text: the completion followed by the plan's reference links"""
+        return completion_text.strip() + self.format_reference_links(plan['reference_links'])
+    
+    def streamed_answer(self, plan, chunks):
+        """The answer text from the chunks of a streamed completion"""
+        parts = []
+        for chunk in chunks:
+            content = self.chunk_content(chunk, parts)
+            if content:
+                parts.append(content)
+        return self.format_answer(plan, ''.join(parts))
+    
+    def log_usage(self, plan, completion_text, usage=None):
+        """Log prompt and completion tokens of an LLM call, counted locally when the API reports no usage"""
+        if usage is None:
+            logger.info(f"LLM tokens (local count): prompt {plan['prompt_tokens']}, "
+                        f"completion {self.prompt_builder.counter.count(completion_text)}")
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+        logger.info(f"LLM tokens: prompt {usage.prompt_tokens} ({cached_tokens} cached, {plan['prompt_tokens']} counted locally), "
+                    f"completion {usage.completion_tokens}")
+    
+    def remember_response(self, plan, bot_response):
+        """Cache a finished answer when the plan allows it"""
+        if plan['cacheable']:
+            self.response_cache.put(plan['message'], plan['generation'], bot_response, scope=plan['query_type'])
+        return bot_response
+    
+    def compose_response(self, user_message, user_location, query):
+        """Answer query types that don't need the LLM; None for general questions"""
+        # Handle specific query types
+        query_type = query['query_type']
+        if query_type == 'count':
+            return self.handle_count_query(user_message, query)
+        elif query_type == 'purchase':
+            return self.handle_purchase_query(user_message, query)
+        elif query_type == 'location' and user_location:
+            return self.handle_location_query(user_message, user_location, query)
+        return None
+    
+    def build_llm_messages(self, user_message, knowledge=None):
+        """Retrieve context for a general question and build the OpenAI chat messages
+        
+        Returns (messages, reference_links, prompt_tokens, passages). Every candidate
+        passage is handed to the prompt builder, which drops repeated
+        boilerplate and packs the rest into RETRIEVAL_TOKEN_BUDGET.
+        """
+        with METRICS.timer('retrieval'):
+            relevant_info = self.search_knowledge_base(user_message, token_budget=None, knowledge=knowledge)
+        with METRICS.timer('prompt_build'):
+            messages, selected, stats = self.prompt_builder.build(user_message, relevant_info)
+        
+        reference_links = []
+        seen_pages = set()
+        for info in selected:
+            if info['url'] not in seen_pages:
+                seen_pages.add(info['url'])
+                reference_links.extend(info['links'])
+        
+        logger.info(f"Prompt: {stats['prompt_tokens']} tokens, {stats['passages']}/{stats['candidates']} passages "
+                    f"({stats['context_tokens']} context tokens, {stats['boilerplate_tokens_dropped']} repeated tokens dropped)")
+        return messages, reference_links, stats['prompt_tokens'], selected
+    
+    def format_reference_links(self, reference_links):
+        """Markdown list of the first helpful reference links, appended to LLM answers"""
+        if not reference_links:
+            return ""
+        
+        links_text = "\n\nHere are some helpful links:\n"
+        for link in reference_links[:2]:
+            if link['text'] and link['url']:
+                links_text += f"• [{link['text']}]({link['url']})\n"
+        return links_text
+    
+    def stream_response(self, user_message, user_location=None, query=None):
+        """Generate a response as a stream of events: meta, delta..., done
+        
+        General questions forward OpenAI token deltas as they arrive; everything
+        else (cached answers, counts, purchase and location replies) is sent as a
+        single delta.
+        """
+        if query is None:
+            query = self.analyze_query(user_message)
+        yield {'type': 'meta', 'query_type': query['query_type']}
+        
+        if llm_client is None:
+            yield {'type': 'delta', 'content': AI_UNAVAILABLE_MESSAGE}
+            yield {'type': 'done', 'response': AI_UNAVAILABLE_MESSAGE}
+            return
+        
+        plan = self.plan_response(user_message, user_location, query)
+        if plan['response'] is not None:
+            yield {'type': 'delta', 'content': plan['response']}
+            yield {'type': 'done', 'response': plan['response']}
+            return
+        
+        started = time.perf_counter()
+        parts = []
+        usage = None
+        try:
+            # Concurrent identical questions subscribe to one upstream stream; keyed like
+            # /chat so that JSON requests for the same prompt can follow it too
+            stream = self.llm_flights.stream(
+                prompt_key(plan['messages'], LLM_COMPLETION_PARAMS),
+                lambda: llm_client.stream(plan['messages'], **LLM_STREAM_PARAMS)
+            )
+            for chunk in stream:
+                usage = chunk.usage or usage
+                content = self.chunk_content(chunk, parts)
+                if content:
+                    if not parts:
+                        METRICS.observe('llm_first_token', time.perf_counter() - started)
+                    parts.append(content)
+                    yield {'type': 'delta', 'content': content}
+        except LLMUnavailable as e:
+            # Once part of an answer is out it cannot be swapped for another one
+            if parts:
+                raise
+            logger.warning(f"LLM unavailable ({e.reason}); answering from retrieval only")
+            response = self.fallback_response(plan)
+            yield {'type': 'delta', 'content': response}
+            yield {'type': 'done', 'response': response}
+            return
+        METRICS.observe('llm', time.perf_counter() - started)
+        
+        links_text = self.format_reference_links(plan['reference_links'])
+        if links_text:
+            yield {'type': 'delta', 'content': links_text}
+        yield {'type': 'done', 'response': self.finish_response(plan, ''.join(parts), usage, shared=stream.shared)}
+    
+    def chunk_content(self, chunk, parts):
+        """Text of a streamed completion chunk, with leading whitespace of the answer dropped"""
+        if not chunk.choices:
+            return ''
+        content = chunk.choices[0].delta.content or ''
+        return content if parts else content.lstrip()
+    
+    def load_store_locator(self):
+        """Index the configured store catalogue, falling back to the demo stores"""
+        if STORE_CATALOGUE_PATH:
+            try:
+                locator = StoreLocator.from_file(STORE_CATALOGUE_PATH)
+                logger.info(f"Loaded {len(locator.stores)} stores from {STORE_CATALOGUE_PATH}")
+                return locator
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Could not load store catalogue {STORE_CATALOGUE_PATH}: {str(e)}")
+        return StoreLocator(DEFAULT_STORES)
+    
+    def handle_location_query(self, user_message, user_location, query=None):
+        """Handle location-based queries with the nearest stores from the store catalogue"""
+        product_key, product_data = self.extract_product_from_message(user_message, query)
+        
+        try:
+            latitude = float(user_location['latitude'])
+            longitude = float(user_location['longitude'])
+        except (TypeError, KeyError, ValueError):
             return "I can help you find nearby stores that carry Nestlé products! Make sure location services are enabled and I'll show you the closest options with directions and contact details."
+        
+        product_name = product_data['name'] if product_data else None
+        stores = self.store_locator.nearest(
+            latitude, longitude, k=STORE_RESULTS,
+            max_distance_km=STORE_SEARCH_RADIUS_KM, product=product_name
+        )
+        label = product_name or 'Nestlé products'
+        
+        if stores:
+            response = f"Here are nearby stores where you can find {label}:\n\n"
+            for position, store in enumerate(stores, 1):
+                response += f"{position}. **{store['name']}**\n"
+                response += f"   📍 {store['address']}\n"
+                response += f"   📞 {store['phone']}\n"
+                response += f"   🕒 Hours: {store['hours']}\n"
+                response += f"   📏 Distance: {format_distance(store['distance_km'])}\n\n"
+            response += "💡 *Tip: Call ahead to confirm product availability.*"
+        else:
+            response = f"I couldn't find any nearby stores carrying {label}. You might want to check online retailers or call local stores directly."
+        
+        if product_data:
+            response += f"\n\nYou can also order online: [{product_data['name']} on Amazon]({amazon_link(product_data)})"
+        return response
 
 # Initialize enhanced chatbot
 nestle_bot = EnhancedNestleChatbot()
@@ -487,42 +1092,184 @@ def index():
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    try:
-        data = request.get_json()
-        user_message = data.get('message', '').strip()
-        user_location = data.get('location')  # Optional location data from frontend
-        
-        if not user_message:
-            return jsonify({'error': 'No message provided'}), 400
-        
-        # Generate response with location context if available
-        bot_response = nestle_bot.generate_response(user_message, user_location)
-        
-        return jsonify({
-            'response': bot_response,
-            'timestamp': datetime.now().isoformat(),
-            'query_type': nestle_bot.detect_query_type(user_message)
-        })
+    with METRICS.timer('request'):
+        try:
+            data = request.get_json(silent=True) or {}
+            user_message = str(data.get('message', '')).strip() if isinstance(data, dict) else ''
+            if not user_message:
+                return jsonify({'error': 'No message provided'}), 400
+            user_location = data.get('location')  # Optional location data from frontend
+            
+            # Generate response with location context if available
+            query = nestle_bot.analyze_query(user_message)
+            bot_response = nestle_bot.generate_response(user_message, user_location, query)
+            
+            return jsonify({
+                'response': bot_response,
+                'timestamp': datetime.now().isoformat(),
+                'query_type': query['query_type']
+            })
         
-    except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        except Exception as e:
+            logger.error(f"Error in chat endpoint: {str(e)}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chatbot response as server-sent events (same request body as /chat)"""
+    data = request.get_json(silent=True) or {}
+    user_message = str(data.get('message', '')).strip() if isinstance(data, dict) else ''
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    user_location = data.get('location')
+    
+    def event_stream():
+        with METRICS.timer('stream_request'):
+            try:
+                for event in nestle_bot.stream_response(user_message, user_location):
+                    event_type = event.pop('type')
+                    yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                yield f"event: error\ndata: {json.dumps({'response': GENERIC_ERROR_MESSAGE})}\n\n"
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/stores/nearby', methods=['GET'])
+def stores_nearby():
+    """Nearest stores to a point: ?lat=&lng=[&k=][&radius_km=][&product=]
+    
+    With only radius_km, returns every store within the radius (up to STORE_QUERY_LIMIT).
+    """
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lng'])
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('coordinates out of range')
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Valid lat and lng query parameters are required'}), 400
+    
+    k = request.args.get('k', type=int)
+    radius_km = request.args.get('radius_km', type=float)
+    if radius_km is not None and not radius_km >= 0:
+        return jsonify({'error': 'radius_km must not be negative'}), 400
+    product = resolve_product_name(request.args.get('product'))
+    
+    locator = nestle_bot.store_locator
+    if radius_km is not None and k is None:
+        stores = locator.within(latitude, longitude, radius_km, product=product, limit=STORE_QUERY_LIMIT)
+    else:
+        k = max(1, min(k or STORE_RESULTS, STORE_QUERY_LIMIT))
+        stores = locator.nearest(latitude, longitude, k=k, max_distance_km=radius_km, product=product)
+    
+    return jsonify({'stores': stores, 'count': len(stores)})
+
+@app.route('/stores/nearest-report', methods=['POST'])
+def stores_nearest_report():
+    """Nearest store(s) for each of many origins, e.g. one per postal code
+    
+    Body: {"origins": [{"id": "L5N 8G6", "latitude": 43.58, "longitude": -79.64}, ...],
+           "k": 1, "radius_km": null, "product": null}. Add ?format=csv for a CSV download.
+    """
+    data = request.get_json(silent=True) or {}
+    origins = data.get('origins')
+    if not isinstance(origins, list) or not origins:
+        return jsonify({'error': 'origins must be a non-empty list'}), 400
+    if len(origins) > STORE_REPORT_MAX_ORIGINS:
+        return jsonify({'error': f'At most {STORE_REPORT_MAX_ORIGINS} origins per report'}), 400
+    
+    try:
+        latitudes = [float(origin['latitude']) for origin in origins]
+        longitudes = [float(origin['longitude']) for origin in origins]
+        if not all(-90 <= latitude <= 90 for latitude in latitudes) or not all(-180 <= longitude <= 180 for longitude in longitudes):
+            raise ValueError('coordinates out of range')
+        k = max(1, min(int(data.get('k', 1)), STORE_QUERY_LIMIT))
+        radius_km = float(data['radius_km']) if data.get('radius_km') is not None else None
+    except (TypeError, KeyError, ValueError):
+        return jsonify({'error': 'Each origin needs a valid latitude and longitude'}), 400
+    if radius_km is not None and not radius_km >= 0:
+        return jsonify({'error': 'radius_km must not be negative'}), 400
+    
+    started = time.perf_counter()
+    locator = nestle_bot.store_locator
+    indices, distances = locator.nearest_batch(
+        latitudes, longitudes, k=k, max_distance_km=radius_km,
+        product=resolve_product_name(data.get('product'))
+    )
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    
+    rows = []
+    for position, origin in enumerate(origins):
+        origin_id = origin.get('id', position)
+        for rank in range(k):
+            index = int(indices[position, rank])
+            if index < 0:
+                if rank == 0:
+                    rows.append({'origin_id': origin_id, 'rank': None, 'store_id': None,
+                                 'store_name': None, 'address': None, 'distance_km': None})
+                break
+            store = locator.stores[index]
+            rows.append({
+                'origin_id': origin_id,
+                'rank': rank + 1,
+                'store_id': store['id'],
+                'store_name': store['name'],
+                'address': store['address'],
+                'distance_km': round(float(distances[position, rank]), 3)
+            })
+    
+    if request.args.get('format') == 'csv':
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=['origin_id', 'rank', 'store_id', 'store_name', 'address', 'distance_km'])
+        writer.writeheader()
+        writer.writerows(rows)
+        return Response(
+            output.getvalue(),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=nearest_stores.csv'}
+        )
+    
+    return jsonify({'origins': len(origins), 'rows': rows, 'elapsed_ms': elapsed_ms})
+
+def resolve_product_name(product):
+    """Catalogue product name for a product key, name or alias (other names pass through)"""
+    product_data = nestle_bot.knowledge.products.find(product) if product else None
+    return product_data['name'] if product_data else product
+
+def amazon_link(product_data):
+    """Amazon Canada link of a product: its listing, or a search for its name (scraped products)"""
+    return product_data['amazon_url'] or f"https://www.amazon.ca/s?k={quote_plus(product_data['name'])}"
 
 @app.route('/refresh-knowledge', methods=['POST'])
 def refresh_knowledge():
-    """Endpoint to refresh the knowledge base"""
+    """Endpoint to queue a knowledge base refresh; poll the returned status_url for the outcome"""
     try:
-        nestle_bot.refresh_knowledge()
-        return jsonify({'status': 'success', 'message': 'Knowledge base refreshed'})
+        job = nestle_bot.refresher.request('api')
+        status_url = f"/refresh-knowledge/{job['job_id']}"
+        response = jsonify({'status': 'accepted', 'job_id': job['job_id'], 'status_url': status_url})
+        response.headers['Location'] = status_url
+        return response, 202
     except Exception as e:
         logger.error(f"Error refreshing knowledge: {str(e)}")
         return jsonify({'error': 'Failed to refresh knowledge base'}), 500
 
+@app.route('/refresh-knowledge/<job_id>', methods=['GET'])
+def refresh_knowledge_status(job_id):
+    """Endpoint to get the status of a knowledge base refresh job"""
+    job = nestle_bot.refresher.jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown refresh job'}), 404
+    return jsonify(job)
+
 @app.route('/product-counts', methods=['GET'])
 def get_product_counts():
     """Endpoint to get current product counts"""
     try:
-        counts = nestle_bot.scraper.get_product_counts()
+        counts = nestle_bot.get_product_counts()
         return jsonify(counts)
     except Exception as e:
         logger.error(f"Error getting product counts: {str(e)}")
@@ -530,13 +1277,32 @@ def get_product_counts():
 
 @app.route('/products', methods=['GET'])
 def get_products():
-    """Endpoint to get product information"""
+    """Endpoint to get one page of the product catalogue, optionally filtered by category, size and name words"""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    if page < 1 or not 1 <= per_page <= PRODUCTS_MAX_PAGE_SIZE:
+        return jsonify({'error': f"page must be at least 1 and per_page between 1 and {PRODUCTS_MAX_PAGE_SIZE}"}), 400
+    
     try:
-        return jsonify(PRODUCT_DATA)
+        body = nestle_bot.knowledge.products.page_json(
+            page, per_page,
+            category=request.args.get('category'),
+            size=request.args.get('size'),
+            search=request.args.get('q')
+        )
+        return Response(body, mimetype='application/json')
     except Exception as e:
         logger.error(f"Error getting products: {str(e)}")
         return jsonify({'error': 'Failed to get products'}), 500
 
+@app.route('/metrics')
+def metrics():
+    """Stage latency histograms and knowledge base/cache gauges in Prometheus text format"""
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health')
 def health_check():
     return jsonify({
@@ -547,10 +1313,22 @@ def health_check():
             'product_counts': True,
             'amazon_integration': True,
             'enhanced_rag': True
-        }
+        },
+        'knowledge_base': {
+            'worker_pid': os.getpid(),
+            'generation': nestle_bot.generation,
+            'pages': len(nestle_bot.knowledge_base),
+            'startup': nestle_bot.startup_stats,
+            'refresher': dict(nestle_bot.refresher.stats(), leader=nestle_bot.refresh_leader.held if nestle_bot.refresh_leader else True)
+        },
+        'products': nestle_bot.knowledge.products.stats(),
+        'response_cache': nestle_bot.response_cache.stats(),
+        'llm_flights': nestle_bot.llm_flights.stats(),
+        'llm': llm_client.stats() if llm_client is not None else LLM_BREAKER.stats(),
+        'latency': METRICS.summary(),
+        'store_locator': nestle_bot.store_locator.stats()
     })
 
 if __name__ == '__main__':
-    # Refresh knowledge base on startup
-    nestle_bot.refresh_knowledge()
+    # The knowledge base was already loaded (or crawled) when nestle_bot was created
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 8000)), debug=False)
\ No newline at end of file
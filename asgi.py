@@ -0,0 +1,400 @@
+"""
+ASGI Entry Point for Nestlé Canada AI Chatbot
+Asyncio serving mode: chat requests wait on OpenAI without holding a worker
+
+With the sync Flask app every in-flight chat holds a gunicorn worker for the
+whole OpenAI round trip, so two workers serve two concurrent users. Here
+/chat and /chat/stream run natively on the event loop with AsyncOpenAI, so
+one worker process can keep many slow completions in flight. Every other
+route is handed to the existing Flask app through asgiref's WsgiToAsgi.
+
+Overload protection:
+- at most ASYNC_MAX_CONCURRENCY chats talk to OpenAI at once
+- at most ASYNC_MAX_QUEUE more wait for a slot; beyond that requests are
+  shed immediately with 503 + Retry-After instead of piling up
+- each chat (queueing included) has ASYNC_REQUEST_TIMEOUT seconds before it
+  is answered with 504 (or an error event, once a stream has started)
+- chats with identical prompts in flight at the same time share one OpenAI
+  call (see singleflight.py), so a burst of the same question takes one slot
+  upstream however many requests wait on it
+- OpenAI calls follow the app's LLM client policy (pooled connections,
+  deadline, retries, hedging) and share its circuit breaker; while the
+  LLM is unavailable chats are answered from retrieval alone
+
+Run with: gunicorn -k uvicorn_worker.UvicornWorker asgi:application
+(startup.sh does this when SERVING_MODE=async)
+
+File: asgi.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+import httpx
+from openai import AsyncOpenAI
+
+import app as chatbot
+from llm_client import AsyncLLMClient, LLMUnavailable
+from singleflight import prompt_key
+
+logger = logging.getLogger(__name__)
+
+# Concurrency limits for the async chat path
+ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', 64))
+ASYNC_MAX_QUEUE = int(os.getenv('ASYNC_MAX_QUEUE', 128))
+ASYNC_REQUEST_TIMEOUT = float(os.getenv('ASYNC_REQUEST_TIMEOUT', 60))
+
+CHAT_PATHS = ('/chat', '/chat/stream')
+
+
+class ChatLimiter:
+    """Bounded concurrency with a bounded wait queue; overflow is rejected, not queued
+
+    Admission is decided synchronously in try_enter, counting chats that are
+    admitted but not running yet, so a burst that arrives before any of it
+    has reached the semaphore is still cut at max_concurrency + max_queue.
+    """
+
+    def __init__(self, max_concurrency, max_queue):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = None
+        self.admitted = 0
+        self.active = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def waiting(self):
+        """Admitted chats not running yet"""
+        return self.admitted - self.active
+
+    def try_enter(self):
+        """Admit a chat (a slot or a queue position); False when slots and queue are all taken"""
+        if self.semaphore is None:
+            # Created lazily so it binds to the server's event loop
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def leave(self):
+        """Give back the admission of a finished, failed or timed-out chat"""
+        self.admitted -= 1
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def stats(self):
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """WsgiToAsgi request that runs Flask on the loop's thread pool
+
+    asgiref runs WSGI apps thread-sensitively: every request of a worker on one
+    shared thread, which serializes /products, /metrics and friends and, with
+    recent asgiref releases, fails concurrent requests outright. The Flask app
+    is thread-safe (it is served by threaded workers in sync mode).
+    """
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self.respond, thread_sensitive=False)(body)
+
+    def respond(self, body):
+        """Run the WSGI app on a pool thread and send its response as it is produced"""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Too many duplicate headers
+            self.sync_send({'type': 'http.response.start', 'status': 400, 'headers': [(b'content-type', b'text/plain')]})
+            self.sync_send({'type': 'http.response.body', 'body': b'Bad Request'})
+            return
+
+        output = self.wsgi_application(environ, self.start_response)
+        try:
+            bytes_sent = 0
+            for chunk in output:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                # Never send more than the Content-Length the app declared
+                if self.response_content_length is not None:
+                    chunk = chunk[:self.response_content_length - bytes_sent]
+                self.sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                bytes_sent += len(chunk)
+                if bytes_sent == self.response_content_length:
+                    break
+        finally:
+            if hasattr(output, 'close'):
+                output.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+class ChatbotASGI:
+    """ASGI app serving the chat endpoints asynchronously and everything else through Flask"""
+
+    def __init__(self, flask_app, bot, max_concurrency=ASYNC_MAX_CONCURRENCY,
+                 max_queue=ASYNC_MAX_QUEUE, request_timeout=ASYNC_REQUEST_TIMEOUT):
+        self.wsgi = PooledWsgiToAsgi(flask_app)
+        self.bot = bot
+        self.limiter = ChatLimiter(max_concurrency, max_queue)
+        self.request_timeout = request_timeout
+        self.llm_flights = bot.async_llm_flights
+        self.openai_client = None
+        self.llm_client = None
+        if chatbot.api_key:
+            policy = chatbot.LLM_POLICY
+            self.openai_client = AsyncOpenAI(
+                api_key=chatbot.api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=chatbot.llm_http_limits(), timeout=policy['attempt_timeout'])
+            )
+            # The request deadline bounds the LLM deadline: an answer after it would never be sent
+            self.llm_client = AsyncLLMClient(
+                self.openai_client, chatbot.LLM_BREAKER,
+                **dict(policy, deadline=min(policy['deadline'], request_timeout))
+            )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] in CHAT_PATHS and scope['method'] == 'POST':
+            await self.chat(scope, receive, send)
+        elif scope['type'] == 'http' and scope['path'] == '/health/async':
+            await send_json(send, 200, {
+                'worker_pid': os.getpid(),
+                'chat_limiter': self.limiter.stats(),
+                'llm_flights': self.llm_flights.stats(),
+                'llm': self.llm_client.stats() if self.llm_client is not None else chatbot.LLM_BREAKER.stats()
+            })
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.openai_client is not None:
+                    await self.openai_client.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def chat(self, scope, receive, send):
+        """Admission control, then /chat or /chat/stream under the request deadline"""
+        try:
+            data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            data = {}
+        user_message = str(data.get('message', '')).strip() if isinstance(data, dict) else ''
+        if not user_message:
+            await send_json(send, 400, {'error': 'No message provided'})
+            return
+        user_location = data.get('location')
+
+        if not self.limiter.try_enter():
+            logger.warning(f"Shedding chat request: {self.limiter.waiting} already waiting")
+            await send_json(send, 503, {'error': 'Server busy, please retry shortly'}, [(b'retry-after', b'1')])
+            return
+
+        streaming = scope['path'] == '/chat/stream'
+        started = {'response': False}
+        handler = self.stream_chat if streaming else self.json_chat
+        try:
+            with chatbot.METRICS.timer('stream_request' if streaming else 'request'):
+                await asyncio.wait_for(
+                    self.run_limited(handler(user_message, user_location, send, started)),
+                    self.request_timeout
+                )
+        except asyncio.TimeoutError:
+            self.limiter.timed_out += 1
+            logger.error(f"Chat request timed out after {self.request_timeout}s")
+            if started['response']:
+                await send_event(send, 'error', {'response': chatbot.GENERIC_ERROR_MESSAGE}, more_body=False)
+            else:
+                await send_json(send, 504, {'error': 'Request timed out'})
+        except Exception as e:
+            logger.error(f"Error in async chat endpoint: {str(e)}")
+            if streaming and started['response']:
+                await send_event(send, 'error', {'response': chatbot.GENERIC_ERROR_MESSAGE}, more_body=False)
+            elif not started['response']:
+                await send_json(send, 500, {'error': 'Internal server error'})
+        finally:
+            self.limiter.leave()
+
+    async def run_limited(self, coroutine):
+        """Wait for a concurrency slot (already admitted), then run"""
+        await self.limiter.acquire()
+        try:
+            return await coroutine
+        finally:
+            self.limiter.release()
+
+    async def plan(self, user_message, user_location, query):
+        # Retrieval is CPU-bound (and may call the embeddings API); keep it off the loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.bot.plan_response, user_message, user_location, query)
+
+    async def json_chat(self, user_message, user_location, send, started):
+        """Same contract as the Flask /chat route"""
+        query = self.bot.analyze_query(user_message)
+        bot_response = await self.generate_response(user_message, user_location, query)
+
+        started['response'] = True
+        await send_json(send, 200, {
+            'response': bot_response,
+            'timestamp': datetime.now().isoformat(),
+            'query_type': query['query_type']
+        })
+
+    async def generate_response(self, user_message, user_location, query):
+        """The answer to a chat; like EnhancedNestleChatbot.generate_response, failures become GENERIC_ERROR_MESSAGE"""
+        try:
+            if self.openai_client is None:
+                return chatbot.AI_UNAVAILABLE_MESSAGE
+            plan = await self.plan(user_message, user_location, query)
+            if plan['response'] is not None:
+                return plan['response']
+            try:
+                bot_response, shared = await self.llm_flights.do(
+                    prompt_key(plan['messages'], chatbot.LLM_COMPLETION_PARAMS),
+                    lambda: self.complete(plan),
+                    lambda chunks: self.bot.streamed_answer(plan, chunks)
+                )
+            except LLMUnavailable as e:
+                logger.warning(f"LLM unavailable ({e.reason}); answering from retrieval only")
+                return self.bot.fallback_response(plan)
+            return self.bot.remember_response(plan, bot_response) if shared else bot_response
+        except Exception as e:
+            logger.error(f"Error generating response: {type(e).__name__}: {str(e)}")
+            return chatbot.GENERIC_ERROR_MESSAGE
+
+    async def complete(self, plan):
+        """One OpenAI completion for a plan, turned into the final answer"""
+        with chatbot.METRICS.timer('llm'):
+            response = await self.llm_client.complete(plan['messages'], **chatbot.LLM_COMPLETION_PARAMS)
+        return self.bot.finish_response(plan, response.choices[0].message.content, response.usage)
+
+    async def stream_chat(self, user_message, user_location, send, started):
+        """Same event stream as the Flask /chat/stream route"""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]
+        })
+        started['response'] = True
+
+        query = self.bot.analyze_query(user_message)
+        await send_event(send, 'meta', {'query_type': query['query_type']})
+
+        if self.openai_client is None:
+            await send_event(send, 'delta', {'content': chatbot.AI_UNAVAILABLE_MESSAGE})
+            await send_event(send, 'done', {'response': chatbot.AI_UNAVAILABLE_MESSAGE}, more_body=False)
+            return
+
+        plan = await self.plan(user_message, user_location, query)
+        if plan['response'] is not None:
+            await send_event(send, 'delta', {'content': plan['response']})
+            await send_event(send, 'done', {'response': plan['response']}, more_body=False)
+            return
+
+        llm_started = time.perf_counter()
+        parts = []
+        usage = None
+        try:
+            stream, shared = await self.llm_flights.stream(
+                prompt_key(plan['messages'], chatbot.LLM_COMPLETION_PARAMS),
+                lambda: self.llm_client.stream(plan['messages'], **chatbot.LLM_STREAM_PARAMS)
+            )
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                content = self.bot.chunk_content(chunk, parts)
+                if content:
+                    if not parts:
+                        chatbot.METRICS.observe('llm_first_token', time.perf_counter() - llm_started)
+                    parts.append(content)
+                    await send_event(send, 'delta', {'content': content})
+        except LLMUnavailable as e:
+            # Once part of an answer is out it cannot be swapped for another one
+            if parts:
+                raise
+            logger.warning(f"LLM unavailable ({e.reason}); answering from retrieval only")
+            bot_response = self.bot.fallback_response(plan)
+            await send_event(send, 'delta', {'content': bot_response})
+            await send_event(send, 'done', {'response': bot_response}, more_body=False)
+            return
+        chatbot.METRICS.observe('llm', time.perf_counter() - llm_started)
+
+        links_text = self.bot.format_reference_links(plan['reference_links'])
+        if links_text:
+            await send_event(send, 'delta', {'content': links_text})
+        bot_response = self.bot.finish_response(plan, ''.join(parts), usage, shared=shared)
+        await send_event(send, 'done', {'response': bot_response}, more_body=False)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + list(extra_headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_event(send, event_type, payload, more_body=True):
+    data = f"event: {event_type}\ndata: {json.dumps(payload)}\n\n".encode('utf-8')
+    await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+
+application = ChatbotASGI(chatbot.app, chatbot.nestle_bot)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host='0.0.0.0', port=int(os.environ.get('PORT', 8000)))
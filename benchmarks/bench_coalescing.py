@@ -0,0 +1,140 @@
+"""
+Benchmark: upstream LLM calls under a burst of identical questions
+
+Sends a burst of N identical questions (default 500, written with three
+different spellings of case and spacing) at once, through /chat and
+/chat/stream of the sync Flask app (one thread per request) and of the
+async ASGI app (one task per request), against a local mock OpenAI server
+that counts the calls it receives. Runs every burst with single-flight
+coalescing on and off and reports upstream calls, latency and whether every
+caller got the same answer. The response cache is off so that only
+coalescing can save calls.
+
+Usage: python benchmarks/bench_coalescing.py [--requests 500] [--first-token-delay 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+from mock_openai import MockOpenAI
+
+SPELLINGS = [
+    "Tell me about the Nestlé Cocoa Plan",
+    "tell me about the nestlé cocoa plan",
+    "Tell me  about the Nestlé Cocoa Plan ",
+]
+
+
+def answer_of(path, body):
+    """Final answer from a /chat JSON body or a /chat/stream event stream"""
+    if path == '/chat':
+        return json.loads(body)['response']
+    events = [block for block in body.split('\n\n') if block.startswith('event: done')]
+    return json.loads(events[-1].split('data: ', 1)[1])['response'] if events else None
+
+
+def sync_burst(app_module, path, count):
+    """count threads posting at once; returns (latencies ms, answers)"""
+    barrier = threading.Barrier(count)
+    latencies = [0.0] * count
+    answers = [None] * count
+
+    def worker(index):
+        client = app_module.app.test_client()
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post(path, json={'message': SPELLINGS[index % len(SPELLINGS)]})
+        body = response.get_data(as_text=True)
+        latencies[index] = (time.perf_counter() - start) * 1000
+        answers[index] = answer_of(path, body)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, answers
+
+
+def async_burst(application, path, count):
+    """count concurrent tasks against the ASGI app; returns (latencies ms, answers)"""
+    import httpx
+
+    async def run():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+            async def one(index):
+                start = time.perf_counter()
+                response = await client.post(path, json={'message': SPELLINGS[index % len(SPELLINGS)]})
+                return (time.perf_counter() - start) * 1000, answer_of(path, response.text)
+
+            results = await asyncio.gather(*(one(index) for index in range(count)))
+        return [latency for latency, _ in results], [answer for _, answer in results]
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--first-token-delay', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(args.first_token_delay, args.token_delay, 40).start()
+    os.environ.update(
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH='',
+        RESPONSE_CACHE_SIZE='0',
+        CRAWL_MAX_PAGES='40',
+        CRAWL_RATE_PER_HOST='0',
+        KNOWLEDGE_REFRESH_INTERVAL='0',
+        ASYNC_MAX_CONCURRENCY=str(args.requests),
+        ASYNC_MAX_QUEUE=str(args.requests)
+    )
+    logging.disable(logging.CRITICAL)
+
+    import app
+    import asgi
+
+    bot = app.nestle_bot
+    print(f"Burst of {args.requests} identical questions ({len(SPELLINGS)} spellings), mock LLM first token "
+          f"{args.first_token_delay * 1000:.0f} ms, response cache off")
+    print(f"{'mode':<7}{'path':<14}{'coalescing':<12}{'upstream calls':>15}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}  answers")
+    for mode in ('sync', 'async'):
+        flights = bot.llm_flights if mode == 'sync' else bot.async_llm_flights
+        for path in ('/chat', '/chat/stream'):
+            for enabled in (True, False):
+                flights.enabled = enabled
+                calls_before = llm.call_count
+                if mode == 'sync':
+                    latencies, answers = sync_burst(app, path, args.requests)
+                else:
+                    latencies, answers = async_burst(asgi.application, path, args.requests)
+                ordered = sorted(latencies)
+                distinct = len(set(answers))
+                failed = sum(1 for answer in answers if not answer or answer == app.GENERIC_ERROR_MESSAGE)
+                outcome = f"{failed} failed" if failed else f"{distinct} distinct"
+                print(f"{mode:<7}{path:<14}{'on' if enabled else 'off':<12}{llm.call_count - calls_before:>15}"
+                      f"{statistics.median(ordered):>9.0f}{ordered[int(0.95 * (len(ordered) - 1))]:>9.0f}{ordered[-1]:>9.0f}"
+                      f"  {outcome}")
+    site.stop()
+    llm.stop()
+
+
+if __name__ == '__main__':
+    main()
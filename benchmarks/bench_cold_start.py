@@ -0,0 +1,79 @@
+"""
+Benchmark: worker cold start with and without a knowledge base snapshot
+
+Starts fresh Python processes that import app against the local fixture site.
+The first run has no snapshot, so it crawls and then writes one. Later runs
+load that snapshot and refresh in the background. Reports the time from
+interpreter start until the knowledge base is ready to serve.
+
+Usage: python benchmarks/bench_cold_start.py [--pages 200] [--latency 0.1] [--runs 3]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+
+WORKER_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+print(json.dumps({
+    'import_ms': round((time.perf_counter() - started) * 1000, 1),
+    'startup': app.nestle_bot.startup_stats,
+    'pages': len(app.nestle_bot.knowledge_base),
+}))
+"""
+
+
+def start_worker(env):
+    """Import app in a fresh interpreter and return its startup report"""
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER_SCRIPT], cwd=REPO_ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200, help='crawl page budget')
+    parser.add_argument('--latency', type=float, default=0.1, help='fixture site latency in seconds')
+    parser.add_argument('--runs', type=int, default=3, help='snapshot starts to time')
+    parser.add_argument('--compress', action='store_true', help='write a zlib-compressed snapshot')
+    args = parser.parse_args()
+
+    site = FixtureSite(latency=args.latency, page_count=args.pages * 2).start()
+    snapshot_dir = tempfile.mkdtemp(prefix='kb-snapshot-')
+    snapshot_path = os.path.join(snapshot_dir, 'knowledge_snapshot.bin')
+    env = dict(
+        os.environ,
+        NESTLE_BASE_URL=site.base_url,
+        CRAWL_MAX_PAGES=str(args.pages),
+        CRAWL_MAX_DEPTH='3',
+        KB_SNAPSHOT_PATH=snapshot_path,
+        KB_SNAPSHOT_COMPRESS='true' if args.compress else 'false',
+        OPENAI_API_KEY=''
+    )
+
+    print(f"{'start':<12}{'source':<10}{'pages':>7}{'ready ms':>10}{'import ms':>11}")
+    reports = [('cold', start_worker(env))]
+    reports += [(f'snapshot {run + 1}', start_worker(env)) for run in range(args.runs)]
+    for label, report in reports:
+        startup = report['startup']
+        print(f"{label:<12}{startup['source']:<10}{report['pages']:>7}{startup['ready_ms']:>10.0f}{report['import_ms']:>11.0f}")
+
+    print(f"Snapshot size: {os.path.getsize(snapshot_path) / 1024:.0f} KiB ({'compressed' if args.compress else 'uncompressed'})")
+    site.stop()
+
+
+if __name__ == '__main__':
+    main()
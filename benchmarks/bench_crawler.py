@@ -0,0 +1,70 @@
+"""
+Benchmark: concurrent crawler against a local fixture site with injected latency
+
+Crawls the fixture copy of the site with increasing worker counts (1 worker is
+the old serial behaviour) and reports wall time, throughput and per-page
+fetch/parse timings.
+
+Usage: python benchmarks/bench_crawler.py [--latency 0.2] [--pages 50] [--depth 2]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import SECTIONS, FixtureSite
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds added to every response')
+    parser.add_argument('--pages', type=int, default=50, help='crawl page budget')
+    parser.add_argument('--depth', type=int, default=2, help='link depth to follow')
+    parser.add_argument('--rate', type=float, default=0.0, help='per-host requests/second (0 = unlimited)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    os.environ['NESTLE_BASE_URL'] = site.base_url
+    os.environ.setdefault('CRAWL_MAX_PAGES', '6')
+    os.environ.setdefault('CRAWL_MAX_DEPTH', '0')
+
+    from app import EnhancedNestleWebScraper
+    from crawler import SiteCrawler
+
+    site.latency = args.latency
+    seeds = [site.base_url + path for path in SECTIONS]
+
+    print(f"Fixture latency {args.latency * 1000:.0f} ms, budget {args.pages} pages, depth {args.depth}")
+    print(f"{'workers':>8}{'pages':>7}{'wall s':>9}{'pages/s':>9}{'fetch p50':>11}{'fetch p95':>11}{'parse p50':>11}")
+    for workers in args.workers:
+        scraper = EnhancedNestleWebScraper()
+        crawler = SiteCrawler(
+            scraper.session, scraper.parse_page, allowed_prefix=site.base_url,
+            max_workers=workers, max_depth=args.depth, max_pages=args.pages,
+            requests_per_second=args.rate
+        )
+        pages, stats = crawler.crawl(seeds)
+        timings = [page for page in stats['pages'] if 'error' not in page]
+        fetch = [page['fetch_ms'] for page in timings]
+        parse = [page['parse_ms'] for page in timings]
+        wall = stats['elapsed_ms'] / 1000
+        print(
+            f"{workers:>8}{len(pages):>7}{wall:>9.2f}{len(pages) / wall:>9.1f}"
+            f"{statistics.median(fetch):>11.1f}{percentile(fetch, 0.95):>11.1f}{statistics.median(parse):>11.1f}"
+        )
+
+    site.stop()
+
+
+if __name__ == '__main__':
+    main()
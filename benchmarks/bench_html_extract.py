@@ -0,0 +1,96 @@
+"""
+Benchmark: single-pass HTML extraction vs. the BeautifulSoup tree walk
+
+Parses every saved page in benchmarks/fixtures/html with PageParser twice,
+once with HTML_EXTRACTOR=soup (BeautifulSoup, decompose + get_text + find_all
++ select) and once with HTML_EXTRACTOR=fast (html_extract.py), and reports the
+median parse time and the tracemalloc peak per page. The two records must be
+identical apart from scraped_at. Pages declaring a non-UTF-8 charset take the
+BeautifulSoup fallback on the fast path and are marked as such.
+
+Usage: python benchmarks/bench_html_extract.py [--repeat 20] [--fixtures benchmarks/fixtures/html]
+"""
+
+import argparse
+import gc
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+
+def parse_with(page_parser, extractor, html):
+    page_parser.extractor = extractor
+    record = page_parser.parse_page('https://www.madewithnestle.ca/fixture', html)
+    record.pop('scraped_at')
+    return record
+
+
+def median_ms(function, repeat):
+    function()
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def peak_kb(function):
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--fixtures', default=FIXTURES)
+    args = parser.parse_args()
+
+    # Importing app starts the usual background knowledge refresh; keep its logging out of the table
+    logging.disable(logging.CRITICAL)
+    import app as chatbot
+    from html_extract import ExtractionFallback, decode_markup
+
+    page_parser = chatbot.EnhancedNestleWebScraper().page_parser
+
+    print(f"{'page':<38}{'KB':>6}{'soup ms':>9}{'fast ms':>9}{'speedup':>9}{'soup peak KB':>14}{'fast peak KB':>14}{'match':>7}")
+    totals = {'soup': 0.0, 'fast': 0.0}
+    for name in sorted(os.listdir(args.fixtures)):
+        with open(os.path.join(args.fixtures, name), 'rb') as f:
+            html = f.read()
+        try:
+            decode_markup(html)
+            fallback = ''
+        except ExtractionFallback:
+            fallback = ' (fallback)'
+
+        results = {}
+        for extractor in ('soup', 'fast'):
+            parse = lambda: parse_with(page_parser, extractor, html)
+            results[extractor] = (median_ms(parse, args.repeat), peak_kb(parse), parse())
+            totals[extractor] += results[extractor][0]
+
+        soup_ms, soup_peak, soup_record = results['soup']
+        fast_ms, fast_peak, fast_record = results['fast']
+        match = 'yes' if soup_record == fast_record else 'NO'
+        print(f"{name + fallback:<38}{len(html) / 1024:>6.0f}{soup_ms:>9.2f}{fast_ms:>9.2f}{soup_ms / fast_ms:>8.1f}x"
+              f"{soup_peak:>14.0f}{fast_peak:>14.0f}{match:>7}")
+
+    print(f"Corpus total: soup {totals['soup']:.1f} ms, fast {totals['fast']:.1f} ms "
+          f"({totals['soup'] / totals['fast']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
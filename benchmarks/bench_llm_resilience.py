@@ -0,0 +1,180 @@
+"""
+Benchmark: /chat against a failing, slow or hanging LLM provider
+
+Serves /chat (Flask test client, fixture site, response cache off, a
+different question each time) against the local mock OpenAI server with
+faults injected, and reports for each scenario how many answers came from
+the LLM, from the retrieval-only fallback or failed, their latency, and the
+upstream calls made:
+
+- 30% of calls answered 500, without and with retries (jittered backoff)
+- 10% of calls 1.5 s slower, without and with hedged requests
+- a provider that hangs, under a 2 s deadline
+- a full outage (every call 503): the circuit breaker opens and chats fail
+  fast to the fallback, /chat/stream and the async /chat included, then the
+  provider recovers and one trial call closes the circuit again
+
+Usage: python benchmarks/bench_llm_resilience.py [--requests 100]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+from mock_openai import WORDS, MockOpenAI
+
+QUESTIONS = [
+    "Tell me about the Nestlé Cocoa Plan",
+    "Which chocolate is good for baking cookies?",
+    "What is KitKat made of?",
+    "What sustainability work does Nestlé do?",
+    "Do you have recipes with Smarties?",
+]
+FALLBACK_PREFIX = "Our AI assistant is temporarily unavailable"
+
+
+def classify(app_module, response):
+    if response.startswith(WORDS[0]):
+        return 'llm'
+    if response.startswith(FALLBACK_PREFIX) or response == app_module.AI_UNAVAILABLE_MESSAGE:
+        return 'fallback'
+    return 'failed'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Runner:
+    def __init__(self, app_module, llm):
+        self.app = app_module
+        self.llm = llm
+        self.client = app_module.app.test_client()
+        self.sequence = 0
+
+    def ask(self, path='/chat'):
+        """(kind, latency ms) of one question with a fresh prompt"""
+        self.sequence += 1
+        message = f"{QUESTIONS[self.sequence % len(QUESTIONS)]} ({self.sequence})"
+        start = time.perf_counter()
+        response = self.client.post(path, json={'message': message})
+        latency = (time.perf_counter() - start) * 1000
+        if path == '/chat':
+            answer = response.get_json()['response']
+        else:
+            done = [block for block in response.get_data(as_text=True).split('\n\n') if block.startswith('event: done')]
+            answer = json.loads(done[-1].split('data: ', 1)[1])['response'] if done else ''
+        return classify(self.app, answer), latency
+
+    def scenario(self, label, count, **policy):
+        client = self.app.llm_client
+        for name, value in policy.items():
+            setattr(client, name, value)
+        self.app.LLM_BREAKER.record_success()
+        calls = self.llm.call_count
+        hedges = client.hedges
+        results = [self.ask() for _ in range(count)]
+        self.report(label, results, self.llm.call_count - calls, client.hedges - hedges)
+
+    def report(self, label, results, upstream, hedges=0):
+        latencies = [latency for _, latency in results]
+        kinds = [kind for kind, _ in results]
+        print(f"{label:<38}{kinds.count('llm'):>5}{kinds.count('fallback'):>9}{kinds.count('failed'):>7}"
+              f"{statistics.median(latencies):>8.0f}{percentile(latencies, 0.95):>8.0f}{percentile(latencies, 0.99):>8.0f}"
+              f"{upstream:>10}{hedges:>8}")
+
+
+def ask_async(app_module, message):
+    import httpx
+    import asgi
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as client:
+            response = await client.post('/chat', json={'message': message})
+            return response.json()['response']
+
+    return classify(app_module, asyncio.run(run()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(0.05, 0.002, 20, seed=args.seed).start()
+    os.environ.update(
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH='',
+        RESPONSE_CACHE_SIZE='0',
+        CRAWL_MAX_PAGES='40',
+        CRAWL_RATE_PER_HOST='0',
+        KNOWLEDGE_REFRESH_INTERVAL='0'
+    )
+    logging.disable(logging.CRITICAL)
+
+    import app
+
+    runner = Runner(app, llm)
+    breaker = app.LLM_BREAKER
+    breaker.failure_threshold = 0  # off until the outage scenario
+    base = dict(max_retries=0, hedge_after=0, deadline=20, attempt_timeout=10)
+    print(f"{'scenario':<38}{'llm':>5}{'fallback':>9}{'failed':>7}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}"
+          f"{'upstream':>10}{'hedges':>8}")
+
+    runner.scenario('healthy', args.requests, **base)
+
+    llm.error_rate = 0.3
+    runner.scenario('30% errors, no retries', args.requests, **base)
+    runner.scenario('30% errors, 2 retries', args.requests, **dict(base, max_retries=2))
+    llm.error_rate = 0.0
+
+    llm.slow_rate, llm.slow_delay = 0.1, 1.5
+    runner.scenario('10% slow (+1.5 s), no hedging', args.requests, **base)
+    runner.scenario('10% slow (+1.5 s), hedge after 250 ms', args.requests, **dict(base, hedge_after=0.25))
+
+    llm.slow_rate, llm.slow_delay = 1.0, 30
+    runner.scenario('provider hangs, 2 s deadline', 5, **dict(base, max_retries=2, deadline=2, attempt_timeout=1))
+    llm.slow_rate, llm.slow_delay = 0.0, 0.0
+
+    # Outage: the breaker opens after 5 failed calls and rejects calls until the provider has had time to recover
+    breaker.failure_threshold, breaker.reset_timeout = 5, 2.0
+    for name, value in dict(base, max_retries=2).items():
+        setattr(app.llm_client, name, value)
+    llm.error_rate, llm.error_status = 1.0, 503
+    breaker.record_success()
+    calls = llm.call_count
+    results = [runner.ask() for _ in range(args.requests)]
+    runner.report('outage (503), circuit breaker', results, llm.call_count - calls)
+    opened_ms = statistics.median([latency for _, latency in results[:5]])
+    fast_ms = statistics.median([latency for _, latency in results[5:]] or [0])
+    stream_kind, _ = runner.ask('/chat/stream')
+    async_kind = ask_async(app, "Tell me about the Nestlé Cocoa Plan (async)")
+    state = breaker.stats()
+    print(f"  circuit {state['state']} after {state['opened']} opening(s); p50 {opened_ms:.0f} ms while failing, "
+          f"{fast_ms:.0f} ms once open ({state['rejected']} calls rejected); /chat/stream: {stream_kind}, async /chat: {async_kind}")
+
+    llm.error_rate = 0.0
+    time.sleep(breaker.reset_timeout)
+    kind, latency = runner.ask()
+    print(f"  provider recovered: trial call {kind} in {latency:.0f} ms, circuit {breaker.stats()['state']}")
+    site.stop()
+    llm.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: cost of the stage latency instrumentation
+
+Times a bare StageTimer block and a direct observe() call, then serves the
+same /chat questions (Flask test client, fixture site, mock OpenAI server
+with no delay, response cache off) with metrics enabled and disabled,
+alternating rounds. Reports the per-request difference and prints the
+stage quantiles /metrics exported for the run.
+
+Usage: python benchmarks/bench_metrics.py [--rounds 10]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+from metrics import Metrics
+from mock_openai import MockOpenAI
+
+QUESTIONS = [
+    "What is KitKat made of?",
+    "Tell me about the Nestlé Cocoa Plan",
+    "Which chocolate is good for baking cookies?",
+    "How many coffee products are there?",
+    "Where can I buy Aero online?",
+]
+
+
+def time_loop(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    def timed_block():
+        with metrics.timer('bench'):
+            pass
+
+    empty_ns = time_loop(lambda: None, args.iterations)
+    timer_ns = time_loop(timed_block, args.iterations) - empty_ns
+    observe_ns = time_loop(lambda: metrics.observe('bench', 0.001), args.iterations) - empty_ns
+    metrics.enabled = False
+    disabled_ns = time_loop(timed_block, args.iterations) - empty_ns
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(0, 0, 40).start()
+    os.environ.update(
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH='',
+        RESPONSE_CACHE_SIZE='0',
+        CRAWL_MAX_PAGES='40',
+        CRAWL_RATE_PER_HOST='0'
+    )
+    logging.disable(logging.CRITICAL)
+
+    import app
+
+    client = app.app.test_client()
+    latencies = {True: [], False: []}
+    for question in QUESTIONS:
+        client.post('/chat', json={'message': question})
+    for round_number in range(args.rounds * 2):
+        enabled = round_number % 2 == 0
+        app.METRICS.enabled = enabled
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            client.post('/chat', json={'message': question}).get_json()
+            latencies[enabled].append((time.perf_counter() - start) * 1000)
+    app.METRICS.enabled = True
+    exported = client.get('/metrics').get_data(as_text=True)
+    site.stop()
+
+    print(f"Timer block: {timer_ns:.0f} ns, observe(): {observe_ns:.0f} ns, disabled timer: {disabled_ns:.0f} ns")
+    on, off = statistics.median(latencies[True]), statistics.median(latencies[False])
+    print(f"/chat p50 with metrics {on:.2f} ms, without {off:.2f} ms "
+          f"({len(latencies[True])} requests each, mock LLM with no delay; difference {on - off:+.3f} ms)")
+    print("Exported stage quantiles (seconds):")
+    for line in exported.splitlines():
+        if line.startswith('nestle_chatbot_stage_quantile_seconds{') and 'quantile="0.5"' in line:
+            print(f"  {line}")
+    print(f"/metrics: {len(exported.splitlines())} lines, {len(exported) / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
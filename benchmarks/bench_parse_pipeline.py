@@ -0,0 +1,105 @@
+"""
+Benchmark: crawl throughput with parsing inline vs. in a pool of parser processes
+
+Serves the fixture site from a separate process (so its threads do not share
+the crawler's GIL), then crawls it with each parse-worker count (0 = parse in
+the fetch threads, the old behaviour) for both extractors, and reports pages
+per second, total parse time and how soon the first parsed page was handed to
+on_parsed. Every configuration must produce the same records.
+
+Usage: python benchmarks/bench_parse_pipeline.py [--pages 200] [--parse-workers 0 1 2 4]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler import SiteCrawler
+from page_parser import PageParser
+from query_matcher import KeywordMatcher
+
+CATEGORY_KEYWORDS = [
+    ('coffee', ['coffee', 'espresso', 'nescafe']),
+    ('chocolate', ['kitkat', 'smarties', 'aero', 'quality']),
+    ('recipe', ['recipe', 'baking', 'cookie'])
+]
+SEED_PATHS = ['/', '/search/products', '/search/recipes', '/help', '/about', '/sustainability']
+
+
+def start_fixture_site(latency):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixture_site.py')
+    process = subprocess.Popen([sys.executable, script, '--port', str(port), '--latency', str(latency)],
+                               stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('fixture site did not start')
+
+
+def crawl(base_url, extractor, parse_workers, args):
+    page_parser = PageParser(base_url, KeywordMatcher().add_table('category', CATEGORY_KEYWORDS).build(), extractor=extractor)
+    crawler = SiteCrawler(
+        requests.Session(), page_parser.parse_page, allowed_prefix=base_url,
+        max_workers=args.fetch_workers, max_depth=args.depth, max_pages=args.pages,
+        requests_per_second=0, parse_workers=parse_workers
+    )
+    # The crawler starts its parse worker processes when it is created; they are long-lived in the app
+
+    started = time.perf_counter()
+    first_merge = []
+    pages, stats = crawler.crawl(
+        [base_url + path for path in SEED_PATHS],
+        on_parsed=lambda url, record: first_merge or first_merge.append(time.perf_counter() - started)
+    )
+    crawler.close()
+    records = {url: {key: value for key, value in record.items() if key != 'scraped_at'} for url, record in pages.items()}
+    return stats, first_merge[0] * 1000 if first_merge else 0.0, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--parse-workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--extractors', nargs='+', default=['soup', 'fast'])
+    args = parser.parse_args()
+
+    process, base_url = start_fixture_site(args.latency)
+    try:
+        print(f"{os.cpu_count()} CPUs, {args.fetch_workers} fetch threads, budget {args.pages} pages, "
+              f"latency {args.latency * 1000:.0f} ms")
+        print(f"{'extractor':<11}{'parse workers':>14}{'pages':>7}{'wall s':>8}{'pages/s':>9}"
+              f"{'parse ms':>10}{'first merge ms':>16}{'same records':>14}")
+        reference = None
+        for extractor in args.extractors:
+            for parse_workers in args.parse_workers:
+                stats, first_merge_ms, records = crawl(base_url, extractor, parse_workers, args)
+                reference = reference or records
+                print(f"{extractor:<11}{parse_workers or 'inline':>14}{stats['pages_crawled']:>7}"
+                      f"{stats['elapsed_ms'] / 1000:>8.2f}{stats['pages_per_second']:>9.1f}"
+                      f"{stats['total_parse_ms']:>10.0f}{first_merge_ms:>16.1f}"
+                      f"{'yes' if records == reference else 'NO':>14}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    main()
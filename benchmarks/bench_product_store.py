@@ -0,0 +1,148 @@
+"""
+Benchmark: product catalogue memory and lookups at catalogue scale
+
+Builds a synthetic catalogue of N SKUs (default 50k) with PRODUCT_DATA
+fields and measures, with tracemalloc, the memory per SKU of the old layout
+(a dict per product) against ProductStore, and of a keyword automaton over
+every name (the old product detector). Then times key and alias lookups,
+product detection in chat messages, filtered listings, /products pages
+serialized cold vs. served from the page cache (against serializing the
+whole catalogue, as /products used to), and adding scraped products to a
+fork of the store.
+
+Usage: python benchmarks/bench_product_store.py [--products 50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import BRANDS
+from product_store import ProductStore
+from query_matcher import KeywordMatcher
+
+VARIANTS = ['Original', 'Dark', 'White', 'Mint', 'Caramel', 'Hazelnut', 'Salted', 'Mini', 'Chunky', 'Limited']
+CATEGORIES = [
+    ['chocolate', 'wafer', 'snacks'], ['chocolate', 'candy'], ['coffee', 'instant'], ['coffee', 'pods'],
+    ['baking', 'chips'], ['chocolate', 'premium', 'gift'], ['pet food', 'dry'], ['water', 'sparkling']
+]
+SIZES = [['42g', '4-pack'], ['38g tube', '6-pack', 'Party size'], ['240g', '480g', '720g tin'], ['100g'], ['1kg']]
+TEMPLATES = [
+    "Where can I buy {name} near me?",
+    "Can I order {name} online from Amazon?",
+    "What is {name} made of?",
+    "Tell me about the Nestlé Cocoa Plan and your sustainability goals",
+]
+
+
+def make_catalogue(count, rng):
+    catalogue = {}
+    while len(catalogue) < count:
+        name = f"{rng.choice(BRANDS)} {rng.choice(VARIANTS)} {rng.randint(10, 99999)}g"
+        catalogue[name.lower()] = {
+            'name': name,
+            'description': f"{name}: {rng.choice(['crispy', 'smooth', 'rich', 'bold'])} and made in Canada",
+            'amazon_url': f"https://www.amazon.ca/dp/B0{rng.randint(10 ** 7, 10 ** 8 - 1)}",
+            'categories': list(rng.choice(CATEGORIES)),
+            'available_sizes': list(rng.choice(SIZES))
+        }
+    return catalogue
+
+
+def measure(build):
+    """(result, bytes allocated and still held by it)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, held
+
+
+def per_call_us(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--scraped', type=int, default=500, help='scraped products added to a fork')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Serialized and parsed back so both layouts start from freshly loaded (unshared) strings
+    raw = json.dumps(make_catalogue(args.products, rng))
+
+    def build_store():
+        return ProductStore(dict(product, key=key) for key, product in json.loads(raw).items())
+
+    dicts, dict_bytes = measure(lambda: json.loads(raw))
+    store, store_bytes = measure(build_store)
+    start = time.perf_counter()
+    store = build_store()
+    build_s = time.perf_counter() - start
+
+    def build_automaton():
+        matcher = KeywordMatcher()
+        for key, product in dicts.items():
+            matcher.add(key, 'product', key)
+            matcher.add(product['name'], 'product', key)
+        return matcher.build()
+
+    automaton, automaton_bytes = measure(build_automaton)
+    del automaton
+    start = time.perf_counter()
+    build_automaton()
+    automaton_s = time.perf_counter() - start
+
+    print(f"{len(store)} SKUs: ProductStore built in {build_s:.2f} s, name automaton in {automaton_s:.2f} s")
+    print(f"{'layout':<34}{'MiB':>8}{'bytes/SKU':>11}")
+    for label, size in (('dict per product (PRODUCT_DATA)', dict_bytes), ('ProductStore (data + indexes)', store_bytes),
+                        ('name automaton (old detector)', automaton_bytes)):
+        print(f"{label:<34}{size / 2 ** 20:>8.1f}{size / len(store):>11.0f}")
+
+    keys = list(dicts)
+    names = [dicts[key]['name'] for key in rng.sample(keys, 2000)]
+    messages = [rng.choice(TEMPLATES).format(name=rng.choice(names)) for _ in range(args.messages)]
+    detected = sum(1 for message in messages if store.match(message))
+    print(f"{'operation':<40}{'us/call':>10}")
+    print(f"{'get(key)':<40}{per_call_us(store.get, keys[:5000]):>10.2f}")
+    print(f"{'find(name)':<40}{per_call_us(store.find, names):>10.2f}")
+    print(f"{'match(message)':<40}{per_call_us(store.match, messages):>10.2f}   ({detected}/{len(messages)} found a product)")
+    for label, filters in (('select(category)', {'category': 'coffee'}),
+                           ('select(category, size)', {'category': 'chocolate', 'size': '42g'}),
+                           ('select(search)', {'search': 'dark'})):
+        print(f"{label:<40}{per_call_us(lambda _: store.select(**filters), range(20)):>10.0f}   "
+              f"({len(store.select(**filters))} rows)")
+
+    pages = [(page, filters) for page in range(1, 21) for filters in ({}, {'category': 'coffee'}, {'search': 'mint'})]
+    cold = per_call_us(lambda item: store.page_json(item[0], 50, **item[1]), pages)
+    cached = per_call_us(lambda item: store.page_json(item[0], 50, **item[1]), pages)
+    start = time.perf_counter()
+    whole = json.dumps(dicts)
+    whole_ms = (time.perf_counter() - start) * 1000
+    print(f"{'page_json(50 per page), first request':<40}{cold:>10.0f}")
+    print(f"{'page_json(50 per page), cached':<40}{cached:>10.2f}")
+    print(f"{'whole catalogue as JSON (old /products)':<40}{whole_ms * 1000:>10.0f}   ({len(whole) / 2 ** 20:.1f} MiB)")
+
+    scraped = [{'name': f"Scraped {rng.choice(BRANDS)} {index}", 'category': 'chocolate', 'url': '/p'} for index in range(args.scraped)]
+    start = time.perf_counter()
+    forked = store.with_products(scraped)
+    print(f"with_products({args.scraped} scraped): {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(forked)} SKUs; base store unchanged at {len(store)}")
+
+
+if __name__ == '__main__':
+    main()
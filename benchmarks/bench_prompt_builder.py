@@ -0,0 +1,147 @@
+"""
+Benchmark: prompt size with the prompt builder vs. the previous prompt assembly
+
+Crawls the local fixture site into a chatbot, then builds the LLM messages for
+a set of questions twice: with the previous build_llm_messages (indented
+system prompt, passages pasted as retrieved within RETRIEVAL_TOKEN_BUDGET) and
+with the prompt builder (fixed system prompt, repeated boilerplate dropped,
+passages packed into the same budget). Reports prompt tokens per request, the
+distinct context words that budget buys, the prefix every request shares (what
+provider-side prompt caching can reuse) and whether the system prompt stayed
+byte-identical. Token counts are exact when tiktoken is installed.
+
+Usage: python benchmarks/bench_prompt_builder.py [--pages 60]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+
+QUESTIONS = [
+    'Tell me about KitKat',
+    'Which chocolate is good for baking cookies?',
+    'How is the cocoa sourced?',
+    'Where can I find allergen details and ingredients?',
+    'What pairs well with coffee?',
+    'Do you have recipes with Smarties?',
+    'What is the Nestlé Cocoa Plan?',
+    'Tell me about Nescafé Gold Espresso',
+    'How should I store Aero bars?',
+    'What sustainability work does Nestlé do?',
+    'Are the recipes tested?',
+    'Give me a Turtles cookie recipe'
+]
+
+
+def legacy_messages(bot, user_message):
+    """The previous build_llm_messages"""
+    relevant_info = bot.search_knowledge_base(user_message)
+
+    context = ""
+    if relevant_info:
+        context = "Based on information from the Made with Nestlé Canada website:\n\n"
+        for info in relevant_info:
+            context += f"From {info['title']}: {info['text']}\n\n"
+
+    system_prompt = """You are SMARTIE, a helpful assistant for the Made with Nestlé Canada website. 
+        You help users find information about Nestlé products, recipes, nutrition, sustainability practices, and general inquiries.
+        
+        Always be friendly, helpful, and provide accurate information based on the context provided.
+        If you don't have specific information, suggest where users might find it on the website.
+        Keep responses conversational but informative.
+        
+        When providing information, always try to include relevant links when available.
+        
+        You can also help users find stores, purchase products online, and get product counts."""
+
+    user_prompt = f"""User question: {user_message}
+        
+        Context from website:
+        {context}
+        
+        Please provide a helpful response to the user's question. If you reference specific information, mention that it comes from the Made with Nestlé Canada website."""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def shared_prefix(prompts):
+    prefix = prompts[0]
+    for prompt in prompts[1:]:
+        length = 0
+        while length < min(len(prefix), len(prompt)) and prefix[length] == prompt[length]:
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+
+def summarize(label, results, counter, baseline=None):
+    tokens = [result['tokens'] for result in results]
+    words = [result['words'] for result in results]
+    prefix = shared_prefix([result['flat'] for result in results])
+    average = statistics.mean(tokens)
+    savings = f"{(1 - average / baseline) * 100:>8.1f}%" if baseline else f"{'':>9}"
+    print(f"{label:<10}{average:>11.1f}{max(tokens):>9}{savings}{statistics.mean(words):>16.1f}"
+          f"{statistics.mean(result['words'] / result['tokens'] for result in results) * 100:>15.1f}"
+          f"{counter.count(prefix):>15}")
+    return average
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=60, help='crawl page budget')
+    args = parser.parse_args()
+
+    site = FixtureSite(latency=0).start()
+    os.environ['NESTLE_BASE_URL'] = site.base_url
+    os.environ['CRAWL_MAX_PAGES'] = str(args.pages)
+    os.environ.setdefault('CRAWL_MAX_DEPTH', '2')
+    os.environ.setdefault('CRAWL_RATE_PER_HOST', '0')
+    # One fetch thread so the same pages are crawled on every run
+    os.environ.setdefault('CRAWL_WORKERS', '1')
+    # Crawl on every run instead of loading the snapshot written when app is imported
+    os.environ['KB_SNAPSHOT_PATH'] = ''
+    logging.disable(logging.CRITICAL)
+
+    from app import EnhancedNestleChatbot
+    from prompt_builder import SYSTEM_PROMPT
+
+    bot = EnhancedNestleChatbot()
+    counter = bot.prompt_builder.counter
+    site.stop()
+
+    def measure(messages):
+        context = messages[1]['content']
+        return {
+            'tokens': counter.count_messages(messages),
+            'words': len({word.lower().strip('.,:;!?') for word in context.split()}),
+            'flat': ''.join(message['content'] for message in messages),
+            'system': messages[0]['content']
+        }
+
+    legacy = [measure(legacy_messages(bot, question)) for question in QUESTIONS]
+    built = [measure(bot.build_llm_messages(question)[0]) for question in QUESTIONS]
+
+    print(f"{len(bot.knowledge_base)} pages, {len(QUESTIONS)} questions, "
+          f"{'tiktoken' if counter.exact else 'estimated'} token counts for {counter.model}")
+    print(f"{'prompt':<10}{'avg tokens':>11}{'max':>9}{'saved':>9}{'distinct words':>16}"
+          f"{'words/100 tok':>15}{'shared prefix':>15}")
+    baseline = summarize('previous', legacy, counter)
+    summarize('builder', built, counter, baseline)
+
+    identical = {result['system'] for result in built} == {SYSTEM_PROMPT}
+    print(f"System prompt byte-identical across requests: {'yes' if identical else 'NO'} "
+          f"({counter.count(SYSTEM_PROMPT)} tokens)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: keyword automaton and product store vs. substring scans for query analysis
+
+Builds a synthetic catalogue of N products (default 10k), then analyzes a mix
+of chat messages two ways: the original approach (one `in` scan per intent
+keyword, then one per product key and name) and QueryMatcher (Aho-Corasick
+automaton over the keyword tables, product names looked up in a ProductStore
+built from the same catalogue). Both must agree on every message. Also times
+categorize_product over N scraped product names.
+
+Usage: python benchmarks/bench_query_matcher.py [--products 10000] [--messages 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import BRANDS
+from product_store import ProductStore
+from query_matcher import KeywordMatcher, QueryMatcher
+
+INTENT_KEYWORDS = [
+    ('location', ['near me', 'nearby', 'close by', 'where can i buy', 'stores near', 'in my area']),
+    ('count', ['how many', 'count', 'number of', 'total products']),
+    ('purchase', ['buy online', 'amazon', 'purchase', 'order online'])
+]
+COUNT_CATEGORY_KEYWORDS = [('coffee', ['coffee']), ('chocolate', ['chocolate']), ('recipe', ['recipe'])]
+PRODUCT_CATEGORY_KEYWORDS = [
+    ('coffee', ['coffee', 'espresso', 'nescafe']),
+    ('chocolate', ['kitkat', 'smarties', 'aero', 'quality']),
+    ('recipe', ['recipe', 'baking', 'cookie'])
+]
+
+VARIANTS = ['Original', 'Dark', 'White', 'Mint', 'Caramel', 'Hazelnut', 'Salted', 'Mini', 'Chunky', 'Limited']
+TEMPLATES = [
+    "Where can I buy {name} near me?",
+    "How many chocolate products do you have?",
+    "Can I order {name} online from Amazon?",
+    "What is {name} made of?",
+    "Tell me about the Nestlé Cocoa Plan and your sustainability goals",
+    "Is there a recipe that uses {name}?",
+]
+
+
+def make_catalogue(count, rng):
+    catalogue = {}
+    while len(catalogue) < count:
+        name = f"{rng.choice(BRANDS)} {rng.choice(VARIANTS)} {rng.randint(10, 9999)}g"
+        catalogue[name.lower()] = {'name': name}
+    return catalogue
+
+
+def naive_analyze(message, catalogue):
+    """The original detect_query_type + extract_product_from_message + count category scans"""
+    message_lower = message.lower()
+    query_type = 'general'
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(keyword in message_lower for keyword in keywords):
+            query_type = intent
+            break
+    product_key = None
+    for key, data in catalogue.items():
+        if key in message_lower or data['name'].lower() in message_lower:
+            product_key = key
+            break
+    category = None
+    for value, keywords in COUNT_CATEGORY_KEYWORDS:
+        if any(keyword in message_lower for keyword in keywords):
+            category = value
+            break
+    return {'query_type': query_type, 'product_key': product_key, 'category': category}
+
+
+def naive_categorize(name):
+    lower = name.lower()
+    for value, keywords in PRODUCT_CATEGORY_KEYWORDS:
+        if any(keyword in lower for keyword in keywords):
+            return value
+    return 'other'
+
+
+def timed(function, items):
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalogue = make_catalogue(args.products, rng)
+    names = [data['name'] for data in catalogue.values()]
+    messages = [rng.choice(TEMPLATES).format(name=rng.choice(names)) for _ in range(args.messages)]
+
+    start = time.perf_counter()
+    products = ProductStore(dict(data, key=key) for key, data in catalogue.items())
+    matcher = QueryMatcher(INTENT_KEYWORDS, products, COUNT_CATEGORY_KEYWORDS)
+    build_ms = (time.perf_counter() - start) * 1000
+    categorizer = KeywordMatcher().add_table('category', PRODUCT_CATEGORY_KEYWORDS).build()
+
+    naive_time, naive_results = timed(lambda message: naive_analyze(message, catalogue), messages)
+    matcher_time, matcher_results = timed(matcher.analyze, messages)
+    mismatches = sum(1 for a, b in zip(naive_results, matcher_results) if a != b)
+
+    naive_cat_time, naive_categories = timed(naive_categorize, names)
+    matcher_cat_time, matcher_categories = timed(lambda name: categorizer.match_field(name, 'category') or 'other', names)
+    cat_mismatches = sum(1 for a, b in zip(naive_categories, matcher_categories) if a != b)
+
+    print(f"Catalogue: {len(catalogue)} products ({len(products.aliases)} names in the product store, "
+          f"{matcher.matcher.keyword_count} automaton keywords, built in {build_ms:.0f} ms)")
+    print(f"{'operation':<28}{'substring scan us':>19}{'matcher us':>14}{'speedup':>9}{'mismatches':>12}")
+    print(f"{'analyze message':<28}{naive_time / len(messages) * 1e6:>19.1f}{matcher_time / len(messages) * 1e6:>14.1f}"
+          f"{naive_time / matcher_time:>8.0f}x{mismatches:>12}")
+    print(f"{'categorize product':<28}{naive_cat_time / len(names) * 1e6:>19.2f}{matcher_cat_time / len(names) * 1e6:>14.2f}"
+          f"{naive_cat_time / matcher_cat_time:>8.1f}x{cat_mismatches:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: question latency while the knowledge base refreshes in the background
+
+Crawls the local fixture site into a chatbot (snapshot in a temporary
+directory), then keeps a thread asking questions while refreshes are queued
+through POST /refresh-knowledge with a few pages changed before each one.
+Reports how long the endpoint takes to answer, how long each refresh job
+took, and search latency with no refresh running vs. during refreshes, plus
+the generations the questions saw (each question reads exactly one).
+
+Usage: python benchmarks/bench_refresh_swap.py [--pages 120] [--refreshes 3]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_site import FixtureSite
+
+QUESTIONS = [
+    'Tell me about KitKat',
+    'Which chocolate is good for baking cookies?',
+    'How is the cocoa sourced?',
+    'What pairs well with coffee?',
+    'Do you have recipes with Smarties?',
+    'What sustainability work does Nestlé do?'
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=120, help='crawl page budget')
+    parser.add_argument('--refreshes', type=int, default=3)
+    parser.add_argument('--changed', type=int, default=10, help='pages to modify before each refresh')
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    site = FixtureSite(latency=args.latency).start()
+    os.environ['NESTLE_BASE_URL'] = site.base_url
+    os.environ['CRAWL_MAX_PAGES'] = str(args.pages)
+    os.environ.setdefault('CRAWL_MAX_DEPTH', '2')
+    os.environ.setdefault('CRAWL_RATE_PER_HOST', '0')
+    os.environ['KB_SNAPSHOT_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench-swap-'), 'knowledge_snapshot.bin')
+    os.environ['KNOWLEDGE_REFRESH_INTERVAL'] = '0'
+    logging.disable(logging.CRITICAL)
+
+    import app
+
+    bot = app.nestle_bot
+    client = app.app.test_client()
+    # Let any startup refresh finish first
+    while bot.refresher.stats()['running_job'] or bot.refresher.stats()['queued_jobs']:
+        time.sleep(0.05)
+
+    refreshing = threading.Event()
+    stop = threading.Event()
+    latencies = {False: [], True: []}
+    generations = set()
+
+    def ask():
+        position = 0
+        while not stop.is_set():
+            during = refreshing.is_set()
+            start = time.perf_counter()
+            knowledge = bot.knowledge
+            bot.search_knowledge_base(QUESTIONS[position % len(QUESTIONS)], knowledge=knowledge)
+            latencies[during].append((time.perf_counter() - start) * 1000)
+            generations.add(knowledge.generation)
+            position += 1
+            time.sleep(0.002)
+
+    asker = threading.Thread(target=ask, daemon=True)
+    asker.start()
+    time.sleep(1.0)
+
+    post_ms = []
+    jobs = []
+    for round_number in range(args.refreshes):
+        for url in list(bot.knowledge_base)[round_number * args.changed:(round_number + 1) * args.changed]:
+            site.touch(url[len(site.base_url):])
+        refreshing.set()
+        start = time.perf_counter()
+        response = client.post('/refresh-knowledge')
+        post_ms.append((time.perf_counter() - start) * 1000)
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] in ('succeeded', 'coalesced', 'failed'):
+                break
+            time.sleep(0.02)
+        refreshing.clear()
+        jobs.append(job)
+        time.sleep(0.5)
+
+    stop.set()
+    asker.join()
+    site.stop()
+
+    print(f"{len(bot.knowledge_base)} pages, {args.refreshes} refreshes with {args.changed} pages changed each, "
+          f"{sum(len(values) for values in latencies.values())} searches")
+    print(f"POST /refresh-knowledge: p50 {statistics.median(post_ms):.1f} ms, max {max(post_ms):.1f} ms (202 + job id)")
+    for job in jobs:
+        result = job['result'] or {}
+        print(f"  job {job['job_id'][:8]}: {job['status']}, {result.get('status')}, generation {result.get('generation')}, "
+              f"{result.get('changed')} changed in {result.get('duration_ms', 0):.0f} ms")
+    print(f"{'search':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for during, label in ((False, 'idle'), (True, 'during refresh')):
+        values = latencies[during] or [0.0]
+        print(f"{label:<18}{len(latencies[during]):>8}{statistics.median(values):>10.2f}"
+              f"{percentile(values, 0.95):>10.2f}{max(values):>10.2f}")
+    print(f"Generations seen by questions: {sorted(generations)}")
+
+
+if __name__ == '__main__':
+    main()
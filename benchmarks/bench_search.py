@@ -0,0 +1,105 @@
+"""
+Benchmark: BM25 inverted index vs. the original linear-scan scorer
+
+Builds a synthetic corpus of pages with a Zipf-like vocabulary and times
+query latency for both the old search_knowledge_base scoring loop and the
+InvertedIndex used by the chatbot.
+
+Usage: python benchmarks/bench_search.py [--pages 10000] [--words 400]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import InvertedIndex
+
+PRODUCT_TERMS = [
+    'kitkat', 'smarties', 'aero', 'coffee', 'crisp', 'nescafe', 'espresso',
+    'chocolate', 'wafer', 'recipe', 'baking', 'cookie', 'sustainability',
+    'cocoa', 'quality', 'street', 'toffee', 'caramel', 'nutrition', 'allergen'
+]
+
+QUERIES = [
+    "How is KitKat made?",
+    "coffee crisp ingredients",
+    "chocolate chip cookie recipe with smarties",
+    "What is Nestle doing for cocoa sustainability",
+    "nescafe espresso nutrition facts",
+    "quality street toffee allergen information",
+]
+
+
+def build_corpus(page_count, words_per_page, seed=7):
+    """Generate synthetic pages mixing filler vocabulary with product terms"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)] + PRODUCT_TERMS * 5
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    corpus = {}
+    for page in range(page_count):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_page)
+        corpus[f"https://www.madewithnestle.ca/page/{page}"] = {
+            'title': f"Page {page}",
+            'text': ' '.join(words),
+        }
+    return corpus
+
+
+def linear_scan_search(knowledge_base, query):
+    """The original search_knowledge_base scoring loop"""
+    relevant_content = []
+    query_lower = query.lower()
+    for url, content in knowledge_base.items():
+        text_lower = content['text'].lower()
+        score = 0
+        for word in query_lower.split():
+            if word in text_lower:
+                score += text_lower.count(word)
+        if score > 0:
+            relevant_content.append((url, score))
+    relevant_content.sort(key=lambda x: x[1], reverse=True)
+    return relevant_content[:3]
+
+
+def time_queries(search, rounds):
+    """Return per-query latencies in milliseconds"""
+    latencies = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            start = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--words', type=int, default=400)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.pages, args.words)
+
+    start = time.perf_counter()
+    index = InvertedIndex.from_documents((url, page['text']) for url, page in corpus.items())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    linear = time_queries(lambda q: linear_scan_search(corpus, q), args.rounds)
+    bm25 = time_queries(lambda q: index.search(q, limit=3), args.rounds)
+
+    print(f"Corpus: {args.pages} pages x {args.words} words, {len(index.postings)} terms")
+    print(f"Index build: {build_ms:.0f} ms (once per refresh)")
+    print(f"{'scorer':<14}{'p50 ms':>10}{'max ms':>10}")
+    for name, latencies in (('linear scan', linear), ('bm25 index', bm25)):
+        print(f"{name:<14}{statistics.median(latencies):>10.2f}{max(latencies):>10.2f}")
+    print(f"Speedup (p50): {statistics.median(linear) / statistics.median(bm25):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: concurrency sustained by the sync (gunicorn) and async (uvicorn) serving modes
+
+Starts the fixture site and a deliberately slow mock OpenAI server, then runs
+the app under gunicorn exactly as startup.sh does for each SERVING_MODE and
+drives /chat with a closed loop of N concurrent clients per level. Reports
+completed requests/second, latency percentiles and how many requests were
+shed (503) or timed out (504 / client timeout).
+
+Usage: python benchmarks/bench_serving.py [--concurrency 4 16 64 256] [--duration 10] [--first-token-delay 1.0]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from fixture_site import FixtureSite
+from mock_openai import MockOpenAI
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_COMMANDS = {
+    'sync': ['gunicorn', '--workers', '2', '--timeout', '120', 'app:app'],
+    'async': ['gunicorn', '--workers', '2', '--timeout', '120', '-k', 'uvicorn.workers.UvicornWorker', 'asgi:application'],
+}
+
+QUESTIONS = [
+    "What is KitKat made of?",
+    "Tell me about the Nestlé Cocoa Plan",
+    "Which chocolate is good for baking cookies?",
+    "What does Coffee Crisp taste like?",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, env):
+    port = free_port()
+    command = SERVER_COMMANDS[mode][:1] + ['--bind', f'127.0.0.1:{port}'] + SERVER_COMMANDS[mode][1:]
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not become healthy")
+
+
+def run_level(base_url, concurrency, duration, client_timeout):
+    """Closed loop: each client sends its next request as soon as the last one finishes"""
+    results = {'ok': [], 'shed': 0, 'timeout': 0, 'error': 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        session = requests.Session()
+        count = 0
+        while time.perf_counter() < stop_at:
+            question = f"{QUESTIONS[count % len(QUESTIONS)]} (client {index}, request {count})"
+            count += 1
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/chat", json={'message': question}, timeout=client_timeout)
+                status = response.status_code
+            except requests.Timeout:
+                status = 504
+            except requests.RequestException:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    results['ok'].append(elapsed)
+                elif status == 503:
+                    results['shed'] += 1
+                elif status == 504:
+                    results['timeout'] += 1
+                else:
+                    results['error'] += 1
+            if status == 503:
+                time.sleep(0.05)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results['wall'] = time.perf_counter() - started
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=sorted(SERVER_COMMANDS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16, 64, 256])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--first-token-delay', type=float, default=1.0)
+    parser.add_argument('--token-delay', type=float, default=0.01)
+    parser.add_argument('--tokens', type=int, default=40)
+    parser.add_argument('--client-timeout', type=float, default=30.0)
+    parser.add_argument('--max-concurrency', type=int, default=64, help='ASYNC_MAX_CONCURRENCY per worker')
+    parser.add_argument('--max-queue', type=int, default=64, help='ASYNC_MAX_QUEUE per worker')
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(args.first_token_delay, args.token_delay, args.tokens).start()
+    snapshot_dir = tempfile.mkdtemp(prefix='bench-serving-')
+    env = dict(
+        os.environ,
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH=os.path.join(snapshot_dir, 'knowledge_snapshot.bin'),
+        RESPONSE_CACHE_SIZE='0',
+        CRAWL_MAX_PAGES='20',
+        CRAWL_RATE_PER_HOST='0',
+        ASYNC_MAX_CONCURRENCY=str(args.max_concurrency),
+        ASYNC_MAX_QUEUE=str(args.max_queue),
+        ASYNC_REQUEST_TIMEOUT=str(args.client_timeout)
+    )
+
+    llm_seconds = args.first_token_delay + args.token_delay * args.tokens
+    print(f"Mock LLM: {llm_seconds * 1000:.0f} ms per completion; 2 workers per mode; {args.duration:.0f}s per level")
+    print(f"{'mode':<7}{'clients':>8}{'ok':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'shed':>6}{'timeout':>9}{'error':>7}")
+    for mode in args.modes:
+        process, base_url = start_server(mode, env)
+        try:
+            for concurrency in args.concurrency:
+                results = run_level(base_url, concurrency, args.duration, args.client_timeout)
+                ok = [elapsed * 1000 for elapsed in results['ok']]
+                print(
+                    f"{mode:<7}{concurrency:>8}{len(ok):>7}{len(ok) / results['wall']:>8.1f}"
+                    f"{percentile(ok, 0.5):>9.0f}{percentile(ok, 0.95):>9.0f}{percentile(ok, 0.99):>9.0f}"
+                    f"{results['shed']:>6}{results['timeout']:>9}{results['error']:>7}"
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+    llm.stop()
+    site.stop()
+
+
+if __name__ == '__main__':
+    main()
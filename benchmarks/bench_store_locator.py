@@ -0,0 +1,124 @@
+"""
+Benchmark: k-d tree store locator vs. a brute-force haversine scan
+
+Generates N synthetic stores (default 100k) clustered around Canadian cities,
+then times k-nearest, product-filtered k-nearest and radius queries from
+random origins against a scan that computes the haversine distance to every
+store (what location-service.js did in the browser). Results are checked for
+agreement.
+
+Usage: python benchmarks/bench_store_locator.py [--stores 100000] [--queries 200]
+"""
+
+import argparse
+import gc
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store_locator import StoreLocator, haversine_km
+
+CITIES = [
+    (43.65, -79.38), (45.50, -73.57), (49.28, -123.12), (51.05, -114.07), (53.55, -113.49),
+    (45.42, -75.70), (49.90, -97.14), (46.81, -71.21), (44.65, -63.58), (43.59, -79.64)
+]
+PRODUCTS = ['KitKat', 'Smarties', 'Quality Street', 'Coffee Crisp', 'Aero', 'Butterfinger', 'Nescafé']
+CHAINS = ['Loblaws', 'Metro', 'Walmart Supercentre', 'Sobeys', 'No Frills', 'FreshCo', 'Shoppers Drug Mart']
+
+
+def make_stores(count, rng):
+    stores = []
+    for index in range(count):
+        latitude, longitude = rng.choice(CITIES)
+        stores.append({
+            'id': index + 1,
+            'name': rng.choice(CHAINS),
+            'address': f"{rng.randint(1, 9999)} Main St",
+            'phone': '',
+            'latitude': latitude + rng.gauss(0, 0.3),
+            'longitude': longitude + rng.gauss(0, 0.4),
+            'hours': '',
+            'products': rng.sample(PRODUCTS, rng.randint(1, 4))
+        })
+    return stores
+
+
+def brute_nearest(stores, latitude, longitude, k, max_distance_km=None, product=None):
+    candidates = (
+        (haversine_km(latitude, longitude, store['latitude'], store['longitude']), index)
+        for index, store in enumerate(stores)
+        if product is None or product in store['products']
+    )
+    if max_distance_km is not None:
+        candidates = (hit for hit in candidates if hit[0] <= max_distance_km)
+    return heapq.nsmallest(k, candidates)
+
+
+def brute_within(stores, latitude, longitude, radius_km):
+    hits = []
+    for index, store in enumerate(stores):
+        distance = haversine_km(latitude, longitude, store['latitude'], store['longitude'])
+        if distance <= radius_km:
+            hits.append((distance, index))
+    hits.sort()
+    return hits
+
+
+def timed(function, origins):
+    function(*origins[0])
+    gc.collect()
+    start = time.perf_counter()
+    results = [function(latitude, longitude) for latitude, longitude in origins]
+    return (time.perf_counter() - start) / len(origins), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stores', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--radius', type=float, default=5.0, help='radius query size in km')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stores = make_stores(args.stores, rng)
+    origins = [
+        (latitude + rng.gauss(0, 0.2), longitude + rng.gauss(0, 0.2))
+        for latitude, longitude in (rng.choice(CITIES) for _ in range(args.queries))
+    ]
+
+    start = time.perf_counter()
+    locator = StoreLocator(stores)
+    build_s = time.perf_counter() - start
+    brute_queries = max(5, args.queries // 20)
+
+    cases = [
+        ('k-nearest', lambda lat, lon: locator.nearest(lat, lon, k=args.k),
+         lambda lat, lon: brute_nearest(stores, lat, lon, args.k)),
+        ('k-nearest within 25 km + product', lambda lat, lon: locator.nearest(lat, lon, k=args.k, max_distance_km=25, product='Aero'),
+         lambda lat, lon: brute_nearest(stores, lat, lon, args.k, 25, 'Aero')),
+        (f'all within {args.radius:g} km', lambda lat, lon: locator.within(lat, lon, args.radius),
+         lambda lat, lon: brute_within(stores, lat, lon, args.radius)),
+    ]
+
+    print(f"{len(stores)} stores, {len(locator.product_trees)} product trees, index built in {build_s:.2f}s")
+    print(f"{'query':<36}{'k-d tree ms':>13}{'brute ms':>11}{'speedup':>10}{'results':>9}{'agree':>7}")
+    for label, tree_query, brute_query in cases:
+        tree_time, tree_results = timed(tree_query, origins)
+        brute_time, brute_results = timed(brute_query, origins[:brute_queries])
+        agree = all(
+            [store['id'] for store in tree_result] == [stores[index]['id'] for distance, index in brute_result]
+            for tree_result, brute_result in zip(tree_results, brute_results)
+        )
+        average_results = sum(len(result) for result in tree_results) / len(tree_results)
+        print(f"{label:<36}{tree_time * 1000:>13.3f}{brute_time * 1000:>11.1f}{brute_time / tree_time:>9.0f}x"
+              f"{average_results:>9.1f}{'yes' if agree else 'NO':>7}")
+
+
+if __name__ == '__main__':
+    main()
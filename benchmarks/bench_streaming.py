@@ -0,0 +1,102 @@
+"""
+Benchmark: time to first byte for /chat (JSON) vs. /chat/stream (SSE)
+
+Runs the app on a local werkzeug server against the fixture site and the mock
+OpenAI server, then asks the same general questions through both endpoints.
+For the stream, "first byte" means the first answer delta event, which is
+what the user actually sees.
+
+Usage: python benchmarks/bench_streaming.py [--first-token-delay 0.3] [--token-delay 0.02] [--tokens 60]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from werkzeug.serving import make_server
+
+from fixture_site import FixtureSite
+from mock_openai import MockOpenAI
+
+QUESTIONS = [
+    "What is KitKat made of?",
+    "Tell me about the Nestlé Cocoa Plan",
+    "Which chocolate is good for baking cookies?",
+    "What does Coffee Crisp taste like?",
+    "Is Aero made with milk chocolate?",
+]
+
+
+def time_json(base_url, question):
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/chat", json={'message': question})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def time_stream(base_url, question):
+    start = time.perf_counter()
+    first_delta = None
+    with requests.post(f"{base_url}/chat/stream", json={'message': question}, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if first_delta is None and line == b'event: delta':
+                first_delta = time.perf_counter() - start
+    return first_delta, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--rounds', type=int, default=2)
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(args.first_token_delay, args.token_delay, args.tokens).start()
+    os.environ.update(
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH='',
+        RESPONSE_CACHE_SIZE='0',
+        CRAWL_MAX_PAGES='20',
+        CRAWL_RATE_PER_HOST='0'
+    )
+
+    import app
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = {'/chat': [], '/chat/stream': []}
+    for _ in range(args.rounds):
+        for question in QUESTIONS:
+            results['/chat'].append(time_json(base_url, question))
+            results['/chat/stream'].append(time_stream(base_url, question))
+
+    print(f"Mock LLM: first token {args.first_token_delay * 1000:.0f} ms, "
+          f"{args.tokens} tokens x {args.token_delay * 1000:.0f} ms")
+    print(f"{'endpoint':<14}{'TTFB p50 ms':>13}{'TTFB max ms':>13}{'total p50 ms':>14}")
+    for endpoint, timings in results.items():
+        ttfb = [first * 1000 for first, total in timings]
+        total = [total * 1000 for first, total in timings]
+        print(f"{endpoint:<14}{statistics.median(ttfb):>13.0f}{max(ttfb):>13.0f}{statistics.median(total):>14.0f}")
+
+    server.shutdown()
+    llm.stop()
+    site.stop()
+
+
+if __name__ == '__main__':
+    main()
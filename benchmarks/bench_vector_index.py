@@ -0,0 +1,131 @@
+"""
+Benchmark: dense and hybrid retrieval latency at 100k passages
+
+Builds a synthetic corpus of passages (Zipf-like vocabulary plus product
+terms), embeds it with the local HashingEmbedder, saves the vectors and maps
+them back the way a worker loads a snapshot, then times queries end to end
+(question embedding included) for BM25, exact float32 cosine top-k, int8
+top-k with exact rescoring, and hybrid fusion. Also reports how many of the
+exact top 10 the int8 search returns (recall@10) and the vector storage size.
+
+Usage: python benchmarks/bench_vector_index.py [--chunks 100000] [--dimensions 256]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import InvertedIndex
+from vector_index import HashingEmbedder, VectorIndex, fuse_hits
+
+PRODUCT_TERMS = [
+    'kitkat', 'smarties', 'aero', 'coffee', 'crisp', 'nescafe', 'espresso',
+    'chocolate', 'wafer', 'recipe', 'baking', 'cookie', 'sustainability',
+    'cocoa', 'quality', 'street', 'toffee', 'caramel', 'nutrition', 'allergen'
+]
+
+QUERIES = [
+    "How is KitKat made?",
+    "coffee crisp ingredients",
+    "chocolate chip cookie recipe with smarties",
+    "What is Nestle doing for cocoa sustainability",
+    "nescafe espresso nutrition facts",
+    "quality street toffee allergen information",
+]
+
+
+def build_passages(count, words, seed=7):
+    """Generate synthetic passages mixing filler vocabulary with product terms"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)] + PRODUCT_TERMS * 5
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    return [' '.join(rng.choices(vocabulary, weights=weights, k=words)) for _ in range(count)]
+
+
+def time_queries(search, queries, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=120)
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--limit', type=int, default=20, help='hits per query (the chatbot asks for 20)')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    passages = build_passages(args.chunks, args.words)
+    # Questions plus passage openings, so recall is measured on queries with real neighbours
+    queries = QUERIES + [' '.join(passage.split()[:12]) for passage in random.Random(3).sample(passages, 44)]
+    embedder = HashingEmbedder(args.dimensions)
+
+    start = time.perf_counter()
+    vectors = embedder.embed(passages)
+    embed_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    vector_index = VectorIndex(args.dimensions, embedder.signature)
+    for position, (text, vector) in enumerate(zip(passages, vectors)):
+        vector_index.add(position, text, vector)
+    del vectors
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-vectors-'), 'vectors.npy')
+    vector_index.save(path)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    lexical_index = InvertedIndex.from_documents(enumerate(passages))
+    bm25_build_ms = (time.perf_counter() - start) * 1000
+
+    def dense(query, quantized=False):
+        return vector_index.search(embedder.embed([query])[0], limit=args.limit, quantized=quantized)
+
+    def hybrid(query):
+        return fuse_hits(lexical_index.search(query, limit=args.limit), dense(query), 0.5, args.limit)
+
+    # First int8 query builds the quantized copy; keep that out of the latencies
+    dense(QUERIES[0], quantized=True)
+
+    recalls = []
+    for query in queries:
+        exact = {doc_id for doc_id, score in dense(query)[:10]}
+        approximate = {doc_id for doc_id, score in dense(query, quantized=True)[:10]}
+        recalls.append(len(exact & approximate) / max(1, len(exact)))
+
+    print(f"Corpus: {args.chunks} passages x {args.words} words, {args.dimensions} dimensions, "
+          f"top {args.limit}, {len(queries)} queries x {args.rounds} rounds")
+    print(f"Embedding: {embed_ms / args.chunks * 1000:.0f} us/passage (HashingEmbedder, {embed_ms / 1000:.1f} s total); "
+          f"vector index build + save {build_ms:.0f} ms; BM25 build {bm25_build_ms:.0f} ms")
+    print(f"Vectors: float32 {vector_index.matrix.nbytes / 2 ** 20:.1f} MiB (memory-mapped), "
+          f"int8 copy {(vector_index.nbytes - vector_index.matrix.nbytes) / 2 ** 20:.1f} MiB")
+    print(f"{'search':<22}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, search in (
+        ('bm25', lambda query: lexical_index.search(query, limit=args.limit)),
+        ('dense exact', dense),
+        ('dense int8 + rescore', lambda query: dense(query, quantized=True)),
+        ('hybrid (exact)', hybrid),
+    ):
+        latencies = time_queries(search, queries, args.rounds)
+        print(f"{name:<22}{statistics.median(latencies):>10.2f}{percentile(latencies, 0.95):>10.2f}{max(latencies):>10.2f}")
+    print(f"int8 recall@10 vs exact: {statistics.mean(recalls) * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Local fixture copy of the Made with Nestlé Canada site for benchmarks
+
+Serves a deterministic set of pages shaped like madewithnestle.ca (navigation
+boilerplate, product cards, recipe cards and cross links) from a threaded
+HTTP server on localhost, with optional injected latency per request.
+Responses carry ETag/Last-Modified validators and honour conditional GETs;
+touch() changes a page so incremental re-crawls have something to find.
+
+Usage:
+    site = FixtureSite(latency=0.2).start()
+    ... crawl site.base_url ...
+    site.stop()
+"""
+
+import hashlib
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BRANDS = [
+    'KitKat', 'Smarties', 'Aero', 'Coffee Crisp', 'Quality Street', 'Nescafé',
+    'Nescafé Gold Espresso', 'Carnation', 'Nestlé Toll House', 'Turtles',
+    'Mirage', 'Big Turk', 'Crunch', 'Mackintosh Toffee', 'Coffee-mate', 'Nesquik'
+]
+
+SECTIONS = ['/', '/search/products', '/search/recipes', '/help', '/about', '/sustainability']
+
+NAVIGATION = ' '.join(
+    f'<a href="{path}">{label}</a>' for path, label in [
+        ('/', 'Home'), ('/search/products', 'Products'), ('/search/recipes', 'Recipes'),
+        ('/help', 'Help'), ('/about', 'About'), ('/sustainability', 'Sustainability')
+    ]
+)
+
+FILLER = (
+    'Made with Nestlé brings together trusted Canadian brands, recipes and tips. '
+    'Our chocolate is made with cocoa sourced through the Nestlé Cocoa Plan. '
+    'Every recipe is tested in our kitchens and includes nutrition information. '
+    'Find allergen details, ingredients and storage tips on each product page. '
+)
+
+
+def render_page(path, page_count, seed, revision=0):
+    """Render one fixture page; the content is a pure function of its arguments"""
+    rng = random.Random(f"{seed}:{path}")
+    brands = rng.sample(BRANDS, 6)
+    cards = ''.join(
+        f'<div class="product-card"><a href="/brands/{BRANDS.index(name)}">'
+        f'<img src="/images/{BRANDS.index(name)}.png" alt="{name}"><h3>{name}</h3></a>'
+        f'<p>{name} is one of our favourite treats.</p></div>'
+        for name in brands
+    )
+    recipes = ''.join(
+        f'<div class="recipe-card"><h4>{name} Cookies #{rng.randint(1, 99)}</h4>'
+        f'<a href="/recipes/{rng.randrange(page_count)}">View recipe</a></div>'
+        for name in brands[:3]
+    )
+    links = ''.join(
+        f'<li><a href="/recipes/{rng.randrange(page_count)}">Recipe idea</a></li>'
+        for _ in range(8)
+    )
+    paragraphs = ''.join(
+        f'<p>{FILLER} {name} pairs well with coffee and is great for baking.</p>'
+        for name in brands
+    )
+    if revision:
+        paragraphs += f'<p>Updated product information, revision {revision}.</p>'
+    return (
+        f'<!DOCTYPE html><html><head><title>Made with Nestlé {path}</title>'
+        f'<style>body {{ font-family: sans-serif; }}</style>'
+        f'<script>window.dataLayer = [];</script></head><body>'
+        f'<header><nav>{NAVIGATION}</nav></header>'
+        f'<main><h1>{path}</h1>{paragraphs}'
+        f'<section class="products">{cards}</section>'
+        f'<section class="recipes">{recipes}</section><ul>{links}</ul></main>'
+        f'<footer>&copy; Nestlé Canada <a href="/help">Contact us</a></footer>'
+        f'</body></html>'
+    ).encode('utf-8')
+
+
+class FixtureSite:
+    """Threaded local HTTP server serving the fixture pages"""
+
+    def __init__(self, latency=0.0, page_count=200, seed=1, conditional=True):
+        self.latency = latency
+        self.page_count = page_count
+        self.seed = seed
+        self.conditional = conditional
+        self.revisions = {}
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def touch(self, path):
+        """Publish a new revision of a page"""
+        with self.lock:
+            self.revisions[path] = self.revisions.get(path, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with site.lock:
+                    site.request_count += 1
+                if site.latency:
+                    time.sleep(site.latency)
+
+                revision = site.revisions.get(self.path, 0)
+                body = render_page(self.path, site.page_count, site.seed, revision)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                last_modified = formatdate(1700000000 + revision * 3600, usegmt=True)
+
+                if site.conditional and self.headers.get('If-None-Match') == etag:
+                    with site.lock:
+                        site.not_modified_count += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if site.conditional:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the fixture site until interrupted')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1, help='change to publish different content')
+    args = parser.parse_args()
+
+    site = FixtureSite(latency=args.latency, seed=args.seed)
+    site.server = ThreadingHTTPServer(('127.0.0.1', args.port), site.make_handler())
+    print(f"Serving fixture site at {site.base_url}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.server.server_close()
@@ -0,0 +1,335 @@
+"""
+Load test: a realistic request mix against each serving mode, with JSON results
+
+Starts the fixture site and the mock OpenAI server, runs the app under
+gunicorn for each SERVING_MODE (as startup.sh does, see bench_serving.py)
+and replays a weighted mix of /chat questions (general, count, purchase and
+location intents), /products and /product-counts from a closed loop of
+clients. Each client draws its requests from its own seeded generator, so a
+run with the same arguments sends the same requests.
+
+For every mode and concurrency level it reports throughput, latency
+percentiles overall and per request kind, errors, and the resident memory of
+the gunicorn master plus workers (Linux /proc). Results are written as JSON
+(with the git commit) so runs can be compared between commits:
+
+    python benchmarks/loadtest.py --output before.json
+    ... change something ...
+    python benchmarks/loadtest.py --compare before.json
+
+--compare prints throughput and p95 changes per mode and level, and exits
+with status 1 when any level got slower than --max-regression allows.
+
+Usage: python benchmarks/loadtest.py [--modes sync async] [--concurrency 8 32] [--duration 10]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from bench_serving import REPO_DIR, SERVER_COMMANDS, percentile, start_server
+from fixture_site import FixtureSite
+from mock_openai import MockOpenAI
+
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+LOCATION = {'latitude': 43.589, 'longitude': -79.644}
+
+GENERAL_QUESTIONS = [
+    "What is KitKat made of?",
+    "Tell me about the Nestlé Cocoa Plan",
+    "Which chocolate is good for baking cookies?",
+    "What does Coffee Crisp taste like?",
+    "Is Aero made with milk chocolate?",
+    "Do you have recipes with Smarties?",
+    "How should I store Quality Street?",
+    "What sustainability work does Nestlé do?"
+]
+COUNT_QUESTIONS = [
+    "How many coffee products are there?",
+    "How many chocolate products do you have?",
+    "What is the total products count?"
+]
+PURCHASE_QUESTIONS = [
+    "Can I get KitKat on Amazon?",
+    "I want to purchase Smarties",
+    "Where do I buy online Coffee Crisp?"
+]
+LOCATION_QUESTIONS = [
+    "Where can I buy Aero near me?",
+    "Are there stores nearby that sell KitKat?",
+    "Which stores near me carry Smarties?"
+]
+
+# (kind, share of requests): chat kinds name the intent detect_query_type should report
+REQUEST_MIX = [
+    ('general', 0.45),
+    ('count', 0.1),
+    ('purchase', 0.1),
+    ('location', 0.1),
+    ('products', 0.15),
+    ('product_counts', 0.1)
+]
+
+
+def next_request(rng, unique_fraction, sequence):
+    """(kind, method, path, json body) of the next request in a client's stream"""
+    kind = rng.choices([kind for kind, share in REQUEST_MIX], weights=[share for kind, share in REQUEST_MIX])[0]
+    if kind == 'products':
+        return kind, 'GET', '/products', None
+    if kind == 'product_counts':
+        return kind, 'GET', '/product-counts', None
+    if kind == 'general':
+        message = rng.choice(GENERAL_QUESTIONS)
+        # Some visitors ask something nobody asked before, so not every answer is cached
+        if rng.random() < unique_fraction:
+            message = f"{message} (visitor {sequence})"
+        return kind, 'POST', '/chat', {'message': message}
+    questions = {'count': COUNT_QUESTIONS, 'purchase': PURCHASE_QUESTIONS, 'location': LOCATION_QUESTIONS}[kind]
+    body = {'message': rng.choice(questions)}
+    if kind == 'location':
+        body['location'] = LOCATION
+    return kind, 'POST', '/chat', body
+
+
+def process_tree(pid):
+    """pid and its child processes (Linux)"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+            pids.extend(int(child) for child in children_file.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+def memory_mib(pid):
+    """Current and peak resident memory of a process tree in MiB; None off Linux"""
+    totals = {'VmRSS': 0, 'VmHWM': 0}
+    for process_id in process_tree(pid):
+        try:
+            with open(f"/proc/{process_id}/status") as status_file:
+                for line in status_file:
+                    field, _, value = line.partition(':')
+                    if field in totals:
+                        totals[field] += int(value.split()[0])
+        except OSError:
+            if process_id == pid:
+                return None
+    return {'rss': round(totals['VmRSS'] / 1024, 1), 'peak': round(totals['VmHWM'] / 1024, 1),
+            'processes': len(process_tree(pid))}
+
+
+def summarize(latencies):
+    values = [elapsed * 1000 for elapsed in latencies]
+    return {
+        'count': len(values),
+        'mean': round(statistics.mean(values), 2) if values else 0.0,
+        'p50': round(percentile(values, 0.5), 2),
+        'p90': round(percentile(values, 0.9), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+        'max': round(max(values), 2) if values else 0.0
+    }
+
+
+def run_level(base_url, concurrency, duration, client_timeout, seed, unique_fraction):
+    """Closed loop of clients replaying their seeded request streams for duration seconds"""
+    latencies = []
+    by_kind = {kind: [] for kind, share in REQUEST_MIX}
+    counts = {'ok': 0, 'shed': 0, 'timeout': 0, 'error': 0, 'intent_mismatch': 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000003 + index)
+        session = requests.Session()
+        sequence = 0
+        while time.perf_counter() < stop_at:
+            kind, method, path, body = next_request(rng, unique_fraction, f"{index}-{sequence}")
+            sequence += 1
+            start = time.perf_counter()
+            try:
+                response = session.request(method, f"{base_url}{path}", json=body, timeout=client_timeout)
+                status = response.status_code
+                payload = response.json() if status == 200 else None
+            except requests.Timeout:
+                status, payload = 504, None
+            except (requests.RequestException, ValueError):
+                status, payload = None, None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    counts['ok'] += 1
+                    latencies.append(elapsed)
+                    by_kind[kind].append(elapsed)
+                    if path == '/chat' and payload.get('query_type') != kind:
+                        counts['intent_mismatch'] += 1
+                elif status == 503:
+                    counts['shed'] += 1
+                elif status == 504:
+                    counts['timeout'] += 1
+                else:
+                    counts['error'] += 1
+            if status == 503:
+                time.sleep(0.05)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return dict(
+        counts,
+        concurrency=concurrency,
+        wall_seconds=round(wall, 3),
+        throughput_rps=round(counts['ok'] / wall, 2),
+        latency_ms=summarize(latencies),
+        by_kind={kind: summarize(values) for kind, values in by_kind.items()}
+    )
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                             text=True, stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(baseline, current, max_regression):
+    """Print per-level throughput and p95 changes; returns whether any level regressed"""
+    previous = {(level['mode'], level['concurrency']): level for level in baseline['levels']}
+    regressed = False
+    print(f"\nCompared with {(baseline.get('commit') or 'unknown')[:12]} ({baseline.get('created')}):")
+    print(f"{'mode':<7}{'clients':>8}{'req/s':>10}{'change':>9}{'p95 ms':>10}{'change':>9}")
+    for level in current['levels']:
+        old = previous.get((level['mode'], level['concurrency']))
+        if old is None or not old['throughput_rps'] or not old['latency_ms']['p95']:
+            continue
+        throughput_change = level['throughput_rps'] / old['throughput_rps'] - 1
+        p95_change = level['latency_ms']['p95'] / old['latency_ms']['p95'] - 1
+        flag = ''
+        if throughput_change < -max_regression or p95_change > max_regression:
+            regressed = True
+            flag = '  REGRESSION'
+        print(f"{level['mode']:<7}{level['concurrency']:>8}{level['throughput_rps']:>10.1f}{throughput_change * 100:>8.1f}%"
+              f"{level['latency_ms']['p95']:>10.1f}{p95_change * 100:>8.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=sorted(SERVER_COMMANDS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of unrecorded load before each mode')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--unique-fraction', type=float, default=0.5, help='share of general questions never asked before')
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--tokens', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=40, help='crawl page budget')
+    parser.add_argument('--client-timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/loadtest-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='allowed throughput drop / p95 rise before --compare fails (fraction)')
+    args = parser.parse_args()
+
+    site = FixtureSite().start()
+    llm = MockOpenAI(args.first_token_delay, args.token_delay, args.tokens).start()
+    snapshot_dir = tempfile.mkdtemp(prefix='loadtest-')
+    env = dict(
+        os.environ,
+        NESTLE_BASE_URL=site.base_url,
+        OPENAI_API_KEY='mock-key',
+        OPENAI_BASE_URL=f"{llm.base_url}/v1",
+        KB_SNAPSHOT_PATH=os.path.join(snapshot_dir, 'knowledge_snapshot.bin'),
+        CRAWL_MAX_PAGES=str(args.pages),
+        CRAWL_RATE_PER_HOST='0',
+        CRAWL_WORKERS='1',
+        KNOWLEDGE_REFRESH_INTERVAL='0',
+        ASYNC_REQUEST_TIMEOUT=str(args.client_timeout)
+    )
+
+    commit, dirty = git_commit()
+    results = {
+        'version': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': vars(args),
+        'levels': []
+    }
+
+    llm_ms = (args.first_token_delay + args.token_delay * args.tokens) * 1000
+    print(f"Mock LLM: {llm_ms:.0f} ms per completion; {args.duration:.0f}s per level; seed {args.seed}; "
+          f"commit {(commit or 'unknown')[:12]}{' (dirty)' if dirty else ''}")
+    print(f"{'mode':<7}{'clients':>8}{'ok':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'chat p95':>10}{'errors':>8}{'RSS MiB':>9}")
+    for mode in args.modes:
+        process, base_url = start_server(mode, env)
+        try:
+            # The startup refresh (and the first answers) are not part of the measurement
+            if args.warmup > 0:
+                run_level(base_url, max(args.concurrency), args.warmup, args.client_timeout, args.seed + 1,
+                          args.unique_fraction)
+            idle_memory = memory_mib(process.pid)
+            for concurrency in args.concurrency:
+                level = run_level(base_url, concurrency, args.duration, args.client_timeout, args.seed,
+                                  args.unique_fraction)
+                level['mode'] = mode
+                level['memory_mib'] = {'idle': idle_memory, 'after': memory_mib(process.pid)}
+                results['levels'].append(level)
+
+                general = level['by_kind']['general']
+                errors = level['shed'] + level['timeout'] + level['error']
+                after = level['memory_mib']['after']
+                print(f"{mode:<7}{concurrency:>8}{level['ok']:>7}{level['throughput_rps']:>8.1f}"
+                      f"{level['latency_ms']['p50']:>9.1f}{level['latency_ms']['p95']:>9.1f}{level['latency_ms']['p99']:>9.1f}"
+                      f"{general['p95']:>10.1f}{errors:>8}{after['rss'] if after else float('nan'):>9.1f}")
+                if level['intent_mismatch']:
+                    print(f"  warning: {level['intent_mismatch']} chat answers reported a different query type than requested")
+        finally:
+            process.terminate()
+            process.wait()
+
+    llm.stop()
+    site.stop()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{(commit or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            if compare(json.load(baseline_file), results, args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Local mock of the OpenAI chat completions API for benchmarks
+
+Implements POST /v1/chat/completions in both plain and streaming (SSE) form,
+emitting a fixed number of tokens with configurable delays so latency and
+time-to-first-byte can be measured without network access or API spend.
+Token usage is reported like the real API (prompt tokens approximated from the
+character count), on streams only when stream_options.include_usage is set.
+Point the app at it with OPENAI_BASE_URL=<base_url>/v1 and any OPENAI_API_KEY.
+
+Faults can be injected (and changed while it runs): error_rate of the calls
+are answered with error_status (500 by default; 429 and 503 carry a
+Retry-After of retry_after seconds when it is set), and slow_rate of them
+wait slow_delay extra seconds before answering, for tail latency or, with a
+long delay, a provider that hangs.
+
+Usage:
+    llm = MockOpenAI(token_delay=0.02, tokens=60).start()
+    ... os.environ['OPENAI_BASE_URL'] = llm.base_url + '/v1' ...
+    llm.error_rate = 0.3
+    llm.stop()
+
+    python benchmarks/mock_openai.py --port 8082 --token-delay 0.02 --error-rate 0.2
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "KitKat is made with crispy wafer fingers covered in smooth milk chocolate "
+    "and you can find it at most grocery stores across Canada including Loblaws "
+    "Metro Walmart and Sobeys as well as online through Amazon Canada"
+).split()
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+
+class MockOpenAI:
+    """Threaded local server speaking enough of the OpenAI API for the chatbot"""
+
+    def __init__(self, first_token_delay=0.3, token_delay=0.02, tokens=60, model='gpt-3.5-turbo',
+                 error_rate=0.0, error_status=500, retry_after=None, slow_rate=0.0, slow_delay=0.0, seed=None):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.model = model
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.rng = random.Random(seed)
+        self.call_count = 0
+        self.error_count = 0
+        self.slow_count = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def draw_faults(self):
+        """(fail, extra delay) for one call"""
+        with self.lock:
+            fail = self.rng.random() < self.error_rate
+            slow = not fail and self.rng.random() < self.slow_rate
+            self.error_count += fail
+            self.slow_count += slow
+        return fail, self.slow_delay if slow else 0.0
+
+    def completion_tokens(self):
+        return [(' ' if i else '') + WORDS[i % len(WORDS)] for i in range(self.tokens)]
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.0'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                with mock.lock:
+                    mock.call_count += 1
+
+                if not self.path.endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+
+                fail, extra_delay = mock.draw_faults()
+                if fail:
+                    self.send_failure()
+                    return
+                time.sleep(extra_delay)
+
+                prompt_tokens = sum(len(message.get('content', '')) for message in body.get('messages', [])) // 4
+                if body.get('stream'):
+                    self.stream_completion(body, prompt_tokens)
+                else:
+                    self.complete(body, prompt_tokens)
+
+            def send_failure(self):
+                payload = json.dumps({'error': {
+                    'message': f"Injected failure ({mock.error_status})",
+                    'type': 'rate_limit_error' if mock.error_status == 429 else 'server_error'
+                }}).encode('utf-8')
+                self.send_response(mock.error_status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                if mock.retry_after is not None and mock.error_status in (429, 503):
+                    self.send_header('Retry-After', str(mock.retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def complete(self, body, prompt_tokens):
+                tokens = mock.completion_tokens()
+                time.sleep(mock.first_token_delay + mock.token_delay * len(tokens))
+                payload = json.dumps({
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', mock.model),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': len(tokens),
+                        'total_tokens': prompt_tokens + len(tokens)
+                    }
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def stream_completion(self, body, prompt_tokens):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                time.sleep(mock.first_token_delay)
+                tokens = mock.completion_tokens()
+                for index, token in enumerate(tokens):
+                    delta = {'content': token}
+                    if index == 0:
+                        delta['role'] = 'assistant'
+                    self.send_chunk(body, delta, None)
+                    time.sleep(mock.token_delay)
+                self.send_chunk(body, {}, 'stop')
+                if body.get('stream_options', {}).get('include_usage'):
+                    # Like the real API: a final chunk with no choices, carrying the usage
+                    self.send_chunk(body, None, None, usage={
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': len(tokens),
+                        'total_tokens': prompt_tokens + len(tokens)
+                    })
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+
+            def send_chunk(self, body, delta, finish_reason, usage=None):
+                chunk = {
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': body.get('model', mock.model),
+                    'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+                }
+                if usage is not None:
+                    chunk['usage'] = usage
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, port=0):
+        self.server = MockServer(('127.0.0.1', port), self.make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve the mock OpenAI API until interrupted')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    llm = MockOpenAI(args.first_token_delay, args.token_delay, args.tokens, error_rate=args.error_rate,
+                     error_status=args.error_status, slow_rate=args.slow_rate, slow_delay=args.slow_delay).start(args.port)
+    print(f"Mock OpenAI API at {llm.base_url}/v1")
+    try:
+        llm.thread.join()
+    except KeyboardInterrupt:
+        llm.stop()
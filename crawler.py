@@ -0,0 +1,388 @@
+"""
+Site Crawler for Nestlé Canada AI Chatbot
+Bounded-concurrency crawler with per-host rate limiting and pooled connections
+
+Fetches seed URLs in parallel, follows the links extracted from each page up
+to a configurable depth and page budget, and records fetch/parse timings so
+slow pages show up in the logs.
+
+Re-crawls are incremental: each record keeps its ETag, Last-Modified and a
+content hash, requests are conditional, and pages whose body has not changed
+reuse the previous record without being parsed again.
+
+With parse_workers > 0 fetching and parsing are separate stages: fetch
+threads hand raw page bodies to a pool of parser processes through a bounded
+queue (a fetch thread blocks while the queue is full), so parsing runs on
+other cores instead of competing for the GIL with the fetch loop. Parsed
+pages are reported through on_parsed as soon as each one is ready. The
+parser processes are forked up front, never from a fetch thread: a child
+forked while other threads hold locks (logging, the rate limiter, urllib3's
+pool) inherits them held and deadlocks on them.
+
+File: crawler.py
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urldefrag, urlparse
+
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Links to binary assets are never worth fetching for the knowledge base
+SKIPPED_EXTENSIONS = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.zip',
+    '.mp4', '.mp3', '.css', '.js', '.ico', '.xml'
+)
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host at a fixed maximum rate"""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        """Block until a request to the URL's host is allowed"""
+        if not self.interval:
+            return
+
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def configure_session_pool(session, pool_size):
+    """Mount connection pools large enough for every crawler thread"""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def normalize_url(url):
+    """Strip fragments so the same page is only crawled once"""
+    return urldefrag(url)[0]
+
+
+# Parse callable of a parse worker process, installed once by init_parse_worker
+worker_parse = None
+
+
+def init_parse_worker(parse):
+    global worker_parse
+    worker_parse = parse
+
+
+def parse_in_worker(url, body):
+    """Parse one page in a parse worker process, returning the record and parse time"""
+    start = time.perf_counter()
+    record = worker_parse(url, body)
+    return record, round((time.perf_counter() - start) * 1000, 2)
+
+
+def with_validators(record, validators):
+    """Copy of a record stamped with the response's cache validators and content hash
+
+    A reused record still belongs to the published knowledge base, so it is
+    never modified in place.
+    """
+    if record and validators:
+        return dict(record, **validators)
+    return record
+
+
+def changed_and_removed(previous, pages, stats):
+    """URLs of the pages a crawl parsed anew, and of the previous pages it found gone
+
+    A page is gone when the site says so (404/410), or when a complete crawl
+    (no failed fetches, within the page budget) no longer reaches it.
+    """
+    failed_urls = {page['url'] for page in stats['pages'] if 'error' in page}
+    gone_urls = {page['url'] for page in stats['pages'] if page.get('http_status') in (404, 410)}
+    complete = not stats['truncated'] and failed_urls <= gone_urls
+    changed = [page['url'] for page in stats['pages'] if page.get('status') == 'reparsed' and page['url'] in pages]
+    removed = [url for url in previous if url not in pages and (url in gone_urls or complete)]
+    return changed, removed
+
+
+class SiteCrawler:
+    """Breadth-first crawler that fetches pages concurrently and follows their links"""
+
+    def __init__(self, session, parse, allowed_prefix, max_workers=8, max_depth=1,
+                 max_pages=50, requests_per_second=10.0, timeout=10, parse_workers=0, parse_queue_size=None):
+        self.session = configure_session_pool(session, max_workers)
+        self.parse = parse
+        self.allowed_prefix = allowed_prefix
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.parse_workers = parse_workers
+        # Page bodies queued for or being parsed; bounds the memory held by fetched-but-unparsed pages
+        self.parse_slots = threading.BoundedSemaphore(parse_queue_size or max(1, parse_workers * 2))
+        self.parse_pool = None
+        self.pool_lock = threading.Lock()
+        if parse_workers:
+            self.start_parse_pool()
+
+    def should_follow(self, url):
+        """Only follow HTML pages on the crawled site"""
+        path = urlparse(url).path.lower()
+        return url.startswith(self.allowed_prefix) and not path.endswith(SKIPPED_EXTENSIONS)
+
+    def start_parse_pool(self):
+        """Start the parse worker processes if they are not running; they are reused by later crawls
+
+        Called when the crawler is created and at the start of a crawl, before
+        any fetch thread exists, so that no worker is forked from a fetch thread.
+        """
+        with self.pool_lock:
+            if self.parse_pool is None:
+                # Forked workers inherit the parser's modules; spawn would re-run app.py when it is the main script
+                context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+                pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=context,
+                    initializer=init_parse_worker,
+                    initargs=(self.parse,)
+                )
+                # The executor forks its workers on the first submit; make that happen here
+                pool.submit(int).result()
+                self.parse_pool = pool
+            return self.parse_pool
+
+    def reset_parse_pool(self):
+        """Drop a broken pool (e.g. a worker was killed) so the next page starts a fresh one"""
+        with self.pool_lock:
+            pool, self.parse_pool = self.parse_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def close(self):
+        self.reset_parse_pool()
+
+    def fetch(self, url, previous=None):
+        """Fetch one page, returning (body, validators, timings); body is None when previous is still current"""
+        self.rate_limiter.wait(url)
+
+        headers = {}
+        if previous:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=self.timeout, headers=headers)
+        if response.status_code == 304 and previous:
+            return None, None, {
+                'status': 'not_modified',
+                'fetch_ms': round((time.perf_counter() - start) * 1000, 2),
+                'parse_ms': 0.0,
+                'bytes': 0
+            }
+
+        response.raise_for_status()
+        body = response.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash
+        }
+        timings = {
+            'status': 'reparsed',
+            'fetch_ms': round((time.perf_counter() - start) * 1000, 2),
+            'parse_ms': 0.0,
+            'bytes': len(body)
+        }
+
+        if previous and previous.get('content_hash') == content_hash:
+            # Same bytes as last time: keep the old record, only refresh validators
+            timings['status'] = 'unchanged'
+            return None, validators, timings
+        return body, validators, timings
+
+    def fetch_and_parse(self, url, previous=None):
+        """Fetch one page and parse it in this thread if it changed
+
+        Returns (record, timings, None), matching fetch_and_queue.
+        """
+        body, validators, timings = self.fetch(url, previous)
+        if body is None:
+            return with_validators(previous, validators), timings, None
+        return self.parse_here(url, body, validators, timings)
+
+    def parse_here(self, url, body, validators, timings):
+        start = time.perf_counter()
+        record = self.parse(url, body)
+        timings['parse_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return with_validators(record, validators), timings, None
+
+    def fetch_and_queue(self, url, previous=None):
+        """Fetch one page and queue its body for the parse workers if it changed
+
+        Returns (record, timings, None) for pages that need no parsing, or
+        (None, timings, (parse future, validators)) for queued ones.
+        """
+        body, validators, timings = self.fetch(url, previous)
+        if body is None:
+            return with_validators(previous, validators), timings, None
+
+        pool = self.parse_pool
+        if pool is None:
+            # The pool broke during this crawl; parse here until the next crawl restarts it
+            return self.parse_here(url, body, validators, timings)
+
+        # Back-pressure: wait here while the parse queue is full
+        self.parse_slots.acquire()
+        try:
+            future = pool.submit(parse_in_worker, url, body)
+        except Exception:
+            self.parse_slots.release()
+            raise
+        future.add_done_callback(lambda done: self.parse_slots.release())
+        return None, timings, (future, validators)
+
+    def crawl(self, seed_urls, previous=None, on_parsed=None):
+        """Crawl from the seed URLs, returning (pages by URL, crawl stats)
+
+        previous maps URLs to records from the last crawl; their validators
+        make the requests conditional and unchanged pages are reused as-is.
+        on_parsed(url, record) is called on the crawling thread for each newly
+        parsed page as soon as it is ready, while the crawl carries on.
+        """
+        previous = previous or {}
+        started = time.perf_counter()
+        pages = {}
+        page_stats = []
+        seen = set()
+        level = []
+
+        for url in seed_urls:
+            url = normalize_url(url)
+            if url not in seen:
+                seen.add(url)
+                level.append(url)
+
+        # Crawl one link depth at a time so the pages that fit in the budget
+        # are the same on every run, however the fetches interleave
+        truncated = False
+        if self.parse_workers:
+            # Replaces a pool that broke during an earlier crawl, before the fetch threads start
+            self.start_parse_pool()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            depth = 0
+            while level and len(page_stats) < self.max_pages:
+                truncated = truncated or len(level) > self.max_pages - len(page_stats)
+                level = level[:self.max_pages - len(page_stats)]
+                records = self.crawl_level(executor, level, depth, previous, page_stats, on_parsed)
+                next_level = []
+
+                for url in level:
+                    record = records.get(url)
+                    if not record:
+                        continue
+                    pages[url] = record
+
+                    if depth < self.max_depth:
+                        for link in record.get('links', []):
+                            link_url = normalize_url(link['url'])
+                            if link_url not in seen and self.should_follow(link_url):
+                                seen.add(link_url)
+                                next_level.append(link_url)
+
+                level = next_level
+                depth += 1
+        # Pages left unvisited by the page budget
+        truncated = truncated or bool(level)
+
+        elapsed = time.perf_counter() - started
+        crawled = [page for page in page_stats if 'error' not in page]
+        statuses = [page['status'] for page in crawled]
+        stats = {
+            'pages_crawled': len(crawled),
+            'pages_fetched': len(crawled) - statuses.count('not_modified'),
+            'pages_not_modified': statuses.count('not_modified'),
+            'pages_unchanged': statuses.count('unchanged'),
+            'pages_reparsed': statuses.count('reparsed'),
+            'pages_failed': len(page_stats) - len(crawled),
+            'truncated': truncated,
+            'parse_workers': self.parse_workers,
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'pages_per_second': round(len(crawled) / elapsed, 1) if elapsed else 0.0,
+            'total_fetch_ms': round(sum(page['fetch_ms'] for page in crawled), 2),
+            'total_parse_ms': round(sum(page['parse_ms'] for page in crawled), 2),
+            'pages': page_stats
+        }
+        logger.info(
+            f"Crawled {stats['pages_crawled']} pages in {stats['elapsed_ms']:.0f} ms "
+            f"({stats['pages_per_second']:.1f} pages/s): "
+            f"{stats['pages_fetched']} fetched, {stats['pages_not_modified']} not modified, "
+            f"{stats['pages_unchanged']} unchanged, {stats['pages_reparsed']} reparsed, "
+            f"{stats['pages_failed']} failed (fetch {stats['total_fetch_ms']:.0f} ms, "
+            f"parse {stats['total_parse_ms']:.0f} ms on {self.parse_workers or 'fetch'} "
+            f"{'workers' if self.parse_workers else 'threads'})"
+        )
+        return pages, stats
+
+    def crawl_level(self, executor, level, depth, previous, page_stats, on_parsed):
+        """Fetch and parse one link depth, returning records by URL; stats are appended in level order"""
+        fetch = self.fetch_and_queue if self.parse_workers else self.fetch_and_parse
+        pending = {executor.submit(fetch, url, previous.get(url)): (url, None) for url in level}
+        results = {}
+
+        # Fetches and parses finish in any order; each page is handled as soon as its last stage is done
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, queued = pending.pop(future)
+                try:
+                    if queued is None:
+                        record, timings, parsing = future.result()
+                        if parsing is not None:
+                            parse_future, validators = parsing
+                            pending[parse_future] = (url, (timings, validators))
+                            continue
+                    else:
+                        timings, validators = queued
+                        record, timings['parse_ms'] = future.result()
+                        record = with_validators(record, validators)
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        self.reset_parse_pool()
+                    logger.error(f"Error scraping {url}: {str(e)}")
+                    failure = {'error': str(e)}
+                    response = getattr(e, 'response', None)
+                    if response is not None:
+                        failure['http_status'] = response.status_code
+                    results[url] = (None, failure)
+                    continue
+
+                results[url] = (record, timings)
+                if record and timings['status'] == 'reparsed' and on_parsed:
+                    on_parsed(url, record)
+
+        records = {}
+        for url in level:
+            record, timings = results[url]
+            page_stats.append(dict(timings, url=url, depth=depth))
+            if record:
+                records[url] = record
+        return records
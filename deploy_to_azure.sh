@@ -10,7 +10,7 @@ RESOURCE_GROUP="nestle-chatbot-rg"
 APP_SERVICE_PLAN="nestle-chatbot-plan"
 WEB_APP_NAME="nestle-chatbot-app"
 LOCATION="East US"
-PYTHON_VERSION="3.9"
+PYTHON_VERSION="3.11"
 SKU="B1"  # Basic plan
 
 # Colors for output
@@ -0,0 +1,398 @@
+"""
+HTML Extraction for Nestlé Canada AI Chatbot
+Single-pass page extractor built on the standard library HTMLParser
+
+PageExtractor collects text, links, images and product cards in one pass
+without building a tree, with the same output as BeautifulSoup's
+'html.parser'. Pages that are not UTF-8 raise ExtractionFallback.
+
+File: html_extract.py
+"""
+
+import codecs
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+# Product cards, and the elements inside a card that hold its name (in priority order)
+PRODUCT_SELECTORS = [
+    '.product-card', '.product-item', '.product-tile',
+    '[data-product]', '.recipe-card', '.recipe-item'
+]
+PRODUCT_NAME_SELECTORS = ['h3', 'h4', '.product-title', '.product-name', '[data-product-name]']
+
+# Tree builder rules of BeautifulSoup's html.parser builder
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr'
+])
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'template', 'script', 'style'])
+REMOVED_TAGS = frozenset(['script', 'style'])
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# String kinds get_text() includes on an ordinary element
+TEXT_KINDS = frozenset(['text', 'cdata'])
+
+ENTITIES = {name.rstrip(';'): character for name, character in html5.items()}
+CLASS_RE = re.compile(r'\S+')
+SIMPLE_TAG_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9-]*$')
+DECLARED_ENCODING_RES = [
+    (re.compile(br'^\s*<\?.*encoding=[\'"](.*?)[\'"].*\?>'), 1024),
+    (re.compile(br'<\s*meta[^>]+charset\s*=\s*["\']?([^>]*?)[ /;\'">]', re.I), 2048)
+]
+UNICODE_BOMS = (codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+
+class ExtractionFallback(Exception):
+    """Raised when a page needs BeautifulSoup's encoding detection"""
+    pass
+
+
+def compile_selector(selector):
+    """Compile a simple selector ('tag', '.class' or '[attribute]') into a (kind, value) test"""
+    if selector.startswith('.') and CLASS_RE.fullmatch(selector[1:]):
+        return ('class', selector[1:])
+    if selector.startswith('[') and selector.endswith(']'):
+        return ('attribute', selector[1:-1].strip().lower())
+    if SIMPLE_TAG_RE.match(selector):
+        return ('tag', selector.lower())
+    raise ValueError(f"Unsupported selector: {selector}")
+
+
+def selector_matches(selector, tag, attrs, classes):
+    kind, value = selector
+    if kind == 'tag':
+        return tag == value
+    if kind == 'class':
+        return value in classes
+    return value in attrs
+
+
+def decode_markup(markup):
+    """Decode page bytes as UTF-8, or raise ExtractionFallback if the page is in another encoding"""
+    if isinstance(markup, str):
+        return markup
+    if markup.startswith(UNICODE_BOMS):
+        raise ExtractionFallback('UTF-16/32 byte order mark')
+    if markup.startswith(codecs.BOM_UTF8):
+        markup = markup[len(codecs.BOM_UTF8):]
+    else:
+        check_declared_encoding(markup)
+    try:
+        return markup.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ExtractionFallback('page is not valid UTF-8')
+
+
+def check_declared_encoding(markup):
+    """Raise ExtractionFallback if an XML declaration or <meta> charset names a non-UTF-8 encoding"""
+    for pattern, end in DECLARED_ENCODING_RES:
+        match = pattern.search(markup, 0, max(end, len(markup) // 20))
+        if match:
+            declared = match.group(1).decode('ascii', errors='replace').strip().lower()
+            try:
+                name = codecs.lookup(declared).name
+            except LookupError:
+                raise ExtractionFallback(f"unknown declared encoding {declared!r}")
+            if name not in ('utf-8', 'ascii'):
+                raise ExtractionFallback(f"declared encoding {declared!r}")
+            return
+
+
+def join_url(base_url, href):
+    return urljoin(base_url, href) if href.startswith('/') else href
+
+
+class TextCapture:
+    """Stripped strings of the string kinds get_text(strip=True) would return for one element"""
+
+    __slots__ = ('kinds', 'parts')
+
+    def __init__(self, tag):
+        self.kinds = frozenset([tag]) if tag in STRING_CONTAINER_TAGS else TEXT_KINDS
+        self.parts = []
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+class ProductCapture:
+    """A product card: its own text, its first name element per name selector and its first link"""
+
+    __slots__ = ('text', 'names', 'href')
+
+    def __init__(self, text):
+        self.text = text
+        self.names = [None] * len(PRODUCT_NAME_SELECTORS)
+        self.href = None
+
+    def name(self):
+        for capture in self.names:
+            if capture is not None:
+                return capture.text()
+        text = self.text.text()
+        if len(text) < 100:
+            return text
+        return None
+
+
+class Frame:
+    """One open element on the parser's stack"""
+
+    __slots__ = ('tag', 'captures', 'product', 'node')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.captures = 0
+        self.product = None
+        self.node = None
+
+
+class PageExtractor(HTMLParser):
+    """Streams one page, collecting text, title, links, images and product cards"""
+
+    product_selectors = [compile_selector(selector) for selector in PRODUCT_SELECTORS]
+    name_selectors = [compile_selector(selector) for selector in PRODUCT_NAME_SELECTORS]
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.open_counts = {}
+        self.already_closed = []
+        self.pending = []
+        self.removed_open = 0
+        self.preserve_open = 0
+        self.containers = []
+        self.captures = []
+        self.open_products = []
+        self.text_parts = []
+        self.title_node = None
+        self.links = []
+        self.images = []
+        self.products = [[] for _ in PRODUCT_SELECTORS]
+
+    def extract(self, markup):
+        self.feed(markup)
+        self.close()
+        return self
+
+    def close(self):
+        super().close()
+        self.flush_text()
+
+    # Tokenizer callbacks, following bs4's BeautifulSoupHTMLParser
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        attributes = {}
+        for key, value in attrs:
+            attributes[key] = '' if value is None else value
+        self.flush_text()
+        self.push(tag, attributes)
+        if handle_empty_element and tag in VOID_ELEMENTS:
+            self.flush_text()
+            self.pop_to(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed:
+            # Redundant end tag for a void element that was already closed
+            self.already_closed.remove(tag)
+        else:
+            self.flush_text()
+            self.pop_to(tag)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_charref(self, name):
+        if name[:1] in ('x', 'X'):
+            code_point = int(name.lstrip('xX'), 16)
+        else:
+            code_point = int(name)
+        data = None
+        if code_point < 256:
+            # References like &#150; usually mean windows-1252, not Unicode
+            try:
+                data = bytearray([code_point]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code_point)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        character = ENTITIES.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self.handle_string(data, 'comment')
+
+    def handle_decl(self, data):
+        self.handle_string(data[len('DOCTYPE '):], 'doctype')
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self.handle_string(data[len('CDATA['):], 'cdata')
+        else:
+            self.handle_string(data, 'declaration')
+
+    def handle_pi(self, data):
+        self.handle_string(data, 'pi')
+
+    # Tree bookkeeping
+
+    def handle_string(self, data, kind):
+        self.flush_text()
+        self.pending.append(data)
+        self.flush_text(kind)
+
+    def flush_text(self, kind=None):
+        """End the current text node and hand it to the page text and every open capture"""
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve_open and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+
+        if kind is None:
+            kind = self.containers[-1] if self.containers else 'text'
+        if kind in TEXT_KINDS:
+            self.text_parts.append(data)
+        if self.captures:
+            stripped = data.strip()
+            if stripped:
+                for capture in self.captures:
+                    if kind in capture.kinds:
+                        capture.parts.append(stripped)
+        if self.stack and self.stack[-1].node is not None:
+            self.stack[-1].node.append(data)
+
+    def push(self, tag, attrs):
+        frame = Frame(tag)
+        parent = self.stack[-1] if self.stack else None
+        self.stack.append(frame)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_open += 1
+        if tag in STRING_CONTAINER_TAGS:
+            self.containers.append(tag)
+        if tag in REMOVED_TAGS:
+            self.removed_open += 1
+        if self.removed_open:
+            # script and style are decomposed before anything is selected
+            return
+
+        if parent is not None and parent.node is not None:
+            frame.node = []
+            parent.node.append(frame.node)
+        elif tag == 'title' and self.title_node is None:
+            frame.node = self.title_node = []
+
+        classes = CLASS_RE.findall(attrs['class']) if 'class' in attrs else ()
+        capture = None
+
+        for product in self.open_products:
+            for index, selector in enumerate(self.name_selectors):
+                if product.names[index] is None and selector_matches(selector, tag, attrs, classes):
+                    if capture is None:
+                        capture = self.start_capture(frame)
+                    product.names[index] = capture
+            if product.href is None and tag == 'a' and 'href' in attrs:
+                product.href = attrs['href']
+
+        product = None
+        for index, selector in enumerate(self.product_selectors):
+            if selector_matches(selector, tag, attrs, classes):
+                if product is None:
+                    product = ProductCapture(self.start_capture(frame))
+                    frame.product = product
+                    self.open_products.append(product)
+                self.products[index].append(product)
+
+        if tag == 'a' and 'href' in attrs:
+            if capture is None:
+                capture = self.start_capture(frame)
+            self.links.append((attrs['href'], capture))
+        elif tag == 'img' and 'src' in attrs:
+            self.images.append((attrs['src'], attrs.get('alt', ''), attrs.get('title', '')))
+
+    def start_capture(self, frame):
+        capture = TextCapture(frame.tag)
+        self.captures.append(capture)
+        frame.captures += 1
+        return capture
+
+    def pop_to(self, tag):
+        """Close the most recent open element named tag, and everything opened inside it"""
+        if not self.open_counts.get(tag):
+            return
+        while self.stack:
+            frame = self.stack.pop()
+            self.open_counts[frame.tag] -= 1
+            if frame.tag in PRESERVE_WHITESPACE_TAGS:
+                self.preserve_open -= 1
+            if frame.tag in STRING_CONTAINER_TAGS:
+                self.containers.pop()
+            if frame.tag in REMOVED_TAGS:
+                self.removed_open -= 1
+            if frame.captures:
+                del self.captures[-frame.captures:]
+            if frame.product is not None:
+                self.open_products.pop()
+            if frame.tag == tag:
+                return
+
+    # Results
+
+    def title(self):
+        node = self.title_node
+        # Tag.string: only defined when the element has exactly one child
+        while node is not None and len(node) == 1:
+            if isinstance(node[0], str):
+                return node[0]
+            node = node[0]
+        return ''
+
+    def text(self):
+        return ''.join(self.text_parts)
+
+
+def extract_html(markup, base_url, categorize):
+    """Extract title, raw text, links, images and products from page HTML in one pass"""
+    page = PageExtractor().extract(decode_markup(markup))
+
+    links = []
+    for href, capture in page.links:
+        href = join_url(base_url, href)
+        if base_url in href:
+            links.append({'url': href, 'text': capture.text()})
+
+    products = []
+    for matches in page.products:
+        for product in matches:
+            name = product.name()
+            if name:
+                products.append({
+                    'name': name,
+                    'category': categorize(name),
+                    'url': join_url(base_url, product.href) if product.href is not None else None
+                })
+
+    return {
+        'title': page.title(),
+        'text': page.text(),
+        'links': links,
+        'images': [{'src': join_url(base_url, src), 'alt': alt, 'title': title} for src, alt, title in page.images],
+        'products': products
+    }
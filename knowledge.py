@@ -0,0 +1,129 @@
+"""
+Knowledge Generations for Nestlé Canada AI Chatbot
+One published generation of pages, product counts, products and search indexes
+
+A refresh forks the serving bundle, patches the fork and publishes it with
+one reference swap; a published bundle is never modified.
+
+File: knowledge.py
+"""
+
+from datetime import datetime
+
+from search_index import InvertedIndex, split_passages
+
+
+class KnowledgeBundle:
+    """Pages, product counts, product store, BM25 and vector indexes of one knowledge base generation"""
+
+    def __init__(self, pages=None, product_counts=None, search_index=None, indexed_passages=None,
+                 vector_index=None, generation=0, passage_words=120, passage_overlap=30, products=None):
+        self.pages = pages if pages is not None else {}
+        self.product_counts = product_counts if product_counts is not None else {}
+        # Catalogue plus scraped products; rebuilt by the app when pages change, not saved in snapshots
+        self.products = products
+        self.search_index = search_index if search_index is not None else InvertedIndex()
+        self.indexed_passages = indexed_passages if indexed_passages is not None else {}
+        self.vector_index = vector_index
+        self.generation = generation
+        self.passage_words = passage_words
+        self.passage_overlap = passage_overlap
+
+    @classmethod
+    def from_snapshot(cls, state, generation, **kwargs):
+        """Bundle for a loaded snapshot state"""
+        return cls(
+            pages=state['knowledge_base'],
+            product_counts=state['product_counts'],
+            search_index=state['search_index'],
+            indexed_passages=state['indexed_passages'],
+            vector_index=state.get('vector_index'),
+            generation=generation,
+            **kwargs
+        )
+
+    def snapshot_state(self):
+        """State dict written to the on-disk snapshot"""
+        return {
+            'knowledge_base': self.pages,
+            'product_counts': self.product_counts,
+            'search_index': self.search_index,
+            'indexed_passages': self.indexed_passages,
+            'vector_index': self.vector_index
+        }
+
+    def fork(self):
+        """Next generation to patch while this one keeps serving"""
+        return KnowledgeBundle(
+            pages=dict(self.pages),
+            product_counts={
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in self.product_counts.items()
+            },
+            search_index=self.search_index.fork(),
+            indexed_passages=dict(self.indexed_passages),
+            vector_index=self.vector_index.fork() if self.vector_index is not None else None,
+            generation=self.generation,
+            passage_words=self.passage_words,
+            passage_overlap=self.passage_overlap,
+            products=self.products
+        )
+
+    def get_passages(self, content):
+        """Return the stored passages for a page, splitting older records on demand"""
+        if 'passages' not in content:
+            content['passages'] = split_passages(content.get('text', ''), self.passage_words, self.passage_overlap)
+        return content['passages']
+
+    def merge_page(self, url, content, vectors=None):
+        """Replace one page's record, product counts and index entries"""
+        self.update_product_counts(self.pages.get(url), content)
+        self.pages[url] = content
+        self.unindex_page(url)
+        self.index_page(url, content, vectors)
+
+    def restamp_page(self, url, content):
+        """Replace a page's record with one for the same content and new cache validators, keeping its index entries"""
+        self.pages[url] = content
+
+    def remove_page(self, url):
+        """Drop a page that disappeared from the site"""
+        self.update_product_counts(self.pages.pop(url, None), None)
+        self.unindex_page(url)
+
+    def finish_refresh(self):
+        """Stamp the product counts of a refreshed generation"""
+        self.product_counts.setdefault('total_products', 0)
+        self.product_counts.setdefault('products_by_category', {})
+        self.product_counts['last_updated'] = datetime.now().isoformat()
+
+    def index_page(self, url, content, vectors=None):
+        """Add a page's passages to the BM25 index, and their vectors to the vector index when given"""
+        passages = self.get_passages(content)
+        for position, passage in enumerate(passages):
+            self.search_index.add_document((url, position), passage['text'])
+            if vectors is not None:
+                self.vector_index.add((url, position), passage['text'], vectors[position])
+        self.indexed_passages[url] = len(passages)
+
+    def unindex_page(self, url):
+        """Remove a page's passages from the BM25 and vector indexes"""
+        for position in range(self.indexed_passages.pop(url, 0)):
+            self.search_index.remove_document((url, position))
+            if self.vector_index is not None:
+                self.vector_index.remove((url, position))
+
+    def update_product_counts(self, old_content, new_content):
+        """Replace one page's contribution to the product counts"""
+        total_products = self.product_counts.get('total_products', 0)
+        products_by_category = self.product_counts.setdefault('products_by_category', {})
+
+        for content, delta in ((old_content, -1), (new_content, 1)):
+            for product in (content or {}).get('products', []):
+                category = product.get('category', 'other')
+                products_by_category[category] = products_by_category.get(category, 0) + delta
+                if not products_by_category[category]:
+                    del products_by_category[category]
+                total_products += delta
+
+        self.product_counts['total_products'] = total_products
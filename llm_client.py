@@ -0,0 +1,429 @@
+"""
+LLM Client for Nestlé Canada AI Chatbot
+Deadlines, retries, hedging and a circuit breaker around OpenAI chat completions and embeddings
+
+Calls that cannot be answered raise LLMUnavailable; AsyncLLMClient applies
+the same policy to AsyncOpenAI and shares the breaker.
+
+File: llm_client.py
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class AttemptTimeout(Exception):
+    """An attempt ran past its timeout on the wall clock"""
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer in time: circuit open, deadline spent or retries exhausted"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_retryable(error):
+    """Timeouts, connection errors, 408/409/429 and 5xx answers are worth another attempt"""
+    if isinstance(error, (openai.APIConnectionError, AttemptTimeout)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def is_upstream_failure(error):
+    """Transport errors, timeouts, 429 and 5xx answers: the errors that say the upstream is in trouble"""
+    if isinstance(error, (openai.APIConnectionError, AttemptTimeout)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 429) or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error):
+    """Retry-After of a rate limited or overloaded answer, in seconds, if it sent one"""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def describe(error):
+    status = getattr(error, 'status_code', None)
+    return f"{type(error).__name__} {status}" if status else type(error).__name__
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed, open (fail fast), half-open (one trial call)"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.opened = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now ('trial' for the single call let through while half-open)"""
+        if not self.failure_threshold:
+            return True
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_running = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return 'trial'
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info("LLM circuit closed")
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_running = False
+
+    def release(self):
+        """End a call that failed for reasons of its own (a refused request, a bug): counts neither way"""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failure_threshold and (self.state == 'half_open' or self.failures >= self.failure_threshold):
+                if self.state != 'open':
+                    self.opened += 1
+                    logger.warning(f"LLM circuit open after {self.failures} consecutive failures; "
+                                   f"failing fast for {self.reset_timeout:g}s")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+
+class LLMClient:
+    """Chat completions and embeddings under a deadline, with retries, optional hedging and a circuit breaker
+
+    Sync attempts run on a pool of attempt_workers threads so that the caller
+    can stop waiting when the attempt timeout is up.
+    """
+
+    def __init__(self, client, breaker, deadline=20, attempt_timeout=10, max_retries=2,
+                 backoff_base=0.25, backoff_max=4, hedge_after=0, attempt_workers=32):
+        self.client = client
+        self.breaker = breaker
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.attempt_workers = attempt_workers
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.rng = random.Random()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def backoff(self, retry, error):
+        """Full-jitter exponential delay before retry number retry + 1"""
+        delay = self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+        retry_after = retry_after_seconds(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def admit(self):
+        """Start a call: (deadline, whether it is the half-open trial) or LLMUnavailable while the circuit is open"""
+        allowed = self.breaker.allow()
+        if not allowed:
+            raise LLMUnavailable('circuit open')
+        self.calls += 1
+        return time.monotonic() + self.deadline, allowed == 'trial'
+
+    def settle(self, error):
+        """Tell the breaker how a call that failed with error went"""
+        if is_upstream_failure(error):
+            self.breaker.record_failure()
+        elif isinstance(error, openai.APIStatusError):
+            # The upstream answered; the request itself was refused
+            self.breaker.record_success()
+        else:
+            self.breaker.release()
+
+    def attempt_failed(self, error, retry, deadline):
+        """Seconds to wait before retrying a failed attempt; raises when the call should give up"""
+        if not is_retryable(error):
+            self.settle(error)
+            raise error
+        delay = self.backoff(retry, error)
+        if retry >= self.max_retries or time.monotonic() + delay >= deadline:
+            self.failures += 1
+            self.settle(error)
+            raise LLMUnavailable(f"{describe(error)} after {retry + 1} attempt(s)") from error
+        self.retries += 1
+        logger.warning(f"LLM attempt {retry + 1} failed ({describe(error)}); retrying in {delay:.2f}s")
+        return delay
+
+    def call(self, send):
+        """Run send(timeout) under the deadline, retrying as the policy allows"""
+        deadline, trial = self.admit()
+        retry = 0
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(f"deadline of {self.deadline:g}s exceeded")
+                self.attempts += 1
+                try:
+                    result = send(min(self.attempt_timeout, remaining))
+                except Exception as e:
+                    time.sleep(self.attempt_failed(e, retry, deadline))
+                    retry += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        except BaseException as e:
+            if trial and not isinstance(e, Exception):
+                # Cancelled or interrupted before it settled: let another call be the trial
+                self.breaker.release()
+            raise
+
+    def submit(self, send, timeout):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.attempt_workers, thread_name_prefix='llm-attempt')
+        return self.executor.submit(send, timeout)
+
+    def hedged(self, send, timeout):
+        """send(timeout) given timeout seconds on the wall clock, plus one identical request
+        if the first is still running after hedge_after
+
+        An attempt that runs out of time is left to finish in its thread (httpx
+        ends it at its own timeout) and AttemptTimeout is raised.
+        """
+        expires = time.monotonic() + timeout
+        hedge = self.hedge_after and self.hedge_after < timeout
+        first = self.submit(send, timeout)
+        done, pending = wait([first], timeout=self.hedge_after if hedge else timeout)
+        if done:
+            return first.result()
+        if not hedge:
+            raise AttemptTimeout(f"no answer within {timeout:g}s")
+
+        self.hedges += 1
+        second = self.submit(send, timeout - self.hedge_after)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, expires - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise AttemptTimeout(f"no answer within {timeout:g}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def complete(self, messages, **params):
+        """Chat completion response for messages"""
+        return self.call(lambda timeout: self.hedged(
+            lambda attempt_timeout: self.client.chat.completions.create(
+                messages=messages, timeout=attempt_timeout, **params
+            ),
+            timeout
+        ))
+
+    def embeddings(self, **params):
+        """Embeddings response (embeddings.create parameters)"""
+        return self.call(lambda timeout: self.hedged(
+            lambda attempt_timeout: self.client.embeddings.create(timeout=attempt_timeout, **params),
+            timeout
+        ))
+
+    def stream(self, messages, **params):
+        """Iterator over the chunks of a streamed completion; retries cover opening the stream
+
+        The chunks stop at the call's deadline: a watchdog closes a stream
+        that is still open then, and the iterator raises LLMUnavailable.
+        """
+        deadline = time.monotonic() + self.deadline
+        stream = self.call(lambda timeout: self.client.chat.completions.create(messages=messages, timeout=timeout, **params))
+        return self.guarded(stream, deadline)
+
+    def guarded(self, stream, deadline):
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            stream.close()
+
+        watchdog = threading.Timer(max(0, deadline - time.monotonic()), expire)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            for chunk in stream:
+                if expired.is_set() or time.monotonic() >= deadline:
+                    raise AttemptTimeout(f"stream still open after {self.deadline:g}s")
+                yield chunk
+            if expired.is_set():
+                raise AttemptTimeout(f"stream still open after {self.deadline:g}s")
+        except Exception as e:
+            if expired.is_set() and not isinstance(e, AttemptTimeout):
+                # Closing the stream under the iterator fails the read in progress
+                e = AttemptTimeout(f"stream still open after {self.deadline:g}s")
+            elif not is_retryable(e):
+                raise
+            self.failures += 1
+            self.settle(e)
+            raise LLMUnavailable(f"stream interrupted: {describe(e)}") from e
+        finally:
+            watchdog.cancel()
+            stream.close()
+
+    def stats(self):
+        return dict(
+            self.breaker.stats(),
+            calls=self.calls,
+            attempts=self.attempts,
+            retries=self.retries,
+            hedges=self.hedges,
+            hedge_wins=self.hedge_wins,
+            failures=self.failures
+        )
+
+
+class AsyncLLMClient(LLMClient):
+    """LLMClient for AsyncOpenAI; a losing hedge is cancelled instead of left to finish"""
+
+    async def call(self, send):
+        deadline, trial = self.admit()
+        retry = 0
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(f"deadline of {self.deadline:g}s exceeded")
+                self.attempts += 1
+                timeout = min(self.attempt_timeout, remaining)
+                try:
+                    result = await asyncio.wait_for(send(timeout), timeout)
+                except asyncio.TimeoutError:
+                    await asyncio.sleep(self.attempt_failed(AttemptTimeout(f"no answer within {timeout:g}s"), retry, deadline))
+                    retry += 1
+                    continue
+                except Exception as e:
+                    await asyncio.sleep(self.attempt_failed(e, retry, deadline))
+                    retry += 1
+                    continue
+                self.breaker.record_success()
+                return result
+        except BaseException as e:
+            if trial and not isinstance(e, Exception):
+                # Cancelled or interrupted before it settled: let another call be the trial
+                self.breaker.release()
+            raise
+
+    async def hedged(self, send, timeout):
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await send(timeout)
+        first = asyncio.ensure_future(send(timeout))
+        done, pending = await asyncio.wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = asyncio.ensure_future(send(timeout - self.hedge_after))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, messages, **params):
+        return await self.call(lambda timeout: self.hedged(
+            lambda attempt_timeout: self.client.chat.completions.create(
+                messages=messages, timeout=attempt_timeout, **params
+            ),
+            timeout
+        ))
+
+    async def embeddings(self, **params):
+        return await self.call(lambda timeout: self.hedged(
+            lambda attempt_timeout: self.client.embeddings.create(timeout=attempt_timeout, **params),
+            timeout
+        ))
+
+    async def stream(self, messages, **params):
+        deadline = time.monotonic() + self.deadline
+        stream = await self.call(lambda timeout: self.client.chat.completions.create(messages=messages, timeout=timeout, **params))
+        return self.guarded(stream, deadline)
+
+    async def guarded(self, stream, deadline):
+        chunks = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise AttemptTimeout(f"stream still open after {self.deadline:g}s") from None
+                yield chunk
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            self.failures += 1
+            self.settle(e)
+            raise LLMUnavailable(f"stream interrupted: {describe(e)}") from e
+        finally:
+            await stream.close()
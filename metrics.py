@@ -0,0 +1,205 @@
+"""
+Latency Metrics for Nestlé Canada AI Chatbot
+Per-stage latency histograms exported in Prometheus text format
+
+Every hot-path stage (intent detection, retrieval, prompt build, the LLM
+call, post-processing, page fetch/parse) records its duration into a
+fixed-bucket histogram: a bisect and three increments under a lock, so
+instrumenting a request costs a few microseconds.
+
+- /metrics exports the cumulative buckets, sum and count of each stage
+  (aggregate them with histogram_quantile) plus p50/p95/p99 estimated from
+  the last one to two quantile windows, and any gauges the app registers
+- counts are per process; with several gunicorn workers each scrape sees
+  the worker that answered it
+- Metrics(enabled=False) turns timers into no-ops
+
+File: metrics.py
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Bucket upper bounds in seconds: 0.25 ms doubling up to about 65 s
+DEFAULT_BUCKETS = tuple(0.00025 * 2 ** power for power in range(19))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Latency histogram: cumulative buckets for export, plus a rotating window for quantiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window_seconds=300):
+        self.bounds = tuple(buckets)
+        self.window_seconds = window_seconds
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.recent = [0] * len(self.counts)
+        self.previous = [0] * len(self.counts)
+        self.window_end = time.monotonic() + window_seconds
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.bounds, seconds)
+        now = time.monotonic()
+        with self.lock:
+            if now >= self.window_end:
+                self.rotate(now)
+            self.counts[index] += 1
+            self.recent[index] += 1
+            self.sum += seconds
+            self.count += 1
+            if seconds > self.max:
+                self.max = seconds
+
+    def rotate(self, now):
+        """Start a new quantile window; the one before it is kept, older ones are dropped"""
+        stale = now >= self.window_end + self.window_seconds
+        self.previous = [0] * len(self.counts) if stale else self.recent
+        self.recent = [0] * len(self.counts)
+        self.window_end = now + self.window_seconds
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, count, window bucket counts)"""
+        now = time.monotonic()
+        with self.lock:
+            if now >= self.window_end:
+                self.rotate(now)
+            window = [recent + previous for recent, previous in zip(self.recent, self.previous)]
+            return list(self.counts), self.sum, self.count, window
+
+    def quantile(self, fraction, counts):
+        """Quantile estimated from bucket counts, interpolating inside the bucket it falls in"""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = fraction * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.bounds):
+                    return self.max
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = min(self.bounds[index], self.max) if self.max > lower else self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class StageTimer:
+    """Context manager recording the time spent in its block into a histogram"""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class NullTimer:
+    """Stand-in for StageTimer when metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """Stage latency histograms and registered gauges of one process"""
+
+    def __init__(self, prefix='nestle_chatbot', enabled=True, buckets=DEFAULT_BUCKETS, window_seconds=300):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.window_seconds = window_seconds
+        self.stages = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.stages.setdefault(stage, Histogram(self.buckets, self.window_seconds))
+        return histogram
+
+    def timer(self, stage):
+        """Context manager timing a block as one observation of stage"""
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self.histogram(stage))
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def add_collector(self, collect):
+        """Register collect() -> iterable of (name, help, type, labels dict, value), read on each export"""
+        self.collectors.append(collect)
+
+    def summary(self):
+        """Count and p50/p95/p99 in milliseconds for each stage (for /health)"""
+        summary = {}
+        for stage, histogram in sorted(self.stages.items()):
+            counts, total, count, window = histogram.snapshot()
+            summary[stage] = {'count': count}
+            for fraction in QUANTILES:
+                summary[stage][f"p{round(fraction * 100)}_ms"] = round(histogram.quantile(fraction, window) * 1000, 2)
+        return summary
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        name = f"{self.prefix}_stage_seconds"
+        quantile_name = f"{self.prefix}_stage_quantile_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each request or refresh stage",
+            f"# TYPE {name} histogram"
+        ]
+        quantile_lines = [
+            f"# HELP {quantile_name} Stage latency quantiles over the last one to two windows",
+            f"# TYPE {quantile_name} gauge"
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            counts, total, count, window = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+            for fraction in QUANTILES:
+                quantile_lines.append(
+                    f'{quantile_name}{{stage="{stage}",quantile="{fraction:g}"}} {histogram.quantile(fraction, window):.6f}'
+                )
+        lines.extend(quantile_lines)
+
+        described = set()
+        for collect in self.collectors:
+            for metric, help_text, metric_type, labels, value in collect():
+                metric = f"{self.prefix}_{metric}"
+                if metric not in described:
+                    described.add(metric)
+                    lines.append(f"# HELP {metric} {help_text}")
+                    lines.append(f"# TYPE {metric} {metric_type}")
+                label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
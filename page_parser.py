@@ -0,0 +1,166 @@
+"""
+Page Parser for Nestlé Canada AI Chatbot
+Turns raw page HTML into knowledge base records
+
+Parsing used to live on the scraper in app.py, which made it impossible to
+hand to another process: the scraper holds a requests session and importing
+app starts the whole chatbot. PageParser only carries its settings and the
+product category matcher, so it pickles cheaply into the crawler's parse
+worker processes (see crawler.py) and importing this module has no side
+effects.
+
+Extraction runs in a single pass through html_extract.py by default; the
+BeautifulSoup tree walk is kept as the reference implementation and as the
+fallback for pages that are not UTF-8.
+
+File: page_parser.py
+"""
+
+import logging
+from datetime import datetime
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from html_extract import PRODUCT_NAME_SELECTORS, PRODUCT_SELECTORS, ExtractionFallback, extract_html
+from search_index import split_passages
+
+logger = logging.getLogger(__name__)
+
+
+class PageParser:
+    """Builds the url/title/text/passages/links/images/products record for one page"""
+
+    def __init__(self, base_url, category_matcher, passage_words=120, passage_overlap=30, extractor='fast'):
+        self.base_url = base_url
+        self.category_matcher = category_matcher
+        self.passage_words = passage_words
+        self.passage_overlap = passage_overlap
+        self.extractor = extractor
+
+    def parse_page(self, url, html):
+        """Parse raw page HTML into a knowledge base record"""
+        try:
+            page = self.extract_page(html)
+
+            # Clean up text
+            lines = (line.strip() for line in page['text'].splitlines())
+            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+            text = ' '.join(chunk for chunk in chunks if chunk)
+
+            return {
+                'url': url,
+                'title': page['title'],
+                'text': text,
+                'passages': split_passages(text, self.passage_words, self.passage_overlap),
+                'links': page['links'],
+                'images': page['images'],
+                'products': page['products'],
+                'scraped_at': datetime.now().isoformat()
+            }
+
+        except Exception as e:
+            logger.error(f"Error parsing {url}: {str(e)}")
+            return None
+
+    def extract_page(self, html):
+        """Extract title, text, links, images and products, in a single pass unless configured otherwise"""
+        if self.extractor == 'fast':
+            try:
+                return extract_html(html, self.base_url, self.categorize_product)
+            except ExtractionFallback as e:
+                logger.info(f"Using BeautifulSoup for page: {str(e)}")
+        return self.extract_page_soup(html)
+
+    def extract_page_soup(self, html):
+        """BeautifulSoup extraction; the reference for html_extract.py and the fallback for non-UTF-8 pages"""
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+
+        # Extract text content
+        text = soup.get_text()
+
+        # Extract product information for counting
+        products = self.extract_products_from_page(soup)
+
+        # Extract links
+        links = []
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            if href.startswith('/'):
+                href = urljoin(self.base_url, href)
+            if self.base_url in href:
+                links.append({
+                    'url': href,
+                    'text': link.get_text(strip=True)
+                })
+
+        # Extract images
+        images = []
+        for img in soup.find_all('img', src=True):
+            src = img['src']
+            if src.startswith('/'):
+                src = urljoin(self.base_url, src)
+            images.append({
+                'src': src,
+                'alt': img.get('alt', ''),
+                'title': img.get('title', '')
+            })
+
+        return {
+            'title': str(soup.title.string) if soup.title and soup.title.string else '',
+            'text': text,
+            'links': links,
+            'images': images,
+            'products': products
+        }
+
+    def extract_products_from_page(self, soup):
+        """Extract product information for structured queries"""
+        products = []
+
+        # Look for product cards, product listings, etc.
+        for selector in PRODUCT_SELECTORS:
+            elements = soup.select(selector)
+            for element in elements:
+                product_name = self.extract_product_name(element)
+                if product_name:
+                    products.append({
+                        'name': product_name,
+                        'category': self.categorize_product(product_name),
+                        'url': self.extract_product_url(element)
+                    })
+
+        return products
+
+    def extract_product_name(self, element):
+        """Extract product name from HTML element"""
+        # Try different methods to extract product name
+        for selector in PRODUCT_NAME_SELECTORS:
+            name_element = element.select_one(selector)
+            if name_element:
+                return name_element.get_text(strip=True)
+
+        # Fallback to element text
+        text = element.get_text(strip=True)
+        if len(text) < 100:  # Reasonable product name length
+            return text
+
+        return None
+
+    def categorize_product(self, product_name):
+        """Categorize product based on name"""
+        return self.category_matcher.match_field(product_name, 'category') or 'other'
+
+    def extract_product_url(self, element):
+        """Extract product URL from element"""
+        link = element.find('a', href=True)
+        if link:
+            href = link['href']
+            if href.startswith('/'):
+                href = urljoin(self.base_url, href)
+            return href
+        return None
@@ -0,0 +1,293 @@
+"""
+Product Store for Nestlé Canada AI Chatbot
+Compact, indexed product catalogue for lookups, product detection and /products pages
+
+ProductStore keeps one list per field and array('I') posting lists, so a
+catalogue of tens of thousands of SKUs stays small in every worker.
+
+File: product_store.py
+"""
+
+import csv
+import json
+import threading
+from array import array
+from collections import OrderedDict
+
+from search_index import TOKEN_PATTERN, fold_text
+from store_locator import normalize_product
+
+INDEX_NAMES = ('category', 'size', 'word')
+
+
+def name_words(text):
+    return TOKEN_PATTERN.findall(fold_text(str(text)))
+
+
+def alias_key(text):
+    """Lowercase, accent-free words of a name joined by single spaces"""
+    return ' '.join(name_words(text))
+
+
+def split_values(value):
+    """List field from a catalogue row: a list, or a string separated by ';' or '|'"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.replace('|', ';').split(';') if item.strip()]
+    return [str(item) for item in value]
+
+
+def load_products(path):
+    """Load a product catalogue from a .json or .csv file
+
+    JSON: a list of product objects, {"products": [...]}, or an object keyed by
+    product key like PRODUCT_DATA. CSV: a header row with key, name,
+    description, amazon_url, url, categories, available_sizes and aliases;
+    list fields are separated by ';' or '|'.
+    """
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as catalogue_file:
+            data = json.load(catalogue_file)
+        if isinstance(data, dict) and 'products' in data:
+            rows = data['products']
+        elif isinstance(data, dict):
+            rows = [dict(product, key=key) for key, product in data.items()]
+        else:
+            rows = data
+    else:
+        with open(path, newline='', encoding='utf-8') as catalogue_file:
+            rows = list(csv.DictReader(catalogue_file))
+    return [row for row in rows if row.get('name')]
+
+
+class ProductStore:
+    """Columnar product catalogue indexed by key, name/alias, category, size and name word
+
+    reserved_words are category words that a scraped product's one-word name
+    may not claim as an alias (the store's own categories count as well).
+    """
+
+    def __init__(self, products=(), page_cache_size=256, reserved_words=()):
+        self.keys = []
+        self.names = []
+        self.descriptions = []
+        self.amazon_urls = []
+        self.urls = []
+        self.categories = []
+        self.sizes = []
+        self.sources = []
+        self.rows = {}
+        self.aliases = {}
+        self.alias_lengths = set()
+        self.indexes = {name: {} for name in INDEX_NAMES}
+        self.shared = {name: set() for name in INDEX_NAMES}
+        self.values = {}
+        self.reserved_words = frozenset(alias_key(word) for word in reserved_words)
+        self.page_cache_size = page_cache_size
+        self.page_cache = OrderedDict()
+        self.lock = threading.Lock()
+        for product in products:
+            self.add(product)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def fork(self):
+        """Copy to extend while this store keeps serving; posting lists are copied on first write"""
+        clone = ProductStore(page_cache_size=self.page_cache_size, reserved_words=self.reserved_words)
+        for column in ('keys', 'names', 'descriptions', 'amazon_urls', 'urls', 'categories', 'sizes', 'sources'):
+            setattr(clone, column, list(getattr(self, column)))
+        clone.rows = dict(self.rows)
+        clone.aliases = dict(self.aliases)
+        clone.alias_lengths = set(self.alias_lengths)
+        clone.indexes = {name: dict(table) for name, table in self.indexes.items()}
+        clone.shared = {name: set(table) for name, table in self.indexes.items()}
+        clone.values = self.values
+        return clone
+
+    def with_products(self, products, source='site'):
+        """Copy of this store plus products not already in it"""
+        store = self.fork()
+        for product in products:
+            if product.get('name'):
+                store.add(dict(product, source=product.get('source', source)))
+        return store
+
+    def shared_value(self, value):
+        """One shared object per distinct value (strings, category and size tuples)"""
+        return self.values.setdefault(value, value)
+
+    def owned(self, index, value, new):
+        """Entry of an index that this store may modify"""
+        table = self.indexes[index]
+        entry = table.get(value)
+        if entry is None:
+            entry = table[value] = new()
+        elif value in self.shared[index]:
+            entry = table[value] = entry[:]
+            self.shared[index].discard(value)
+        return entry
+
+    def add(self, product):
+        """Add a product (PRODUCT_DATA fields; 'category' or 'categories'); returns its row
+
+        The first product added under a key wins; later ones are ignored.
+        """
+        name = str(product['name'])
+        given_key = product.get('key') or name
+        key = normalize_product(given_key)
+        # Keep the loaded string when it is already normalized, so key and alias can share it
+        key = given_key if key == given_key else key
+        if key in self.rows:
+            return self.rows[key]
+
+        categories = split_values(product.get('categories')) or split_values(product.get('category'))
+        sizes = split_values(product.get('available_sizes') or product.get('sizes'))
+        row = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.descriptions.append(product.get('description') or '')
+        self.amazon_urls.append(product.get('amazon_url') or '')
+        self.urls.append(product.get('url') or '')
+        self.categories.append(self.shared_value(tuple(self.shared_value(normalize_product(category)) for category in categories)))
+        self.sizes.append(self.shared_value(tuple(self.shared_value(size) for size in sizes)))
+        self.sources.append(self.shared_value(product.get('source') or 'catalogue'))
+        self.rows[key] = row
+
+        for category in self.categories[row]:
+            self.owned('category', category, lambda: array('I')).append(row)
+        for size in self.sizes[row]:
+            self.owned('size', normalize_product(size), lambda: array('I')).append(row)
+        for word in set(name_words(name)):
+            self.owned('word', self.shared_value(word), lambda: array('I')).append(row)
+        for alias in [key, name] + split_values(product.get('aliases')):
+            alias = alias_key(alias)
+            alias = key if alias == key else alias
+            if alias and alias not in self.aliases and not (self.sources[row] != 'catalogue' and self.is_generic(alias)):
+                self.aliases[alias] = row
+                self.alias_lengths.add(alias.count(' ') + 1)
+
+        if self.page_cache:
+            with self.lock:
+                self.page_cache.clear()
+        return row
+
+    def is_generic(self, alias):
+        """Whether an alias is a single category word (or its plural)"""
+        if ' ' in alias:
+            return False
+        for word in (alias, alias[:-1] if alias.endswith('s') else None):
+            if word and (word in self.reserved_words or word in self.indexes['category']):
+                return True
+        return False
+
+    def record(self, row):
+        """A product as a PRODUCT_DATA-style dict"""
+        return {
+            'key': self.keys[row],
+            'name': self.names[row],
+            'description': self.descriptions[row],
+            'amazon_url': self.amazon_urls[row],
+            'url': self.urls[row],
+            'categories': list(self.categories[row]),
+            'available_sizes': list(self.sizes[row]),
+            'source': self.sources[row]
+        }
+
+    def get(self, key):
+        """Product by key, or None"""
+        row = self.rows.get(key)
+        return self.record(row) if row is not None else None
+
+    def find(self, name):
+        """Product by key, name or alias (case, accents and punctuation ignored), or None"""
+        row = self.aliases.get(alias_key(name))
+        if row is None:
+            row = self.rows.get(normalize_product(name))
+        return self.record(row) if row is not None else None
+
+    def match(self, text):
+        """Key of the earliest-added product named in text, or None"""
+        words = name_words(text)
+        aliases = self.aliases
+        best = None
+        for length in self.alias_lengths:
+            for position in range(len(words) - length + 1):
+                phrase = ' '.join(words[position:position + length])
+                row = aliases.get(phrase)
+                if row is None and phrase.endswith('s'):
+                    row = aliases.get(phrase[:-1])
+                if row is not None and (best is None or row < best):
+                    best = row
+        return self.keys[best] if best is not None else None
+
+    def keys_for(self, category=None, size=None, search=None):
+        """Normalized filter values, the cache key of a listing"""
+        return (
+            normalize_product(category) if category else None,
+            normalize_product(size) if size else None,
+            alias_key(search) if search else None
+        )
+
+    def select(self, category=None, size=None, search=None):
+        """Rows matching every given filter (search: all words in the name), in catalogue order"""
+        category, size, search = self.keys_for(category, size, search)
+        postings = []
+        if category:
+            postings.append(self.indexes['category'].get(category, ()))
+        if size:
+            postings.append(self.indexes['size'].get(size, ()))
+        for word in (search or '').split():
+            postings.append(self.indexes['word'].get(word, ()))
+        if not postings:
+            return range(len(self.keys))
+
+        postings.sort(key=len)
+        rows = postings[0]
+        for other in postings[1:]:
+            if not rows:
+                break
+            members = set(other)
+            rows = [row for row in rows if row in members]
+        return rows
+
+    def page_json(self, page=1, per_page=50, category=None, size=None, search=None):
+        """JSON bytes of one page of a filtered listing, serialized once per store"""
+        filters = self.keys_for(category, size, search)
+        cache_key = (page, per_page) + filters
+        with self.lock:
+            body = self.page_cache.get(cache_key)
+            if body is not None:
+                self.page_cache.move_to_end(cache_key)
+                return body
+
+        rows = self.select(*filters)
+        start = (page - 1) * per_page
+        body = json.dumps({
+            'products': [self.record(row) for row in rows[start:start + per_page]],
+            'page': page,
+            'per_page': per_page,
+            'total': len(rows),
+            'pages': max(1, -(-len(rows) // per_page)),
+            'filters': {name: value for name, value in zip(('category', 'size', 'q'), filters) if value}
+        }, separators=(',', ':')).encode('utf-8')
+
+        with self.lock:
+            self.page_cache[cache_key] = body
+            while len(self.page_cache) > self.page_cache_size:
+                self.page_cache.popitem(last=False)
+        return body
+
+    def stats(self):
+        with self.lock:
+            cached_pages = len(self.page_cache)
+        return {
+            'products': len(self.keys),
+            'scraped': sum(1 for source in self.sources if source != 'catalogue'),
+            'categories': len(self.indexes['category']),
+            'cached_pages': cached_pages
+        }
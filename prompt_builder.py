@@ -0,0 +1,186 @@
+"""
+Prompt Builder for Nestlé Canada AI Chatbot
+Token-budgeted prompt assembly behind a fixed system prompt
+
+SYSTEM_PROMPT is sent byte-for-byte the same on every request so providers
+can cache it; passages are deduplicated and packed by score into the budget.
+
+File: prompt_builder.py
+"""
+
+import logging
+import re
+
+from search_index import estimate_tokens, fold_text
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts when installed, estimates otherwise
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are SMARTIE, a helpful assistant for the Made with Nestlé Canada website. "
+    "You help users find information about Nestlé products, recipes, nutrition, sustainability practices, "
+    "and general inquiries.\n"
+    "\n"
+    "Always be friendly, helpful, and provide accurate information based on the context provided. "
+    "If you don't have specific information, suggest where users might find it on the website. "
+    "Keep responses conversational but informative.\n"
+    "\n"
+    "When providing information, always try to include relevant links when available. "
+    "If you reference specific information, mention that it comes from the Made with Nestlé Canada website.\n"
+    "\n"
+    "You can also help users find stores, purchase products online, and get product counts."
+)
+
+CONTEXT_HEADER = "Context from the Made with Nestlé Canada website:\n\n"
+NO_CONTEXT = "No matching content was found on the website.\n\n"
+
+# Tokens the chat format adds around each message, and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+
+WORD_PATTERN = re.compile(r"\S+")
+PUNCTUATION = re.compile(r"[^\w]+")
+
+
+class TokenCounter:
+    """Token counts for one model: tiktoken when available, a character estimate otherwise"""
+
+    def __init__(self, model):
+        self.model = model
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception as e:
+                # The encoding files are downloaded on first use; estimate if that fails
+                logger.warning(f"tiktoken unavailable for {model}, estimating token counts: {str(e)}")
+
+    @property
+    def exact(self):
+        return self.encoding is not None
+
+    def count(self, text):
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages):
+        """Prompt tokens for a list of chat messages, including the chat format's overhead"""
+        return sum(self.count(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages) + REPLY_OVERHEAD_TOKENS
+
+
+class PromptBuilder:
+    """Packs deduplicated passages into a context budget behind the fixed system prompt"""
+
+    def __init__(self, counter, context_budget, shingle_words=8, min_passage_words=8):
+        self.counter = counter
+        self.context_budget = context_budget
+        self.shingle_words = shingle_words
+        self.min_passage_words = min_passage_words
+        self.system_tokens = counter.count(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS
+
+    def build(self, user_message, passages):
+        """Chat messages for a question and its ranked passages
+
+        Returns (messages, selected passages, stats). Passages are considered
+        in the order given (best first); each one loses the word runs it
+        repeats and is kept if what is left fits the budget.
+        """
+        seen_shingles = set()
+        selected = []
+        sections = []
+        context_tokens = 0
+        dropped_tokens = 0
+
+        for passage in passages:
+            text, shingles = self.strip_repeats(passage['text'], seen_shingles)
+            if text != passage['text'] and len(WORD_PATTERN.findall(text)) < self.min_passage_words:
+                continue
+
+            section = f"From {passage['title']}: {text}\n\n"
+            section_tokens = self.counter.count(section)
+            if context_tokens + section_tokens > self.context_budget:
+                if selected:
+                    continue
+                # Always send the best passage, trimmed to the budget
+                section = self.trim(section, self.context_budget)
+                section_tokens = self.counter.count(section)
+
+            # Only passages that made it into the prompt count towards the savings, once each
+            if text != passage['text']:
+                dropped_tokens += self.counter.count(passage['text']) - self.counter.count(text)
+            seen_shingles.update(shingles)
+            sections.append(section)
+            selected.append(dict(passage, text=text))
+            context_tokens += section_tokens
+
+        context = CONTEXT_HEADER + ''.join(sections) if sections else NO_CONTEXT
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{context}User question: {user_message}"}
+        ]
+        stats = {
+            'prompt_tokens': self.counter.count_messages(messages),
+            'system_tokens': self.system_tokens,
+            'context_tokens': context_tokens,
+            'boilerplate_tokens_dropped': dropped_tokens,
+            'passages': len(selected),
+            'candidates': len(passages)
+        }
+        return messages, selected, stats
+
+    def shingles(self, words):
+        keys = [PUNCTUATION.sub('', fold_text(word)) for word in words]
+        size = self.shingle_words
+        return [tuple(keys[index:index + size]) for index in range(len(keys) - size + 1)]
+
+    def strip_repeats(self, text, seen_shingles):
+        """Text without the runs of shingle_words words already seen, and the shingles it adds
+
+        A run counts as seen when an earlier passage in the prompt, or earlier
+        text in this passage, already contains it.
+        """
+        matches = list(WORD_PATTERN.finditer(text))
+        if self.shingle_words <= 0 or len(matches) < self.shingle_words:
+            return text, set()
+
+        covered = [False] * len(matches)
+        added = set()
+        for index, shingle in enumerate(self.shingles([match.group() for match in matches])):
+            if shingle in seen_shingles or shingle in added:
+                for position in range(index, index + self.shingle_words):
+                    covered[position] = True
+            added.add(shingle)
+        if not any(covered):
+            return text, added
+
+        runs = []
+        start = None
+        for position, match in enumerate(matches):
+            if not covered[position] and start is None:
+                start = match.start()
+            elif covered[position] and start is not None:
+                runs.append(text[start:matches[position - 1].end()])
+                start = None
+        if start is not None:
+            runs.append(text[start:])
+        return ' … '.join(runs), added
+
+    def trim(self, section, budget):
+        """Cut a section down to at most budget tokens"""
+        if self.counter.count(section) <= budget:
+            return section
+        low, high = 0, len(section)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.counter.count(section[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return section[:low]
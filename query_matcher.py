@@ -0,0 +1,136 @@
+"""
+Query Matcher for Nestlé Canada AI Chatbot
+Aho-Corasick keyword automaton for query intent and category detection
+
+Built once from the intent and category keyword tables; finds every keyword
+in a message in one pass. When several values of a field match, the one
+added first wins. Product names are matched by the product store instead.
+
+File: query_matcher.py
+"""
+
+import re
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton mapping keywords to (field, value) labels"""
+
+    def __init__(self):
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        self.labels = []
+        self.label_ids = {}
+        self.keywords = []
+        self.patterns = {}
+        self.keyword_count = 0
+
+    def add(self, keyword, field, value):
+        """Register a keyword; labels added earlier take priority within a field"""
+        label = (field, value)
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+            self.keywords.append([])
+        self.keywords[label_id].append(keyword.lower())
+
+        node = 0
+        for char in keyword.lower():
+            next_node = self.transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions[node][char] = next_node
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        if label_id not in self.outputs[node]:
+            self.outputs[node].append(label_id)
+        self.keyword_count += 1
+        return self
+
+    def add_table(self, field, table):
+        """Register (value, keywords) pairs in priority order"""
+        for value, keywords in table:
+            for keyword in keywords:
+                self.add(keyword, field, value)
+        return self
+
+    def build(self):
+        """Compute failure links and field patterns; call once after all keywords are added"""
+        queue = deque(self.transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.transitions[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + [
+                    label_id for label_id in self.outputs[self.fail[child]] if label_id not in self.outputs[child]
+                ]
+                queue.append(child)
+
+        # One pattern per value, in priority order, for match_field
+        self.patterns = {}
+        for (field, value), keywords in zip(self.labels, self.keywords):
+            pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+            self.patterns.setdefault(field, []).append((pattern, value))
+        return self
+
+    def match(self, text):
+        """Return {field: value} for the highest-priority match of each field in text"""
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+        best = {}
+        node = 0
+        for char in text.lower():
+            next_node = transitions[node].get(char)
+            while next_node is None and node:
+                node = fail[node]
+                next_node = transitions[node].get(char)
+            node = next_node or 0
+            if outputs[node]:
+                for label_id in outputs[node]:
+                    field = self.labels[label_id][0]
+                    if label_id < best.get(field, len(self.labels)):
+                        best[field] = label_id
+        return {field: self.labels[label_id][1] for field, label_id in best.items()}
+
+    def match_field(self, text, field):
+        """Highest-priority value of one field in text, or None
+
+        Same result as match(text).get(field); for short texts such as product
+        names a search per value is faster than walking the automaton.
+        """
+        text = text.lower()
+        for pattern, value in self.patterns.get(field, ()):
+            if pattern.search(text):
+                return value
+        return None
+
+
+class QueryMatcher:
+    """Intent and category of a chat message from one automaton pass, plus the product it names"""
+
+    def __init__(self, intent_keywords, products, category_keywords):
+        self.products = products
+        self.matcher = KeywordMatcher()
+        self.matcher.add_table('query_type', intent_keywords)
+        self.matcher.add_table('category', category_keywords)
+        self.matcher.build()
+
+    def analyze(self, message, products=None):
+        """Return {'query_type', 'product_key', 'category'} for a message
+
+        products: the product store to look names up in (default: the one given at startup)
+        """
+        found = self.matcher.match(message)
+        return {
+            'query_type': found.get('query_type', 'general'),
+            'product_key': (products if products is not None else self.products).match(message),
+            'category': found.get('category')
+        }
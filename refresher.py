@@ -0,0 +1,196 @@
+"""
+Background Knowledge Refresher for Nestlé Canada AI Chatbot
+Scheduled and on-demand knowledge refreshes on one background thread
+
+KnowledgeRefresher runs queued and scheduled refresh jobs one at a time;
+job records can be shared between workers through a directory.
+
+File: refresher.py
+"""
+
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Terminal job statuses; job records carry finished so that pollers need not list them
+FINISHED_STATES = ('succeeded', 'coalesced', 'failed')
+
+
+class RefreshJobs:
+    """Refresh job records, shared between workers through a directory of JSON files when one is given"""
+
+    def __init__(self, directory=None, keep=50):
+        self.directory = directory
+        self.keep = keep
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def create(self, trigger):
+        """Record a new queued job and return a copy of it"""
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'trigger': trigger,
+            'status': 'queued',
+            'finished': False,
+            'worker_pid': os.getpid(),
+            'requested_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None,
+            'covered_by': None
+        }
+        with self.lock:
+            self.jobs[job['job_id']] = job
+            # Forget the oldest jobs beyond keep (dicts keep insertion order)
+            for job_id in list(self.jobs)[:-self.keep]:
+                del self.jobs[job_id]
+        self.write(job)
+        self.prune()
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        """Change fields of a job and return a copy of it"""
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            job['finished'] = job['status'] in FINISHED_STATES
+            job = dict(job)
+        self.write(job)
+        return job
+
+    def get(self, job_id):
+        """A job by id from this worker, or from the shared directory; None if unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        if not self.directory or not all(ch in '0123456789abcdef' for ch in job_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{job_id}.json")) as job_file:
+                return json.load(job_file)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, job):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.job-')
+            with os.fdopen(fd, 'w') as job_file:
+                json.dump(job, job_file)
+            os.replace(temp_path, os.path.join(self.directory, f"{job['job_id']}.json"))
+        except OSError as e:
+            logger.error(f"Could not record refresh job {job['job_id']}: {str(e)}")
+
+    def prune(self):
+        """Delete the shared records of all but the newest keep jobs"""
+        if not self.directory:
+            return
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:-self.keep]:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+class KnowledgeRefresher:
+    """Runs refresh(trigger, requested_at, job_id) for queued jobs and on a jittered schedule, one at a time
+
+    leads, when given, is asked before each scheduled run; a refresher that
+    does not lead skips it (another worker runs the schedule).
+    """
+
+    def __init__(self, refresh, jobs, interval=0, jitter=0.0, leads=None):
+        self.refresh = refresh
+        self.jobs = jobs
+        self.leads = leads
+        self.interval = interval
+        self.jitter = jitter
+        self.queued = []
+        self.current = None
+        self.last_job_id = None
+        self.next_run = None
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='knowledge-refresher', daemon=True)
+        self.thread.start()
+        return self
+
+    def request(self, trigger='api'):
+        """Queue a refresh, or join the one already waiting to start; returns the job"""
+        with self.condition:
+            if self.queued:
+                return self.jobs.get(self.queued[0])
+            job = self.jobs.create(trigger)
+            self.queued.append(job['job_id'])
+            self.condition.notify()
+        return job
+
+    def next_delay(self):
+        """Seconds until the next scheduled refresh: interval, spread by +/- jitter"""
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def run(self):
+        if self.interval > 0:
+            self.next_run = time.time() + self.next_delay()
+        while True:
+            with self.condition:
+                while not self.queued and (self.next_run is None or time.time() < self.next_run):
+                    self.condition.wait(None if self.next_run is None else max(0.0, self.next_run - time.time()))
+                if self.queued:
+                    job_id = self.queued.pop(0)
+                elif self.leads is not None and not self.leads():
+                    self.next_run = time.time() + self.next_delay()
+                    continue
+                else:
+                    job_id = self.jobs.create('schedule')['job_id']
+                if self.interval > 0:
+                    self.next_run = time.time() + self.next_delay()
+                self.current = job_id
+            self.run_job(job_id)
+
+    def run_job(self, job_id):
+        job = self.jobs.update(job_id, status='running', started_at=datetime.now().isoformat())
+        try:
+            result = self.refresh(job['trigger'], datetime.fromisoformat(job['requested_at']).timestamp(), job_id)
+            status = result.get('status')
+            if status == 'failed':
+                status, error, covered_by = 'failed', result.get('error'), None
+            elif status == 'coalesced':
+                status, error, covered_by = 'coalesced', None, result['covered_by'].get('job_id')
+            else:
+                status, error, covered_by = 'succeeded', None, None
+        except Exception as e:
+            logger.error(f"Knowledge refresh job {job_id} failed: {str(e)}")
+            result, status, error, covered_by = None, 'failed', str(e), None
+        self.jobs.update(job_id, status=status, result=result, error=error, covered_by=covered_by,
+                         finished_at=datetime.now().isoformat())
+        with self.condition:
+            self.current = None
+            self.last_job_id = job_id
+
+    def stats(self):
+        with self.condition:
+            return {
+                'interval_seconds': self.interval,
+                'jitter': self.jitter,
+                'running_job': self.current,
+                'queued_jobs': list(self.queued),
+                'last_job': self.jobs.get(self.last_job_id) if self.last_job_id else None,
+                'next_scheduled_run': datetime.fromtimestamp(self.next_run).isoformat() if self.next_run else None
+            }
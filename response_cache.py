@@ -0,0 +1,166 @@
+"""
+Response Cache for Nestlé Canada AI Chatbot
+LRU/TTL cache of chatbot answers keyed on the normalized question
+
+Questions are normalized (case, accents, punctuation and spacing ignored,
+every word kept), optionally matched to near-duplicates with the same
+negations and question words, and cleared when a new generation is published.
+
+File: response_cache.py
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from search_index import TOKEN_PATTERN, fold_text
+
+CONTRACTED_NOT = re.compile(r"n['\u2019]t\b")
+
+# Words that change what a question asks; near-duplicates must agree on them
+GUARD_WORDS = frozenset("""
+not no never nor without cannot what why how when where which who whom whose
+""".split())
+
+
+def normalize_query(query):
+    """Canonical form of a question used as the cache key: folded words, punctuation and spacing dropped"""
+    return ' '.join(TOKEN_PATTERN.findall(CONTRACTED_NOT.sub(' not', fold_text(query))))
+
+
+def guard_words(normalized):
+    """Negations and question words of a normalized question"""
+    return frozenset(word for word in normalized.split() if word in GUARD_WORDS)
+
+
+def shingles(normalized):
+    """Word unigrams and bigrams of a normalized question"""
+    words = normalized.split()
+    return frozenset(words) | frozenset(zip(words, words[1:]))
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL and optional near-duplicate lookup"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, similarity_threshold=0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.shingle_index = {}
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, query, generation, scope=''):
+        """Return a cached response for the query, or None on a miss"""
+        normalized = normalize_query(query)
+        now = time.monotonic()
+
+        with self.lock:
+            self.check_generation(generation)
+
+            key = (scope, normalized)
+            entry = self.entries.get(key)
+            if entry is not None and self.is_expired(key, entry, now):
+                entry = None
+
+            if entry is None and self.similarity_threshold > 0:
+                key = self.find_near_duplicate(scope, normalized, now)
+                entry = self.entries.get(key) if key else None
+                if entry is not None:
+                    self.near_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query, generation, response, scope=''):
+        """Cache a response for the query"""
+        normalized = normalize_query(query)
+        key = (scope, normalized)
+
+        with self.lock:
+            self.check_generation(generation)
+
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (response, time.monotonic() + self.ttl_seconds, shingles(normalized))
+            for shingle in self.entries[key][2]:
+                self.shingle_index.setdefault(shingle, set()).add(key)
+
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def check_generation(self, generation):
+        """Drop everything cached for an older knowledge base generation"""
+        if generation != self.generation:
+            self.entries.clear()
+            self.shingle_index.clear()
+            self.generation = generation
+
+    def is_expired(self, key, entry, now):
+        if entry[1] > now:
+            return False
+        self.remove(key)
+        self.expirations += 1
+        return True
+
+    def remove(self, key):
+        response, expires_at, key_shingles = self.entries.pop(key)
+        for shingle in key_shingles:
+            keys = self.shingle_index.get(shingle)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.shingle_index[shingle]
+
+    def find_near_duplicate(self, scope, normalized, now):
+        """Return the cached key whose shingles best overlap the query's, if similar enough"""
+        query_shingles = shingles(normalized)
+        query_guards = guard_words(normalized)
+        overlaps = {}
+        for shingle in query_shingles:
+            for key in self.shingle_index.get(shingle, ()):
+                if key[0] == scope:
+                    overlaps[key] = overlaps.get(key, 0) + 1
+
+        # "Is KitKat gluten free" must not answer "Is KitKat not gluten free"
+        overlaps = {key: overlap for key, overlap in overlaps.items() if guard_words(key[1]) == query_guards}
+
+        best_key = None
+        best_similarity = self.similarity_threshold
+        for key, overlap in overlaps.items():
+            key_shingles = self.entries[key][2]
+            similarity = overlap / (len(query_shingles) + len(key_shingles) - overlap)
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+
+        if best_key is not None and self.is_expired(best_key, self.entries[best_key], now):
+            return None
+        return best_key
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'near_duplicate_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'generation': self.generation
+            }
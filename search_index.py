@@ -0,0 +1,178 @@
+"""
+Search Index for Nestlé Canada AI Chatbot
+Inverted index with BM25 ranking over scraped website content
+
+The index is built once when the knowledge base is refreshed. Queries only
+touch the posting lists of their own terms instead of rescanning every page.
+A refresh patches a fork() of the serving index, which shares posting lists
+until they change.
+
+File: search_index.py
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+WORD_PATTERN = re.compile(r"\S+")
+
+# Common English words that carry no ranking signal
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself
+yourselves please tell know find get want like
+""".split())
+
+
+def fold_text(text):
+    """Lowercase text and strip accents so 'Nescafé' matches 'nescafe'"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Split text into normalized terms, dropping stopwords"""
+    return [
+        token for token in TOKEN_PATTERN.findall(fold_text(text))
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def split_passages(text, words_per_passage=120, overlap=30):
+    """Split text into overlapping word windows with character offsets"""
+    spans = [match.span() for match in WORD_PATTERN.finditer(text)]
+    if not spans:
+        return []
+
+    step = max(1, words_per_passage - overlap)
+    passages = []
+    for first in range(0, len(spans), step):
+        last = min(first + words_per_passage, len(spans)) - 1
+        start, end = spans[first][0], spans[last][1]
+        passages.append({'start': start, 'end': end, 'text': text[start:end]})
+        if last == len(spans) - 1:
+            break
+    return passages
+
+
+class InvertedIndex:
+    """Term -> {doc_id: term frequency} postings with Okapi BM25 scoring"""
+
+    # Terms whose posting lists are still shared with the index this one was forked from
+    shared_terms = frozenset()
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+        self.shared_terms = set()
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        """Build an index from an iterable of (doc_id, text) pairs"""
+        index = cls(**kwargs)
+        for doc_id, text in documents:
+            index.add_document(doc_id, text)
+        return index
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def fork(self):
+        """Copy to patch while this index keeps serving; posting lists are copied on first write"""
+        clone = InvertedIndex(self.k1, self.b)
+        clone.postings = dict(self.postings)
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.doc_terms = dict(self.doc_terms)
+        clone.total_length = self.total_length
+        clone.shared_terms = set(self.postings)
+        return clone
+
+    def owned_postings(self, term):
+        """Posting list of a term that this index may modify"""
+        postings = self.postings[term]
+        if term in self.shared_terms:
+            postings = self.postings[term] = dict(postings)
+            self.shared_terms.discard(term)
+        return postings
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add_document(self, doc_id, text):
+        """Index a document, replacing any previous version with the same id"""
+        if doc_id in self.doc_lengths:
+            self.remove_document(doc_id)
+
+        tokens = tokenize(text)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        for term, tf in frequencies.items():
+            if term in self.postings:
+                postings = self.owned_postings(term)
+            else:
+                postings = self.postings[term] = {}
+            postings[doc_id] = tf
+
+        self.doc_lengths[doc_id] = len(tokens)
+        self.doc_terms[doc_id] = tuple(frequencies)
+        self.total_length += len(tokens)
+
+    def remove_document(self, doc_id):
+        """Drop a document and its postings from the index"""
+        if doc_id not in self.doc_lengths:
+            return
+
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.owned_postings(term)
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query, limit=3):
+        """Return the top (doc_id, score) pairs for a free-text query"""
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+
+        avg_length = self.total_length / doc_count or 1.0
+        k1 = self.k1
+        b = self.b
+        doc_lengths = self.doc_lengths
+        scores = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
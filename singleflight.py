@@ -0,0 +1,315 @@
+"""
+Single-Flight LLM Calls for Nestlé Canada AI Chatbot
+Identical concurrent completions share one upstream call
+
+During promotions many users ask the same question within the same second.
+The response cache only helps once an answer exists; until then every one
+of those requests made its own OpenAI call. Requests whose prompts are
+identical (after lowercasing and collapsing whitespace) now join the call
+already in flight for that prompt and receive its result.
+
+- SingleFlight coalesces across the threads of a worker (threaded Flask or
+  gunicorn gthread workers); AsyncSingleFlight does the same for the tasks
+  of an asyncio worker (asgi.py)
+- streams are shared chunk by chunk: the upstream stream is read by a
+  thread (or task) of its own, and every subscriber, the one that opened it
+  included, replays the chunks received so far and then follows live
+- a plain (non-streamed) call with the same key as a stream in flight waits
+  for that stream and is given its chunks, so /chat and /chat/stream share one
+  call; a stream that finds a plain call in flight opens its own, since it has
+  to forward tokens as they arrive
+- the shared call runs to completion even if the request that started it
+  goes away, so the requests that joined it still get their answer; an error
+  is raised to every caller of the flight, and a call interrupted by a
+  BaseException (KeyboardInterrupt, GeneratorExit, a gevent Timeout) still
+  ends its flight, with FlightAborted for the callers that joined it
+- a flight ends when its call does; later requests start a new call (or hit
+  the response cache)
+
+File: singleflight.py
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+
+
+class FlightAborted(Exception):
+    """Raised to the callers of a flight whose call was interrupted by a BaseException"""
+
+
+def caller_error(error):
+    """The error to raise to the callers joined to a flight"""
+    if isinstance(error, Exception):
+        return error
+    return FlightAborted(f"Shared call interrupted by {type(error).__name__}")
+
+
+def prompt_key(messages, params):
+    """Key of an LLM call: its parameters and messages, case and whitespace ignored"""
+    normalized = [(message['role'], ' '.join(str(message['content']).lower().split())) for message in messages]
+    payload = json.dumps([sorted(params.items()), normalized], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Flight:
+    """One in-flight call: its result or error and, for streams, the chunks received so far"""
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+        self.condition = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def publish(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.condition:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def replay(self):
+        """Chunks received so far, then each new one until the call finishes"""
+        position = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.done or len(self.chunks) > position)
+                chunks = self.chunks[position:]
+                done = self.done
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class FlightStream:
+    """Iterator over the chunks of a shared streamed call; shared is False for the caller that made it"""
+
+    def __init__(self, chunks, shared):
+        self.chunks = chunks
+        self.shared = shared
+
+    def __iter__(self):
+        return self.chunks
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls across the threads of one process"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def join(self, key, streaming=False, follow_streams=False):
+        """(flight, leader): the flight in progress for key, or a new one this caller must run
+
+        The flight is None, for a call of its own, when coalescing is off or
+        the call in flight cannot be shared: a stream only joins streams, and
+        a plain call joins a stream only with follow_streams.
+        """
+        with self.lock:
+            flight = self.flights.get(key) if self.enabled else None
+            if flight is not None and (flight.streaming == streaming or (flight.streaming and follow_streams)):
+                self.coalesced += 1
+                return flight, False
+            self.calls += 1
+            if flight is not None or not self.enabled:
+                return None, True
+            flight = self.flights[key] = Flight(streaming)
+            return flight, True
+
+    def land(self, key, flight):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def do(self, key, call, from_stream=None):
+        """call() once for all concurrent callers with this key; returns (result, shared)
+
+        from_stream(chunks), when given, lets this call follow a stream in
+        flight for the same key and turns its chunks into the result.
+        """
+        flight, leader = self.join(key, follow_streams=from_stream is not None)
+        if flight is None:
+            return call(), False
+        if not leader:
+            result = flight.wait()
+            return (from_stream(flight.chunks) if flight.streaming else result), True
+        result = error = None
+        try:
+            result = call()
+            return result, False
+        except BaseException as e:
+            error = caller_error(e)
+            raise
+        finally:
+            self.land(key, flight)
+            flight.finish(result, error)
+
+    def stream(self, key, open_stream):
+        """FlightStream over the chunks of open_stream(), opened once for all concurrent callers"""
+        flight, leader = self.join(key, streaming=True)
+        if flight is None:
+            return FlightStream(iter(open_stream()), False)
+        if leader:
+            try:
+                upstream = open_stream()
+                threading.Thread(target=self.pump, args=(key, flight, upstream), daemon=True).start()
+            except BaseException as e:
+                self.land(key, flight)
+                flight.finish(error=caller_error(e))
+                raise
+        return FlightStream(flight.replay(), not leader)
+
+    def pump(self, key, flight, upstream):
+        """Read an upstream stream into its flight until it ends"""
+        error = None
+        try:
+            for chunk in upstream:
+                flight.publish(chunk)
+        except Exception as e:
+            error = e
+        except BaseException as e:
+            error = caller_error(e)
+            raise
+        finally:
+            self.land(key, flight)
+            flight.finish(error=error)
+
+    def stats(self):
+        with self.lock:
+            in_flight = len(self.flights)
+        return {'enabled': self.enabled, 'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': in_flight}
+
+
+class AsyncSingleFlight:
+    """Coalesces identical concurrent calls across the tasks of one event loop
+
+    Each call runs in its own task, so a caller that times out or disconnects
+    does not cancel it for the others.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, call, from_stream=None):
+        """await call() once for all concurrent callers with this key; returns (result, shared)
+
+        from_stream(chunks), when given, lets this call follow a stream in
+        flight for the same key and turns its chunks into the result.
+        """
+        task = self.flights.get(key) if self.enabled else None
+        if isinstance(task, AsyncFlight):
+            if from_stream is None:
+                self.calls += 1
+                return await call(), False
+            self.coalesced += 1
+            await task.wait()
+            return from_stream(task.chunks), True
+        if not self.enabled:
+            self.calls += 1
+            return await call(), False
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = self.flights[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self.land(key, done))
+        return await asyncio.shield(task), shared
+
+    def land(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if isinstance(flight, asyncio.Future) and not flight.cancelled():
+            flight.exception()  # retrieved here so a failed call nobody awaited is not logged as lost
+
+    async def stream(self, key, open_stream):
+        """(async chunk iterator, shared) over the stream from await open_stream(), opened once per key"""
+        flight = self.flights.get(key) if self.enabled else None
+        if not self.enabled or (flight is not None and not isinstance(flight, AsyncFlight)):
+            self.calls += 1
+            return await open_stream(), False
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            flight = self.flights[key] = AsyncFlight()
+            flight.task = asyncio.ensure_future(flight.pump(open_stream))
+            flight.task.add_done_callback(lambda done: self.land(key, flight))
+        return flight.replay(), shared
+
+    def stats(self):
+        return {'enabled': self.enabled, 'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self.flights)}
+
+
+class AsyncFlight:
+    """Chunks of a shared stream, read from upstream by a task of its own"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.task = None
+
+    async def pump(self, open_stream):
+        try:
+            async for chunk in await open_stream():
+                self.chunks.append(chunk)
+                self.notify()
+        except Exception as e:
+            self.error = e
+        except BaseException as e:
+            self.error = caller_error(e)
+            raise
+        finally:
+            self.done = True
+            self.notify()
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def wait(self):
+        """Wait for the stream to end; raises its error"""
+        async for _ in self.replay():
+            pass
+
+    async def replay(self):
+        position = 0
+        while True:
+            changed = self.changed
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
@@ -0,0 +1,196 @@
+"""
+Knowledge Base Snapshots for Nestlé Canada AI Chatbot
+Versioned on-disk snapshot of the scraped corpus, product counts and search index
+
+Workers load the last snapshot at startup instead of crawling the live site,
+then refresh in the background. Snapshots are written to a temporary file and
+atomically renamed into place, and read back through a memory map so the
+payload is unpickled straight from the page cache. Only that read is shared:
+each worker still unpickles its own copy of the knowledge base onto its heap
+(the passage vectors, saved separately as .npy files, are memory-mapped).
+
+Gunicorn workers share one snapshot file: SnapshotLock serializes writers
+across processes (one crawl per refresh, not one per worker), RefreshLeader
+elects the one worker that runs scheduled refreshes, and readers pick up
+newly published generations by checking the header.
+
+File layout: 32-byte header (magic, format version, flags, generation,
+created timestamp, payload length) followed by a pickled payload, optionally
+zlib-compressed.
+
+File: snapshot.py
+"""
+
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; each process then refreshes for itself
+    fcntl = None
+
+SNAPSHOT_MAGIC = b'NKBS'
+SNAPSHOT_VERSION = 1
+HEADER_FORMAT = '<4sHHQdQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FLAG_COMPRESSED = 0x1
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or from another format version"""
+
+
+def write_snapshot(path, state, generation, compress=False):
+    """Atomically write state to path and return the number of bytes written"""
+    payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, 1)
+        flags |= FLAG_COMPRESSED
+
+    header = struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags,
+                         generation, time.time(), len(payload))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(header)
+            temp_file.write(payload)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    return HEADER_SIZE + len(payload)
+
+
+def read_snapshot_header(path):
+    """Return (generation, created timestamp) without loading the payload"""
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(HEADER_SIZE)
+    magic, version, flags, generation, created, length = parse_header(header)
+    return generation, created
+
+
+def parse_header(header):
+    """Unpack and validate a snapshot header"""
+    if len(header) < HEADER_SIZE:
+        raise SnapshotError("Snapshot header is truncated")
+
+    magic, version, flags, generation, created, length = struct.unpack(HEADER_FORMAT, header[:HEADER_SIZE])
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a knowledge base snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version} (expected {SNAPSHOT_VERSION})")
+    return magic, version, flags, generation, created, length
+
+
+def read_snapshot(path):
+    """Load a snapshot, returning (generation, created timestamp, state)"""
+    try:
+        with open(path, 'rb') as snapshot_file:
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, version, flags, generation, created, length = parse_header(mapped[:HEADER_SIZE])
+                if len(mapped) < HEADER_SIZE + length:
+                    raise SnapshotError("Snapshot payload is truncated")
+
+                with memoryview(mapped)[HEADER_SIZE:HEADER_SIZE + length] as payload:
+                    if flags & FLAG_COMPRESSED:
+                        state = pickle.loads(zlib.decompress(payload))
+                    else:
+                        state = pickle.loads(payload)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, zlib.error) as e:
+        raise SnapshotError(f"Could not read snapshot {path}: {str(e)}") from e
+
+    return generation, created, state
+
+
+class SnapshotLock:
+    """Cross-process writer lock for a snapshot, plus a record of the last refresh
+
+    Holding the lock means this process is the only one crawling and writing
+    the snapshot. The lock file also stores when the last refresh started and
+    finished, so a worker that waited on the lock can tell that a crawl which
+    began after its request has already been done by another worker (one that
+    began earlier may have missed the change that prompted the request).
+    """
+
+    def __init__(self, snapshot_path):
+        self.path = f"{snapshot_path}.lock"
+        self.handle = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.handle = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+        self.handle = None
+
+    def last_refresh(self):
+        """Record of the last completed refresh by any process: started_at, refreshed_at, generation, pid, job_id ({} if none)"""
+        self.handle.seek(0)
+        try:
+            return json.loads(self.handle.read() or '{}')
+        except ValueError:
+            return {}
+
+    def mark_refreshed(self, generation, started_at, job_id=None):
+        """Record that a refresh (job_id's, if it ran as a job) which started at started_at finished, publishing generation"""
+        self.handle.seek(0)
+        self.handle.truncate()
+        self.handle.write(json.dumps({
+            'started_at': started_at,
+            'refreshed_at': time.time(),
+            'generation': generation,
+            'pid': os.getpid(),
+            'job_id': job_id
+        }))
+        self.handle.flush()
+
+
+class RefreshLeader:
+    """Process-lifetime lock held by the one worker that runs scheduled refreshes of a snapshot
+
+    acquire() never blocks: the first worker to call it leads until it exits,
+    and the others keep asking, so one of them takes over from a leader that
+    died. Without flock (Windows) every process leads.
+    """
+
+    def __init__(self, snapshot_path):
+        self.path = f"{snapshot_path}.leader"
+        self.handle = None
+
+    @property
+    def held(self):
+        return self.handle is not None or fcntl is None
+
+    def acquire(self):
+        """Whether this process leads, taking the lock if it is free"""
+        if self.held:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
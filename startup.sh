@@ -9,6 +9,12 @@ pip install -r requirements.txt
 # Run database migrations or setup (if needed)
 # python setup_db.py
 
-# Start the application
-echo "Starting Flask application with Gunicorn..."
-gunicorn --bind 0.0.0.0:$PORT --workers 2 --timeout 120 app:app
\ No newline at end of file
+# Start the application (SERVING_MODE=async serves chats on uvicorn workers)
+if [ "$SERVING_MODE" = "async" ]; then
+    echo "Starting async application with Gunicorn + Uvicorn workers..."
+    gunicorn --bind 0.0.0.0:$PORT --workers 2 --timeout 120 -k uvicorn_worker.UvicornWorker asgi:application
+else
+    # Threaded workers, so identical chats in one worker can share an OpenAI call
+    echo "Starting Flask application with Gunicorn..."
+    gunicorn --bind 0.0.0.0:$PORT --workers 2 --worker-class gthread --threads ${GUNICORN_THREADS:-8} --timeout 120 app:app
+fi
\ No newline at end of file
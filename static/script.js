@@ -114,8 +114,8 @@ class EnhancedNestleChatbot {
                 
                 this.hideLoading();
                 
-                // Handle location-based responses
-                if (data.query_type === 'location' && this.locationUI) {
+                // Without a location the server can't rank stores; let the location UI ask for one
+                if (data.query_type === 'location' && this.locationUI && !requestData.location) {
                     const locationResponse = await this.locationUI.handleLocationQuery(message, productType);
                     if (locationResponse) {
                         this.addMessage(locationResponse, 'bot');
@@ -253,37 +253,52 @@ class EnhancedNestleChatbot {
                 requestData.location = this.locationService.getUserLocation();
             }
 
-            const response = await fetch('/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(requestData)
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+            // Stream the answer as it is generated; fall back to the JSON endpoint
+            let data = null;
+            if (this.supportsStreaming()) {
+                try {
+                    data = await this.streamChat(requestData);
+                } catch (error) {
+                    console.warn('Streaming unavailable, falling back to /chat:', error);
+                }
             }
 
-            const data = await response.json();
+            if (!data) {
+                const response = await fetch('/chat', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify(requestData)
+                });
+
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+
+                data = await response.json();
+            }
             
             this.hideLoading();
             
             // Handle different response types
-            if (data.query_type === 'location' && this.locationUI) {
+            let botMessage = data.response || "I'm sorry, I didn't receive a proper response. Please try again.";
+            if (data.query_type === 'location' && this.locationUI && !requestData.location) {
                 const productName = this.locationUI.extractProductFromQuery(message);
                 const locationResponse = await this.locationUI.handleLocationQuery(message, productName);
                 if (locationResponse) {
-                    this.addMessage(locationResponse, 'bot');
-                } else {
-                    this.addMessage(data.response || "I'm sorry, I didn't receive a proper response. Please try again.", 'bot');
+                    botMessage = locationResponse;
                 }
+            }
+
+            if (data.element) {
+                this.updateMessage(data.element, botMessage);
             } else {
-                this.addMessage(data.response || "I'm sorry, I didn't receive a proper response. Please try again.", 'bot');
+                this.addMessage(botMessage, 'bot');
             }
             
             this.saveChatHistory();
-            this.trackEvent('message_sent', { message_length: message.length, query_type: data.query_type });
+            this.trackEvent('message_sent', { message_length: message.length, query_type: data.query_type, streamed: Boolean(data.streamed) });
 
         } catch (error) {
             console.error('Error sending message:', error);
@@ -295,6 +310,94 @@ class EnhancedNestleChatbot {
         }
     }
 
+    supportsStreaming() {
+        return typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+    }
+
+    /**
+     * Send a message to /chat/stream and render answer deltas as they arrive.
+     * Resolves to { query_type, response, element, streamed } once the stream ends.
+     */
+    async streamChat(requestData) {
+        const response = await fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify(requestData)
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const result = {
+            query_type: null, response: '', element: null, streamed: true,
+            hasLocation: Boolean(requestData.location)
+        };
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        try {
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    this.handleStreamEvent(buffer.slice(0, boundary), result);
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
+        } catch (error) {
+            // Drop the partial answer so the JSON fallback doesn't duplicate it
+            if (result.element) {
+                result.element.closest('.message').remove();
+            }
+            throw error;
+        }
+
+        return result;
+    }
+
+    handleStreamEvent(rawEvent, result) {
+        let eventType = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                eventType = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        const payload = data ? JSON.parse(data) : {};
+
+        switch (eventType) {
+            case 'meta':
+                result.query_type = payload.query_type;
+                // Without a location, the answer is replaced by the location prompt, so don't render it early
+                result.deferRender = payload.query_type === 'location' && Boolean(this.locationUI) && !result.hasLocation;
+                break;
+            case 'delta':
+                result.response += payload.content;
+                if (!result.deferRender) {
+                    if (!result.element) {
+                        this.hideLoading();
+                        result.element = this.addMessage('', 'bot');
+                    }
+                    this.updateMessage(result.element, result.response);
+                }
+                break;
+            case 'done':
+            case 'error':
+                result.response = payload.response || result.response;
+                break;
+        }
+    }
+
     addMessage(content, sender) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${sender}-message`;
@@ -325,6 +428,12 @@ class EnhancedNestleChatbot {
 
         this.chatMessages.appendChild(messageDiv);
         this.scrollToBottom();
+        return contentDiv.querySelector('p');
+    }
+
+    updateMessage(element, content) {
+        element.innerHTML = this.processMessageContent(content);
+        this.scrollToBottom();
     }
 
     processMessageContent(content) {
@@ -439,11 +548,26 @@ class EnhancedNestleChatbot {
         }
     }
 
-    async refreshKnowledge() {
+    async refreshKnowledge(timeoutMs = 120000, pollMs = 2000) {
         try {
+            // The server queues the refresh and returns a job to poll until it finishes
             const response = await fetch('/refresh-knowledge', { method: 'POST' });
-            const data = await response.json();
-            return data;
+            let job = await response.json();
+            const statusUrl = job.status_url;
+            if (!statusUrl) {
+                return job;
+            }
+
+            const deadline = Date.now() + timeoutMs;
+            while (Date.now() < deadline) {
+                await new Promise(resolve => setTimeout(resolve, pollMs));
+                job = await (await fetch(statusUrl)).json();
+                // finished covers every terminal status (succeeded, coalesced, failed)
+                if (job.finished || job.error) {
+                    return job;
+                }
+            }
+            return job;
         } catch (error) {
             console.error('Error refreshing knowledge:', error);
             return { error: 'Failed to refresh knowledge' };
@@ -0,0 +1,409 @@
+"""
+Store Locator for Nestlé Canada AI Chatbot
+Server-side store catalogue with a k-d tree spatial index
+
+Stores are loaded from a CSV or JSON catalogue (STORE_CATALOGUE_PATH) or fall
+back to the demo stores the frontend used to ship in location-service.js.
+Coordinates are projected onto the unit sphere and indexed with a static
+k-d tree, so nearest-neighbour and radius searches only visit the handful of
+leaves around the user instead of computing a haversine distance to every
+store. Chord length on the unit sphere is monotonic in great-circle distance,
+so the tree's Euclidean pruning is exact.
+
+Each product gets its own tree over the stores that carry it, so
+"nearest stores with KitKat" costs the same as an unfiltered search.
+
+Batch work (nearest store for each of thousands of origins) goes through
+CoordinateTable instead: coordinates held as contiguous NumPy arrays, a block
+of origins scored against every store at once, and top-k picked with
+argpartition, with no per-store Python objects.
+
+File: store_locator.py
+"""
+
+import csv
+import heapq
+import json
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Largest origins x stores block scored at once (a float64 block of ~32 MB)
+BATCH_BLOCK_ELEMENTS = 4_000_000
+
+# Above this many stores, one k-d tree query per origin beats scoring every store
+VECTORIZED_MAX_STORES = 8000
+
+# Demo stores (Mississauga, ON), previously hard-coded in static/location-service.js
+DEFAULT_STORES = [
+    {
+        "id": 1,
+        "name": "Loblaws",
+        "address": "2885 Argentia Rd, Mississauga, ON L5N 8G6",
+        "phone": "(905) 826-0384",
+        "latitude": 43.5890,
+        "longitude": -79.6441,
+        "hours": "7:00 AM - 11:00 PM",
+        "products": ["KitKat", "Smarties", "Quality Street", "Coffee Crisp", "Aero"]
+    },
+    {
+        "id": 2,
+        "name": "Metro",
+        "address": "3045 Mavis Rd, Mississauga, ON L5B 4M6",
+        "phone": "(905) 270-3500",
+        "latitude": 43.5845,
+        "longitude": -79.6503,
+        "hours": "8:00 AM - 10:00 PM",
+        "products": ["KitKat", "Smarties", "Coffee Crisp", "Butterfinger"]
+    },
+    {
+        "id": 3,
+        "name": "Walmart Supercentre",
+        "address": "6040 Glen Erin Dr, Mississauga, ON L5N 3K4",
+        "phone": "(905) 824-1421",
+        "latitude": 43.5798,
+        "longitude": -79.6198,
+        "hours": "7:00 AM - 11:00 PM",
+        "products": ["KitKat", "Smarties", "Quality Street", "Coffee Crisp", "Aero", "Butterfinger"]
+    },
+    {
+        "id": 4,
+        "name": "Sobeys",
+        "address": "900 Rathburn Rd W, Mississauga, ON L5C 4L2",
+        "phone": "(905) 275-8500",
+        "latitude": 43.5965,
+        "longitude": -79.6321,
+        "hours": "8:00 AM - 10:00 PM",
+        "products": ["KitKat", "Quality Street", "Coffee Crisp", "Aero"]
+    },
+    {
+        "id": 5,
+        "name": "No Frills",
+        "address": "2550 Hurontario St, Mississauga, ON L5B 1N5",
+        "phone": "(905) 276-8111",
+        "latitude": 43.5721,
+        "longitude": -79.6441,
+        "hours": "8:00 AM - 9:00 PM",
+        "products": ["KitKat", "Smarties", "Coffee Crisp"]
+    },
+    {
+        "id": 6,
+        "name": "FreshCo",
+        "address": "3221 Derry Rd W, Mississauga, ON L5N 7L7",
+        "phone": "(905) 826-2200",
+        "latitude": 43.5834,
+        "longitude": -79.6578,
+        "hours": "8:00 AM - 10:00 PM",
+        "products": ["KitKat", "Smarties", "Quality Street", "Aero"]
+    }
+]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = (math.sin(d_lat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def to_unit_vector(latitude, longitude):
+    """Project a latitude/longitude onto the unit sphere"""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+
+def km_to_chord_squared(distance_km):
+    """Squared unit-sphere chord length for a great-circle distance"""
+    angle = min(math.pi, max(0.0, distance_km / EARTH_RADIUS_KM))
+    return (2 * math.sin(angle / 2)) ** 2
+
+
+def chord_squared_to_km(chord_squared):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+def normalize_product(name):
+    return ' '.join(str(name).lower().split())
+
+
+def load_stores(path):
+    """Load a store catalogue from a .json or .csv file
+
+    JSON: a list of store objects (or {"stores": [...]}) with the fields of
+    DEFAULT_STORES. CSV: a header row with the same column names; products are
+    separated by ';' or '|'.
+    """
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as catalogue_file:
+            data = json.load(catalogue_file)
+        rows = data.get('stores', []) if isinstance(data, dict) else data
+    else:
+        with open(path, newline='', encoding='utf-8') as catalogue_file:
+            rows = list(csv.DictReader(catalogue_file))
+
+    stores = []
+    for index, row in enumerate(rows):
+        products = row.get('products') or []
+        if isinstance(products, str):
+            products = [product.strip() for product in products.replace('|', ';').split(';') if product.strip()]
+        stores.append({
+            'id': row.get('id') or index + 1,
+            'name': row.get('name', ''),
+            'address': row.get('address', ''),
+            'phone': row.get('phone', ''),
+            'latitude': float(row['latitude']),
+            'longitude': float(row['longitude']),
+            'hours': row.get('hours', ''),
+            'products': products
+        })
+    return stores
+
+
+class KDTree:
+    """Static 3-d tree with leaf buckets over a shared list of points"""
+
+    def __init__(self, points, indices, leaf_size=16):
+        self.points = points
+        self.leaf_size = leaf_size
+        self.size = len(indices)
+        self.root = self.build(list(indices), 0)
+
+    def build(self, indices, depth):
+        if len(indices) <= self.leaf_size:
+            return (-1, indices)
+        points = self.points
+        axis = depth % 3
+        indices.sort(key=lambda index: points[index][axis])
+        middle = len(indices) // 2
+        return (axis, points[indices[middle]][axis],
+                self.build(indices[:middle], depth + 1),
+                self.build(indices[middle:], depth + 1))
+
+    def search(self, target, k=None, max_chord_squared=4.0):
+        """Return [(chord_squared, index)] nearest first: the k nearest, or all within range when k is None"""
+        points = self.points
+        tx, ty, tz = target
+        found = []  # max-heap on distance when k is set, plain list otherwise
+        limit = max_chord_squared
+        stack = [(self.root, 0.0)]
+
+        while stack:
+            node, bound = stack.pop()
+            if bound > limit:
+                continue
+            if node[0] < 0:
+                for index in node[1]:
+                    x, y, z = points[index]
+                    distance = (x - tx) ** 2 + (y - ty) ** 2 + (z - tz) ** 2
+                    if distance > limit:
+                        continue
+                    if k is None:
+                        found.append((distance, index))
+                    elif len(found) < k:
+                        heapq.heappush(found, (-distance, index))
+                        if len(found) == k:
+                            limit = min(limit, -found[0][0])
+                    else:
+                        heapq.heapreplace(found, (-distance, index))
+                        limit = -found[0][0]
+                continue
+
+            axis, split, left, right = node
+            difference = target[axis] - split
+            near, far = (left, right) if difference < 0 else (right, left)
+            stack.append((far, max(bound, difference * difference)))
+            stack.append((near, bound))
+
+        if k is not None:
+            found = [(-distance, index) for distance, index in found]
+        found.sort()
+        return found
+
+
+class CoordinateTable:
+    """Contiguous latitude/longitude arrays with vectorized nearest-store ranking
+
+    Ranking uses the dot product of unit vectors (one BLAS matrix multiply per
+    block of origins), which orders stores exactly like great-circle distance;
+    the haversine distance is then computed only for the top-k winners.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = np.ascontiguousarray(np.radians(np.asarray(latitudes, dtype=np.float64)))
+        self.longitudes = np.ascontiguousarray(np.radians(np.asarray(longitudes, dtype=np.float64)))
+        self.vectors = unit_vectors(self.latitudes, self.longitudes)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def distances(self, latitude, longitude, rows=None):
+        """Haversine distance in km from one origin to every store (or to the given rows)"""
+        latitudes = self.latitudes if rows is None else self.latitudes[rows]
+        longitudes = self.longitudes if rows is None else self.longitudes[rows]
+        return haversine_km_array(math.radians(latitude), math.radians(longitude), latitudes, longitudes)
+
+    def nearest(self, latitudes, longitudes, k=1, max_distance_km=None):
+        """Top-k stores for each origin: (indices, distances_km), each shaped (origins, k)
+
+        Nearest first; where fewer than k stores qualify the row is padded with
+        index -1 and distance inf.
+        """
+        latitudes = np.radians(np.atleast_1d(np.asarray(latitudes, dtype=np.float64)))
+        longitudes = np.radians(np.atleast_1d(np.asarray(longitudes, dtype=np.float64)))
+        origins = len(latitudes)
+        store_count = len(self)
+        indices = np.full((origins, k), -1, dtype=np.int64)
+        distances = np.full((origins, k), np.inf)
+        if not store_count or k <= 0:
+            return indices, distances
+
+        width = min(k, store_count)
+        origin_vectors = unit_vectors(latitudes, longitudes)
+        block = max(1, BATCH_BLOCK_ELEMENTS // store_count)
+        for start in range(0, origins, block):
+            stop = min(origins, start + block)
+            # Larger dot product = closer; take the width largest per row
+            scores = origin_vectors[start:stop] @ self.vectors.T
+            if width < store_count:
+                top = np.argpartition(scores, store_count - width, axis=1)[:, store_count - width:]
+            else:
+                top = np.broadcast_to(np.arange(store_count), (stop - start, store_count))
+            top_distances = haversine_km_array(
+                latitudes[start:stop, None], longitudes[start:stop, None],
+                self.latitudes[top], self.longitudes[top]
+            )
+            order = np.argsort(top_distances, axis=1, kind='stable')
+            indices[start:stop, :width] = np.take_along_axis(top, order, axis=1)
+            distances[start:stop, :width] = np.take_along_axis(top_distances, order, axis=1)
+
+        if max_distance_km is not None:
+            too_far = distances > max_distance_km
+            indices[too_far] = -1
+            distances[too_far] = np.inf
+        return indices, distances
+
+
+def unit_vectors(latitudes, longitudes):
+    """(n, 3) unit-sphere coordinates for latitude/longitude arrays in radians"""
+    cos_latitudes = np.cos(latitudes)
+    return np.ascontiguousarray(np.stack(
+        [cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)], axis=-1
+    ))
+
+
+def haversine_km_array(lat1, lon1, lat2, lon2):
+    """Vectorized haversine distance in km (inputs in radians, broadcast together)"""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class StoreLocator:
+    """Nearest-store and radius lookups over a store catalogue"""
+
+    def __init__(self, stores, leaf_size=16, vectorized_max_stores=VECTORIZED_MAX_STORES):
+        self.stores = stores
+        self.vectorized_max_stores = vectorized_max_stores
+        self.points = [to_unit_vector(store['latitude'], store['longitude']) for store in stores]
+        self.tree = KDTree(self.points, range(len(stores)), leaf_size)
+
+        carriers = {}
+        for index, store in enumerate(stores):
+            for product in store.get('products', []):
+                carriers.setdefault(normalize_product(product), []).append(index)
+        self.product_trees = {
+            product: KDTree(self.points, indices, leaf_size) for product, indices in carriers.items()
+        }
+
+        latitudes = np.array([store['latitude'] for store in stores], dtype=np.float64)
+        longitudes = np.array([store['longitude'] for store in stores], dtype=np.float64)
+        self.table = CoordinateTable(latitudes, longitudes)
+        self.product_tables = {}
+        for product, indices in carriers.items():
+            rows = np.array(indices, dtype=np.int64)
+            self.product_tables[product] = (rows, CoordinateTable(latitudes[rows], longitudes[rows]))
+
+    @classmethod
+    def from_file(cls, path, leaf_size=16):
+        return cls(load_stores(path), leaf_size)
+
+    def tree_for(self, product):
+        if not product:
+            return self.tree
+        return self.product_trees.get(normalize_product(product))
+
+    def nearest(self, latitude, longitude, k=5, max_distance_km=None, product=None):
+        """The k nearest stores (optionally within a distance and carrying a product), nearest first"""
+        tree = self.tree_for(product)
+        if tree is None or k <= 0:
+            return []
+        limit = km_to_chord_squared(max_distance_km) if max_distance_km is not None else 4.0
+        hits = tree.search(to_unit_vector(latitude, longitude), k=k, max_chord_squared=limit)
+        return self.results(hits)
+
+    def within(self, latitude, longitude, radius_km, product=None, limit=None):
+        """All stores within radius_km (optionally carrying a product), nearest first"""
+        tree = self.tree_for(product)
+        if tree is None:
+            return []
+        hits = tree.search(to_unit_vector(latitude, longitude), max_chord_squared=km_to_chord_squared(radius_km))
+        return self.results(hits[:limit] if limit else hits)
+
+    def nearest_batch(self, latitudes, longitudes, k=1, max_distance_km=None, product=None):
+        """Rank stores for many origins at once
+
+        Returns (store indices, distances_km) arrays shaped (origins, k); -1 / inf
+        where fewer than k stores qualify. Catalogues up to vectorized_max_stores
+        are ranked with the NumPy table; larger ones with one tree query per origin.
+        """
+        tree = self.tree_for(product)
+        if tree is None:
+            origins = len(np.atleast_1d(latitudes))
+            return np.full((origins, k), -1, dtype=np.int64), np.full((origins, k), np.inf)
+        if tree.size > self.vectorized_max_stores:
+            return self.tree_batch(tree, latitudes, longitudes, k, max_distance_km)
+        if not product:
+            return self.table.nearest(latitudes, longitudes, k, max_distance_km)
+
+        rows, table = self.product_tables[normalize_product(product)]
+        indices, distances = table.nearest(latitudes, longitudes, k, max_distance_km)
+        return np.where(indices >= 0, rows[np.maximum(indices, 0)], -1), distances
+
+    def tree_batch(self, tree, latitudes, longitudes, k, max_distance_km=None):
+        """nearest_batch() via one k-d tree search per origin"""
+        latitudes = np.atleast_1d(latitudes)
+        longitudes = np.atleast_1d(longitudes)
+        indices = np.full((len(latitudes), k), -1, dtype=np.int64)
+        distances = np.full((len(latitudes), k), np.inf)
+        limit = km_to_chord_squared(max_distance_km) if max_distance_km is not None else 4.0
+        for position, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            hits = tree.search(to_unit_vector(float(latitude), float(longitude)), k=k, max_chord_squared=limit)
+            for rank, (distance, index) in enumerate(hits):
+                indices[position, rank] = index
+                distances[position, rank] = chord_squared_to_km(distance)
+        return indices, distances
+
+    def results(self, hits):
+        return [
+            dict(self.stores[index], distance_km=round(chord_squared_to_km(distance), 3))
+            for distance, index in hits
+        ]
+
+    def stats(self):
+        return {
+            'stores': len(self.stores),
+            'products_indexed': len(self.product_trees)
+        }
+
+
+def format_distance(distance_km):
+    """Human-readable distance, matching the frontend's formatting"""
+    if distance_km < 1:
+        return f"{round(distance_km * 1000)}m"
+    return f"{distance_km:.1f}km"
+
@@ -0,0 +1,13 @@
+"""
+Test configuration for Nestlé Canada AI Chatbot
+Makes the top-level modules, and the benchmark fixtures, importable from tests/
+
+File: tests/conftest.py
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
@@ -0,0 +1,120 @@
+"""
+Tests for crawler.py
+SiteCrawler against the local fixture site: depth and page budget, per-host
+rate limit, conditional re-crawls and which pages count as changed or gone
+
+File: tests/test_crawler.py
+"""
+
+import re
+import time
+from urllib.parse import urljoin
+
+import pytest
+import requests
+
+from crawler import SiteCrawler, changed_and_removed
+from fixture_site import SECTIONS, FixtureSite
+
+HREF = re.compile(r'href="([^"]+)"')
+
+
+def parse(url, body):
+    return {'url': url, 'links': [{'url': urljoin(url, href)} for href in HREF.findall(body.decode('utf-8'))]}
+
+
+@pytest.fixture
+def site():
+    site = FixtureSite(latency=0.02).start()
+    yield site
+    site.stop()
+
+
+def crawler_for(site, **options):
+    options = dict(dict(max_workers=8, max_depth=1, max_pages=30, requests_per_second=0), **options)
+    return SiteCrawler(requests.Session(), parse, allowed_prefix=site.base_url, **options)
+
+
+def seeds(site):
+    return [site.base_url + path for path in SECTIONS]
+
+
+def test_depth_zero_fetches_only_the_seeds(site):
+    pages, stats = crawler_for(site, max_depth=0).crawl(seeds(site))
+    assert sorted(pages) == sorted(seeds(site))
+    assert site.request_count == len(SECTIONS)
+    assert not stats['truncated']
+
+
+def test_page_budget_truncates_the_same_way_every_time(site):
+    first, stats = crawler_for(site, max_pages=15).crawl(seeds(site))
+    second, _ = crawler_for(site, max_pages=15).crawl(seeds(site))
+    assert len(first) == 15 and stats['truncated']
+    assert set(first) == set(second)
+    assert set(seeds(site)) <= set(first)
+
+
+def test_fetches_overlap_the_injected_latency(site):
+    site.latency = 0.2
+    start = time.monotonic()
+    pages, _ = crawler_for(site, max_depth=0).crawl(seeds(site))
+    assert len(pages) == len(SECTIONS)
+    assert time.monotonic() - start < 0.2 * len(SECTIONS) / 2
+
+
+def test_requests_to_one_host_are_rate_limited(site):
+    start = time.monotonic()
+    pages, _ = crawler_for(site, max_pages=10, requests_per_second=20).crawl(seeds(site))
+    assert len(pages) == 10
+    assert time.monotonic() - start >= (10 - 1) / 20
+
+
+def test_recrawl_sends_validators_and_reuses_not_modified_pages(site):
+    crawler = crawler_for(site, max_depth=0)
+    pages, _ = crawler.crawl(seeds(site))
+    site.touch('/help')
+    again, stats = crawler.crawl(seeds(site), previous=pages)
+    help_url = site.base_url + '/help'
+    assert stats['pages_not_modified'] == len(SECTIONS) - 1
+    assert stats['pages_reparsed'] == 1
+    assert site.not_modified_count == len(SECTIONS) - 1
+    assert all(again[url] is pages[url] for url in again if url != help_url)
+    assert again[help_url]['etag'] != pages[help_url]['etag']
+    assert changed_and_removed(pages, again, stats) == ([help_url], [])
+
+
+def test_same_body_without_validators_keeps_the_record():
+    site = FixtureSite(conditional=False).start()
+    try:
+        crawler = crawler_for(site, max_depth=0)
+        pages, _ = crawler.crawl(seeds(site))
+        again, stats = crawler.crawl(seeds(site), previous=pages)
+    finally:
+        site.stop()
+    assert stats['pages_unchanged'] == len(SECTIONS)
+    assert stats['pages_not_modified'] == 0
+    for url, record in again.items():
+        assert record is not pages[url]
+        assert record['content_hash'] == pages[url]['content_hash']
+        assert record['links'] is pages[url]['links']
+    assert changed_and_removed(pages, again, stats) == ([], [])
+
+
+def crawl_stats(*pages, truncated=False):
+    return {'truncated': truncated, 'pages': list(pages)}
+
+
+PREVIOUS = {'a': {'url': 'a'}, 'b': {'url': 'b'}}
+
+
+@pytest.mark.parametrize('pages, stats, removed', [
+    # A complete crawl that no longer reaches a page drops it
+    ({'a': PREVIOUS['a']}, crawl_stats({'url': 'a', 'status': 'not_modified'}), ['b']),
+    # A page the site answers 404 or 410 for is gone even when other fetches failed
+    ({}, crawl_stats({'url': 'a', 'error': 'timeout'}, {'url': 'b', 'error': 'gone', 'http_status': 410}), ['b']),
+    # A failed fetch or a page budget cut means unreached pages may still exist
+    ({}, crawl_stats({'url': 'a', 'error': 'timeout'}), []),
+    ({'a': PREVIOUS['a']}, crawl_stats({'url': 'a', 'status': 'not_modified'}, truncated=True), []),
+])
+def test_removed_pages(pages, stats, removed):
+    assert changed_and_removed(PREVIOUS, pages, stats)[1] == removed
@@ -0,0 +1,162 @@
+"""
+Tests for llm_client.py
+Wall-clock deadlines on attempts and streams, and what counts against the circuit breaker
+
+File: tests/test_llm_client.py
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from llm_client import AsyncLLMClient, CircuitBreaker, LLMClient, LLMUnavailable
+
+POLICY = dict(deadline=0.5, attempt_timeout=0.3, max_retries=0)
+
+
+def status_error(status):
+    request = httpx.Request('POST', 'http://llm/v1/chat/completions')
+    return openai.APIStatusError('refused', response=httpx.Response(status, request=request), body=None)
+
+
+def fake_client(create):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)),
+                           embeddings=SimpleNamespace(create=create))
+
+
+class SlowStream:
+    """A stream that sends a chunk every delay seconds until closed"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        while not self.closed:
+            time.sleep(self.delay)
+            yield 'chunk'
+
+    def close(self):
+        self.closed = True
+
+
+def test_slow_attempt_is_cut_off_on_the_wall_clock():
+    client = LLMClient(fake_client(lambda **params: time.sleep(2)), CircuitBreaker(), **POLICY)
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        client.complete([], model='m')
+    assert time.monotonic() - start < 1
+    assert client.breaker.stats()['consecutive_failures'] == 1
+
+
+def test_embeddings_go_through_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    client = LLMClient(fake_client(lambda **params: time.sleep(2)), breaker, **POLICY)
+    with pytest.raises(LLMUnavailable):
+        client.embeddings(model='m', input=['text'])
+    with pytest.raises(LLMUnavailable, match='circuit open'):
+        client.embeddings(model='m', input=['text'])
+
+
+def test_stream_stops_at_the_deadline():
+    stream = SlowStream(0.05)
+    client = LLMClient(fake_client(lambda **params: stream), CircuitBreaker(), **POLICY)
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable, match='AttemptTimeout'):
+        for _ in client.stream([], model='m', stream=True):
+            pass
+    assert time.monotonic() - start < 1
+    assert stream.closed
+
+
+def test_async_stream_stops_at_the_deadline():
+    class AsyncSlowStream:
+        closed = False
+
+        async def __aiter__(self):
+            while True:
+                await asyncio.sleep(0.05)
+                yield 'chunk'
+
+        async def close(self):
+            self.closed = True
+
+    stream = AsyncSlowStream()
+
+    async def create(**params):
+        return stream
+
+    async def run():
+        client = AsyncLLMClient(fake_client(create), CircuitBreaker(), **POLICY)
+        with pytest.raises(LLMUnavailable, match='AttemptTimeout'):
+            async for _ in await client.stream([], model='m', stream=True):
+                pass
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - start < 1
+    assert stream.closed
+
+
+@pytest.mark.parametrize('error, failures', [
+    (TypeError('bad argument'), 0),
+    (status_error(400), 0),
+    (status_error(409), 0),
+    (status_error(429), 1),
+    (status_error(503), 1),
+    (openai.APIConnectionError(request=httpx.Request('POST', 'http://llm')), 1),
+])
+def test_only_upstream_failures_count_against_the_breaker(error, failures):
+    def create(**params):
+        raise error
+
+    client = LLMClient(fake_client(create), CircuitBreaker(), **POLICY)
+    with pytest.raises((type(error), LLMUnavailable)):
+        client.complete([], model='m')
+    assert client.breaker.stats()['consecutive_failures'] == failures
+
+
+def test_trial_call_with_a_bug_lets_the_next_call_try():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    def create(**params):
+        raise TypeError('bad argument')
+
+    with pytest.raises(TypeError):
+        LLMClient(fake_client(create), breaker, **POLICY).complete([], model='m')
+    assert breaker.allow()
+
+
+def test_cancelled_trial_call_lets_the_next_call_try():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    async def create(**params):
+        await asyncio.sleep(10)
+
+    async def run():
+        client = AsyncLLMClient(fake_client(create), breaker, deadline=20, attempt_timeout=10, max_retries=0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.complete([], model='m'), 0.05)
+
+    asyncio.run(run())
+    assert breaker.stats()['state'] == 'half_open'
+    assert breaker.allow() == 'trial'
+
+
+def test_interrupted_sync_trial_call_lets_the_next_call_try():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = LLMClient(fake_client(lambda **params: None), breaker, **POLICY)
+
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        client.call(interrupted)
+    assert breaker.allow() == 'trial'
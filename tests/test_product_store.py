@@ -0,0 +1,74 @@
+"""
+Tests for product_store.py
+Whole-word product detection, category words and copy-on-write forks
+
+File: tests/test_product_store.py
+"""
+
+import pytest
+
+from product_store import ProductStore
+
+CATALOGUE = [
+    {'key': 'kitkat', 'name': 'KitKat', 'categories': ['Chocolate', 'Wafer']},
+    {'key': 'smarties', 'name': 'Smarties', 'categories': ['Chocolate', 'Candy']},
+    {'key': 'coffee crisp', 'name': 'Coffee Crisp', 'categories': ['Chocolate', 'Pet  Food']},
+    {'key': 'aero', 'name': 'Aero', 'categories': ['Chocolate'], 'aliases': 'aero bar'},
+]
+
+
+@pytest.fixture
+def store():
+    return ProductStore(CATALOGUE, reserved_words=['coffee', 'recipe'])
+
+
+@pytest.mark.parametrize('message, key', [
+    ("Is KitKat gluten free?", 'kitkat'),
+    ("Where can I buy KITKATS?", 'kitkat'),
+    ("I love kit-kat", None),
+    ("Tell me about kitkatty", None),
+    ("Is the aerobics class open?", None),
+    ("An Aero bar please", 'aero'),
+    ("Where is Coffee Crisp sold?", 'coffee crisp'),
+    ("Do you sell coffee?", None),
+])
+def test_match_whole_words_with_plural(store, message, key):
+    assert store.match(message) == key
+
+
+def test_match_prefers_the_earliest_product(store):
+    assert store.match("Smarties or KitKat?") == 'kitkat'
+
+
+def test_scraped_category_word_is_not_an_alias(store):
+    scraped = store.with_products([{'name': 'Coffee'}, {'name': 'Recipes'}, {'name': 'Nescafé Gold'}])
+    assert scraped.match("Where can I buy coffee near me?") is None
+    assert scraped.match("What recipes use chocolate?") is None
+    assert scraped.match("Is Nescafe Gold decaf?") == 'nescafé gold'
+    assert scraped.match("Where is Coffee Crisp sold?") == 'coffee crisp'
+    assert scraped.find('Coffee')['source'] == 'site'
+
+
+def test_scraped_name_matching_a_store_category_is_not_an_alias(store):
+    scraped = store.with_products([{'name': 'Wafer'}, {'name': 'Wafers'}])
+    assert scraped.match("Any wafer snacks?") is None
+    assert scraped.match("Any wafers?") is None
+
+
+def test_catalogue_one_word_name_stays_an_alias():
+    store = ProductStore([{'key': 'coffee', 'name': 'Coffee', 'categories': ['Coffee']}], reserved_words=['coffee'])
+    assert store.match("Do you sell coffee?") == 'coffee'
+
+
+def test_category_filter_normalizes_whitespace_and_case(store):
+    assert [store.keys[row] for row in store.select(category='pet food')] == ['coffee crisp']
+    assert [store.keys[row] for row in store.select(category='  PET   Food ')] == ['coffee crisp']
+    assert store.record(store.rows['coffee crisp'])['categories'] == ['chocolate', 'pet food']
+
+
+def test_fork_leaves_the_original_unchanged(store):
+    scraped = store.with_products([{'name': 'Nescafé Gold', 'categories': ['Chocolate']}])
+    assert len(scraped.select(category='chocolate')) == 5
+    assert len(store.select(category='chocolate')) == 4
+    assert store.find('Nescafe Gold') is None
+    assert scraped.find('Nescafe Gold')['key'] == 'nescafé gold'
@@ -0,0 +1,43 @@
+"""
+Tests for query_matcher.py
+The automaton and the per-field patterns agree, and earlier values win within a field
+
+File: tests/test_query_matcher.py
+"""
+
+import pytest
+
+from query_matcher import KeywordMatcher
+
+CATEGORIES = [
+    ('coffee', ['coffee', 'espresso', 'nescafe']),
+    ('chocolate', ['kitkat', 'smarties', 'aero', 'quality']),
+    ('recipe', ['recipe', 'baking', 'cookie']),
+]
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    return KeywordMatcher().add_table('category', CATEGORIES).add('a+b (c)', 'symbol', 'escaped').build()
+
+
+@pytest.mark.parametrize('text, category', [
+    ('NESCAFÉ Gold', None),
+    ('Nescafe Gold Espresso', 'coffee'),
+    ('KitKat Chunky', 'chocolate'),
+    # coffee was added before chocolate, so it wins wherever it appears
+    ('Aero coffee cookie', 'coffee'),
+    ('Smarties cookie mix', 'chocolate'),
+    ('Toll House Baking Chips', 'recipe'),
+    ('Quality Street', 'chocolate'),
+    ('Maggi', None),
+])
+def test_match_field_agrees_with_the_automaton(matcher, text, category):
+    assert matcher.match(text).get('category') == category
+    assert matcher.match_field(text, 'category') == category
+
+
+def test_match_field_treats_keywords_literally(matcher):
+    assert matcher.match_field('Mix A+B (C) today', 'symbol') == 'escaped'
+    assert matcher.match_field('Mix AAB C', 'symbol') is None
+    assert matcher.match_field('coffee', 'missing') is None
@@ -0,0 +1,58 @@
+"""
+Tests for response_cache.py
+Cache keys keep negations and question words; rephrasings still hit
+
+File: tests/test_response_cache.py
+"""
+
+import pytest
+
+from response_cache import ResponseCache, normalize_query
+
+DIFFERENT_QUESTIONS = [
+    ("Is KitKat gluten free?", "Is KitKat not gluten free?"),
+    ("Is KitKat gluten free?", "Isn't KitKat gluten free?"),
+    ("What is KitKat?", "Why KitKat?"),
+    ("When was KitKat made", "Where was KitKat made"),
+    ("When was KitKat made", "How was KitKat made"),
+    ("Where was KitKat made", "How was KitKat made"),
+]
+
+
+def test_normalize_ignores_case_punctuation_accents_and_spacing():
+    assert normalize_query("  Where can I buy   NESCAFÉ?! ") == 'where can i buy nescafe'
+    assert normalize_query("Is KitKat not gluten-free?") == 'is kitkat not gluten free'
+
+
+@pytest.mark.parametrize('first, second', DIFFERENT_QUESTIONS)
+def test_different_questions_have_different_keys(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+
+@pytest.mark.parametrize('similarity', [0.0, 0.3])
+@pytest.mark.parametrize('first, second', DIFFERENT_QUESTIONS)
+def test_different_questions_miss_each_other(first, second, similarity):
+    cache = ResponseCache(similarity_threshold=similarity)
+    cache.put(first, 1, 'first answer', scope='general')
+    assert cache.get(second, 1, scope='general') is None
+    assert cache.get(first, 1, scope='general') == 'first answer'
+
+
+def test_rephrasings_share_an_answer():
+    cache = ResponseCache()
+    cache.put("Where can I buy KitKat?", 1, 'answer', scope='purchase')
+    assert cache.get("where can i buy kitkat", 1, scope='purchase') == 'answer'
+    assert cache.get("Where can I buy KitKat?", 1, scope='general') is None
+
+
+def test_near_duplicates_with_the_same_question_words_hit():
+    cache = ResponseCache(similarity_threshold=0.5)
+    cache.put("Where can I buy KitKat bars", 1, 'answer')
+    assert cache.get("Where can I buy KitKat bars today", 1) == 'answer'
+    assert cache.stats()['near_duplicate_hits'] == 1
+
+
+def test_new_generation_clears_the_cache():
+    cache = ResponseCache()
+    cache.put("What is KitKat?", 1, 'answer')
+    assert cache.get("What is KitKat?", 2) is None
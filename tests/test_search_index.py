@@ -0,0 +1,97 @@
+"""
+Tests for search_index.py
+BM25 ranking order, passage boundaries and copy-on-write forks
+
+File: tests/test_search_index.py
+"""
+
+from search_index import InvertedIndex, split_passages, tokenize
+
+DOCUMENTS = [
+    ('kitkat', "KitKat wafer bars: crispy wafer fingers covered in milk chocolate"),
+    ('cocoa-plan', "The Nestlé Cocoa Plan supports cocoa farmers and their communities"),
+    ('coffee', "Nescafé instant coffee and coffee pods for every taste"),
+    ('wafers', "Wafer wafer wafer: every wafer snack we make"),
+]
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("What is the Nescafé Gold?") == ['nescafe', 'gold']
+
+
+def test_bm25_ranks_by_term_weight():
+    index = InvertedIndex.from_documents(DOCUMENTS)
+    ranked = [doc_id for doc_id, _ in index.search("wafer", limit=5)]
+    # Higher term frequency wins; documents without the term are not returned
+    assert ranked == ['wafers', 'kitkat']
+
+
+def test_bm25_rarer_terms_weigh_more():
+    index = InvertedIndex.from_documents(DOCUMENTS)
+    ranked = index.search("cocoa chocolate", limit=5)
+    assert [doc_id for doc_id, _ in ranked] == ['cocoa-plan', 'kitkat']
+    assert ranked[0][1] > ranked[1][1] > 0
+
+
+def test_search_respects_limit_and_unknown_terms():
+    index = InvertedIndex.from_documents(DOCUMENTS)
+    assert len(index.search("wafer coffee cocoa", limit=2)) == 2
+    assert index.search("spaceship") == []
+    assert InvertedIndex().search("wafer") == []
+
+
+def test_replacing_a_document_updates_its_postings():
+    index = InvertedIndex.from_documents(DOCUMENTS)
+    index.add_document('kitkat', "KitKat coffee edition")
+    assert [doc_id for doc_id, _ in index.search("wafer", limit=5)] == ['wafers']
+    assert 'kitkat' in dict(index.search("coffee", limit=5))
+    assert len(index) == len(DOCUMENTS)
+
+
+def test_split_passages_window_boundaries():
+    text = ' '.join(f"w{number}" for number in range(10))
+    passages = split_passages(text, words_per_passage=4, overlap=1)
+    assert [passage['text'] for passage in passages] == [
+        'w0 w1 w2 w3', 'w3 w4 w5 w6', 'w6 w7 w8 w9'
+    ]
+    for passage in passages:
+        assert text[passage['start']:passage['end']] == passage['text']
+
+
+def test_split_passages_short_and_empty_text():
+    assert split_passages("") == []
+    assert split_passages("   \n ") == []
+    only = split_passages("  two words  ", words_per_passage=4, overlap=1)
+    assert only == [{'start': 2, 'end': 11, 'text': 'two words'}]
+
+
+def test_split_passages_last_window_ends_at_the_last_word():
+    text = ' '.join(f"w{number}" for number in range(7))
+    passages = split_passages(text, words_per_passage=4, overlap=2)
+    assert passages[-1]['text'].endswith('w6')
+    assert len(passages) == 3
+
+
+def test_fork_leaves_parent_unchanged():
+    parent = InvertedIndex.from_documents(DOCUMENTS)
+    before_postings = {term: dict(postings) for term, postings in parent.postings.items()}
+    before_ranking = parent.search("wafer coffee", limit=5)
+
+    child = parent.fork()
+    child.remove_document('wafers')
+    child.add_document('kitkat', "KitKat coffee edition")
+    child.add_document('smarties', "Smarties coated chocolate")
+
+    assert {term: dict(postings) for term, postings in parent.postings.items()} == before_postings
+    assert parent.search("wafer coffee", limit=5) == before_ranking
+    assert len(parent) == len(DOCUMENTS)
+    assert 'smarties' not in parent and 'smarties' in child
+    assert child.search("wafer") == []
+
+
+def test_fork_shares_untouched_postings():
+    parent = InvertedIndex.from_documents(DOCUMENTS)
+    child = parent.fork()
+    child.add_document('kitkat', "KitKat coffee edition")
+    assert child.postings['cocoa'] is parent.postings['cocoa']
+    assert child.postings['coffee'] is not parent.postings['coffee']
@@ -0,0 +1,243 @@
+"""
+Tests for singleflight.py
+Concurrent identical calls share one upstream call, its result and its error
+
+File: tests/test_singleflight.py
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import AsyncSingleFlight, FlightAborted, SingleFlight
+
+CALLERS = 8
+
+
+def run_threads(target, count=CALLERS):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except BaseException as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def join_all(threads):
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+class Upstream:
+    """A call that blocks until released, counting how often it ran"""
+
+    def __init__(self, result='answer', error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def chunks(self):
+        self.calls += 1
+        self.started.set()
+        yield 'a'
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        yield 'b'
+
+
+def wait_for_followers(flights, count):
+    for _ in range(500):
+        if flights.stats()['coalesced'] >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"only {flights.stats()['coalesced']} of {count} callers joined")
+
+
+def test_identical_calls_make_one_upstream_call():
+    flights = SingleFlight()
+    upstream = Upstream()
+    threads, results, errors = run_threads(lambda: flights.do('key', upstream))
+    wait_for_followers(flights, CALLERS - 1)
+    upstream.release.set()
+    join_all(threads)
+    assert upstream.calls == 1
+    assert errors == [None] * CALLERS
+    assert sorted(results) == [('answer', False)] + [('answer', True)] * (CALLERS - 1)
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_error_reaches_every_caller():
+    flights = SingleFlight()
+    upstream = Upstream(error=ValueError('provider down'))
+    threads, results, errors = run_threads(lambda: flights.do('key', upstream))
+    wait_for_followers(flights, CALLERS - 1)
+    upstream.release.set()
+    join_all(threads)
+    assert upstream.calls == 1
+    assert [type(error) for error in errors] == [ValueError] * CALLERS
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_interrupted_call_releases_followers():
+    flights = SingleFlight()
+    upstream = Upstream(error=KeyboardInterrupt())
+    threads, results, errors = run_threads(lambda: flights.do('key', upstream))
+    wait_for_followers(flights, CALLERS - 1)
+    upstream.release.set()
+    join_all(threads)
+    assert sorted(type(error).__name__ for error in errors) == ['FlightAborted'] * (CALLERS - 1) + ['KeyboardInterrupt']
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_stream_is_read_once_and_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    upstream = Upstream(error=ValueError('stream broke'))
+    threads, results, errors = run_threads(lambda: list(flights.stream('key', upstream.chunks)))
+    wait_for_followers(flights, CALLERS - 1)
+    upstream.release.set()
+    join_all(threads)
+    assert upstream.calls == 1
+    assert [type(error) for error in errors] == [ValueError] * CALLERS
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_plain_call_follows_a_stream_in_flight():
+    flights = SingleFlight()
+    upstream = Upstream()
+    stream = flights.stream('key', upstream.chunks)
+    assert upstream.started.wait(5)
+    plain = Upstream()
+    threads, results, errors = run_threads(lambda: flights.do('key', plain, ''.join), count=3)
+    wait_for_followers(flights, 3)
+    upstream.release.set()
+    assert list(stream) == ['a', 'b']
+    join_all(threads)
+    assert plain.calls == 0
+    assert results == [('ab', True)] * 3
+
+
+def test_stream_does_not_join_a_plain_call():
+    flights = SingleFlight()
+    upstream = Upstream()
+    threads, results, errors = run_threads(lambda: flights.do('key', upstream), count=1)
+    assert upstream.started.wait(5)
+    streamed = Upstream()
+    streamed.release.set()
+    stream = flights.stream('key', streamed.chunks)
+    assert list(stream) == ['a', 'b'] and not stream.shared
+    upstream.release.set()
+    join_all(threads)
+    assert results == [('answer', False)]
+
+
+def test_async_identical_calls_make_one_upstream_call_and_share_errors():
+    async def run(error):
+        flights = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await release.wait()
+            if error is not None:
+                raise error
+            return 'answer'
+
+        tasks = [asyncio.ensure_future(flights.do('key', call)) for _ in range(CALLERS)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return len(calls), results, flights.stats()
+
+    calls, results, stats = asyncio.run(run(None))
+    assert calls == 1
+    assert sorted(results) == [('answer', False)] + [('answer', True)] * (CALLERS - 1)
+    calls, results, stats = asyncio.run(run(ValueError('provider down')))
+    assert calls == 1
+    assert [type(result) for result in results] == [ValueError] * CALLERS
+    assert stats['in_flight'] == 0
+
+
+@pytest.mark.parametrize('error, raised', [(ValueError('stream broke'), ValueError), (None, None)])
+def test_async_stream_shared_with_streams_and_plain_calls(error, raised):
+    async def run():
+        flights = AsyncSingleFlight()
+        release = asyncio.Event()
+        opened = []
+
+        async def open_stream():
+            opened.append(1)
+
+            async def chunks():
+                yield 'a'
+                await release.wait()
+                if error is not None:
+                    raise error
+                yield 'b'
+            return chunks()
+
+        async def subscribe():
+            stream, shared = await flights.stream('key', open_stream)
+            return ''.join([chunk async for chunk in stream])
+
+        async def plain_call():
+            raise AssertionError("a plain call should follow the stream")
+
+        tasks = [asyncio.ensure_future(subscribe()) for _ in range(CALLERS)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(flights.do('key', plain_call, ''.join)))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return len(opened), results, flights.stats()
+
+    opened, results, stats = asyncio.run(run())
+    assert opened == 1
+    if raised is None:
+        assert results == ['ab'] * CALLERS + [('ab', True)]
+    else:
+        assert [type(result) for result in results] == [raised] * (CALLERS + 1)
+    assert stats['in_flight'] == 0
+
+
+def test_async_interrupted_stream_ends_for_subscribers():
+    async def run():
+        flights = AsyncSingleFlight()
+
+        async def open_stream():
+            async def chunks():
+                yield 'a'
+                await asyncio.sleep(10)
+            return chunks()
+
+        stream, shared = await flights.stream('key', open_stream)
+        follower, _ = await flights.stream('key', open_stream)
+        assert await stream.__anext__() == 'a'
+        flights.flights['key'].task.cancel()
+        with pytest.raises(FlightAborted):
+            async for _ in follower:
+                pass
+        await asyncio.sleep(0)
+        return flights.stats()
+
+    assert asyncio.run(run())['in_flight'] == 0
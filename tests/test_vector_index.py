@@ -0,0 +1,98 @@
+"""
+Tests for vector_index.py
+int8 recall against float32, hybrid fusion order, vector file pruning
+
+File: tests/test_vector_index.py
+"""
+
+import os
+
+import numpy as np
+
+from vector_index import VectorIndex, fuse_hits, normalize_rows, prune_vector_files, vectors_path
+
+
+def make_index(count=2000, dimensions=64, seed=3):
+    rng = np.random.default_rng(seed)
+    vectors = normalize_rows(rng.standard_normal((count, dimensions)).astype(np.float32))
+    index = VectorIndex(dimensions)
+    for row, vector in enumerate(vectors):
+        index.add(f"doc-{row}", f"passage {row}", vector)
+    return index, vectors, rng
+
+
+def test_int8_recall_matches_float32():
+    index, vectors, rng = make_index()
+    queries = normalize_rows(vectors[:100] + 0.5 * rng.standard_normal(vectors[:100].shape).astype(np.float32))
+    found = total = 0
+    for query in queries:
+        exact = {doc_id for doc_id, _ in index.search(query, limit=10)}
+        approximate = {doc_id for doc_id, _ in index.search(query, limit=10, quantized=True)}
+        found += len(exact & approximate)
+        total += len(exact)
+    assert found / total >= 0.95
+
+
+def test_int8_scores_are_exact_after_rescoring():
+    index, vectors, _ = make_index(count=300)
+    query = vectors[7]
+    exact = index.search(query, limit=5)
+    approximate = index.search(query, limit=5, quantized=True)
+    assert approximate[0][0] == exact[0][0] == 'doc-7'
+    assert abs(approximate[0][1] - 1.0) < 1e-5
+
+
+def test_passages_pointing_away_are_not_hits():
+    index = VectorIndex(2)
+    index.add('same', 'same', np.array([1.0, 0.0], dtype=np.float32))
+    index.add('orthogonal', 'orthogonal', np.array([0.0, 1.0], dtype=np.float32))
+    index.add('opposite', 'opposite', np.array([-1.0, 0.0], dtype=np.float32))
+    query = np.array([1.0, 0.0], dtype=np.float32)
+    assert [doc_id for doc_id, _ in index.search(query, limit=3)] == ['same']
+    assert [doc_id for doc_id, _ in index.search(query, limit=3, quantized=True)] == ['same']
+    assert index.search(-query, limit=3) == [('opposite', 1.0)]
+
+
+def test_removed_passages_are_not_returned():
+    index, vectors, _ = make_index(count=50)
+    index.remove('doc-3')
+    assert 'doc-3' not in {doc_id for doc_id, _ in index.search(vectors[3], limit=50)}
+
+
+def test_fuse_hits_order():
+    lexical = [('a', 10.0), ('b', 5.0), ('c', 1.0)]
+    dense = [('c', 0.9), ('b', 0.6), ('d', 0.3)]
+    # a: 0.5 * 1.0, b: 0.5 * 0.5 + 0.5 * 0.667, c: 0.5 * 0.1 + 0.5 * 1.0, d: 0.5 * 0.333
+    assert [doc_id for doc_id, _ in fuse_hits(lexical, dense, 0.5, limit=4)] == ['b', 'c', 'a', 'd']
+    assert [doc_id for doc_id, _ in fuse_hits(lexical, dense, 0.0, limit=4)][:3] == ['a', 'b', 'c']
+    assert [doc_id for doc_id, _ in fuse_hits(lexical, dense, 1.0, limit=4)][:3] == ['c', 'b', 'd']
+
+
+def test_fuse_hits_with_one_side_empty():
+    assert fuse_hits([], [('x', 0.4), ('y', 0.2)], 0.5, limit=3) == [('x', 0.5), ('y', 0.25)]
+    assert fuse_hits([('x', 2.0)], [], 0.5, limit=3) == [('x', 0.5)]
+
+
+def test_prune_vector_files_keeps_current_and_previous_generation(tmp_path):
+    snapshot_path = str(tmp_path / 'knowledge_snapshot.bin')
+    open(snapshot_path, 'wb').close()
+    for generation in range(1, 6):
+        np.save(vectors_path(snapshot_path, generation), np.zeros((1, 2), dtype=np.float32))
+
+    prune_vector_files(snapshot_path, keep=(5, 4))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        'knowledge_snapshot.bin',
+        'knowledge_snapshot.bin.vectors-4.npy',
+        'knowledge_snapshot.bin.vectors-5.npy'
+    ]
+
+
+def test_saved_index_maps_its_file_and_forks_copy_on_write(tmp_path):
+    index, vectors, _ = make_index(count=20, dimensions=8)
+    path = vectors_path(str(tmp_path / 'kb.bin'), 1)
+    index.save(path)
+    child = index.fork()
+    child.add('doc-0', 'changed', vectors[1])
+    assert index.search(vectors[0], limit=1)[0][0] == 'doc-0'
+    assert np.array_equal(np.load(path)[0], vectors[0])
@@ -0,0 +1,377 @@
+"""
+Vector Index for Nestlé Canada AI Chatbot
+Dense passage retrieval over a memory-mapped float32 matrix
+
+BM25 only matches the words a page uses, so "espresso drinks" never finds a
+page that only says "Nescafé". With RETRIEVAL_MODE=dense or hybrid every
+passage is embedded once when its page is (re)indexed during a refresh, and
+questions are answered by a brute-force cosine top-k over the passage matrix
+with NumPy, optionally blended with the BM25 scores.
+
+- embedders are pluggable: OpenAIEmbedder calls the embeddings API,
+  HashingEmbedder is a local, deterministic stand-in (hashed words and
+  character trigrams) that needs no network
+- vectors live in one float32 matrix; a saved generation is written as a .npy
+  file next to the knowledge base snapshot and mapped back copy-on-write, so
+  workers share it through the page cache
+- int8 search scans a quantized copy (a quarter of the memory traffic) and
+  rescores the best candidates exactly against the float32 rows
+- a refresh patches a fork() that shares the serving index's vectors until
+  its first write
+
+File: vector_index.py
+"""
+
+import glob
+import hashlib
+import os
+import tempfile
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from search_index import tokenize
+
+# Candidates per requested hit that int8 search rescores against the float32 rows
+QUANTIZED_OVERSAMPLE = 8
+
+# Rows converted from int8 per BLAS call in quantized search
+QUANTIZED_BLOCK_ROWS = 8192
+
+
+class HashingEmbedder:
+    """Deterministic local embeddings: signed feature hashing of words and character trigrams"""
+
+    def __init__(self, dimensions=256, trigram_weight=0.5):
+        self.dimensions = dimensions
+        self.trigram_weight = trigram_weight
+        self.signature = f"hashing:{dimensions}:{trigram_weight}"
+        self.token_features = lru_cache(maxsize=200000)(self.compute_token_features)
+
+    def compute_token_features(self, token):
+        """Hashed feature indices and signed weights of one folded token"""
+        padded = f"#{token}#"
+        grams = [(token, 1.0)] + [(padded[i:i + 3], self.trigram_weight) for i in range(len(padded) - 2)]
+        indices = np.empty(len(grams), dtype=np.int64)
+        values = np.empty(len(grams), dtype=np.float64)
+        for position, (gram, weight) in enumerate(grams):
+            # crc32 rather than hash(): str hashing is salted per process
+            code = zlib.crc32(gram.encode('utf-8'))
+            indices[position] = code % self.dimensions
+            values[position] = weight if code & 0x80000000 else -weight
+        return indices, values
+
+    def embed(self, texts):
+        """L2-normalized float32 matrix with one row per text"""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            if not counts:
+                continue
+            features = [self.token_features(token) for token in counts]
+            # Sublinear term frequency, spread over each token's features
+            weights = np.repeat(1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts))),
+                                [len(indices) for indices, values in features])
+            vectors[row] = np.bincount(
+                np.concatenate([indices for indices, values in features]),
+                weights=np.concatenate([values for indices, values in features]) * weights,
+                minlength=self.dimensions
+            )
+        return normalize_rows(vectors)
+
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI API, requested in batches through an LLMClient"""
+
+    def __init__(self, client, model='text-embedding-3-small', dimensions=256, batch_size=256):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.signature = f"openai:{model}:{dimensions}"
+
+    def embed(self, texts):
+        """L2-normalized float32 matrix with one row per text"""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = [text or ' ' for text in texts[start:start + self.batch_size]]
+            response = self.client.embeddings(model=self.model, input=batch, dimensions=self.dimensions)
+            for item in response.data:
+                vectors[start + item.index] = item.embedding
+        return normalize_rows(vectors)
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def text_key(text):
+    """Stable key for a passage text, used to reuse its vector across refreshes"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class VectorIndex:
+    """doc_id -> row of a float32 matrix of unit vectors, searched by cosine similarity"""
+
+    def __init__(self, dimensions, signature=''):
+        self.dimensions = dimensions
+        self.signature = signature
+        self.matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self.active = np.zeros(0, dtype=bool)
+        self.count = 0
+        self.doc_ids = []
+        self.keys = []
+        self.rows = {}
+        self.key_rows = {}
+        self.free_rows = []
+        self.quantized = None
+        self.path = None
+        self.shared = False
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.rows
+
+    def __getstate__(self):
+        # Snapshots carry the row bookkeeping; the vectors stay in the .npy file written by save()
+        if self.path is None:
+            raise ValueError('VectorIndex.save() must be called before pickling')
+        state = self.__dict__.copy()
+        state.update(matrix=None, quantized=None, shared=False)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.matrix = np.load(self.path, mmap_mode='c')
+        if self.matrix.shape != (self.count, self.dimensions):
+            raise ValueError(f"Vector file {self.path} does not match its index")
+
+    def fork(self):
+        """Copy to patch while this index keeps serving; the vectors are copied on first write"""
+        clone = VectorIndex.__new__(VectorIndex)
+        clone.__dict__.update(self.__dict__)
+        clone.doc_ids = list(self.doc_ids)
+        clone.keys = list(self.keys)
+        clone.rows = dict(self.rows)
+        clone.key_rows = dict(self.key_rows)
+        clone.free_rows = list(self.free_rows)
+        clone.shared = True
+        return clone
+
+    def own_arrays(self):
+        """Take private copies of arrays shared with the index this one was forked from"""
+        if not self.shared:
+            return
+        # A fresh copy-on-write map of the saved file costs nothing until rows are written
+        self.matrix = np.load(self.path, mmap_mode='c') if self.path else self.matrix.copy()
+        self.active = self.active.copy()
+        if self.quantized is not None:
+            self.quantized = (self.quantized[0].copy(), self.quantized[1].copy())
+        self.shared = False
+
+    def embed_texts(self, embedder, texts):
+        """Vectors for passage texts, reusing the stored vector of any text already indexed"""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        missing = []
+        for position, text in enumerate(texts):
+            row = self.key_rows.get(text_key(text))
+            if row is None:
+                missing.append(position)
+            else:
+                vectors[position] = self.matrix[row]
+        if missing:
+            vectors[missing] = embedder.embed([texts[position] for position in missing])
+        return vectors
+
+    def add(self, doc_id, text, vector):
+        """Store a passage vector, replacing any previous vector with the same id"""
+        if doc_id in self.rows:
+            self.remove(doc_id)
+
+        self.own_arrays()
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            if self.count == len(self.matrix):
+                self.grow(max(64, 2 * len(self.matrix)))
+            row = self.count
+            self.count += 1
+            self.doc_ids.append(None)
+            self.keys.append(None)
+
+        key = text_key(text)
+        self.matrix[row] = vector
+        self.active[row] = True
+        self.doc_ids[row] = doc_id
+        self.keys[row] = key
+        self.rows[doc_id] = row
+        self.key_rows[key] = row
+        if self.quantized is not None:
+            codes, scales = self.quantized
+            codes[row:row + 1], scales[row:row + 1] = quantize_rows(self.matrix[row:row + 1])
+        self.path = None
+
+    def remove(self, doc_id):
+        """Drop a passage vector; its row is reused by the next add"""
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+
+        self.own_arrays()
+        if self.key_rows.get(self.keys[row]) == row:
+            del self.key_rows[self.keys[row]]
+        self.active[row] = False
+        self.doc_ids[row] = None
+        self.keys[row] = None
+        self.free_rows.append(row)
+        self.path = None
+
+    def grow(self, capacity):
+        """Move the vectors into a larger in-memory matrix (also detaches a mapped file)"""
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self.count] = self.matrix[:self.count]
+        active = np.zeros(capacity, dtype=bool)
+        active[:len(self.active)] = self.active
+        self.matrix, self.active = matrix, active
+        if self.quantized is not None:
+            codes = np.zeros((capacity, self.dimensions), dtype=np.int8)
+            codes[:len(self.quantized[0])] = self.quantized[0]
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:len(self.quantized[1])] = self.quantized[1]
+            self.quantized = (codes, scales)
+
+    def search(self, query_vector, limit=3, quantized=False):
+        """Return the top (doc_id, cosine similarity) pairs for a unit query vector
+
+        Like BM25 hits with no matching term, passages pointing away from the
+        query (similarity <= 0) are not hits.
+        """
+        if not self.rows:
+            return []
+
+        count = self.count
+        query = np.asarray(query_vector, dtype=np.float32)
+        if quantized:
+            scores = self.approximate_scores(query, count)
+        else:
+            scores = self.matrix[:count] @ query
+        scores[~self.active[:count]] = -np.inf
+
+        if quantized:
+            candidates = top_rows(scores, min(len(self.rows), limit * QUANTIZED_OVERSAMPLE))
+            exact = self.matrix[candidates] @ query
+            order = np.argsort(-exact, kind='stable')[:limit]
+            rows, values = candidates[order], exact[order]
+        else:
+            rows = top_rows(scores, min(len(self.rows), limit))
+            values = scores[rows]
+        return [(self.doc_ids[row], float(value)) for row, value in zip(rows.tolist(), values.tolist()) if value > 0]
+
+    def approximate_scores(self, query, count):
+        """Cosine scores against the int8 copy, converted to float32 a block at a time"""
+        if self.quantized is None:
+            # Built on first use; published in one assignment since searches run concurrently
+            codes = np.zeros((len(self.matrix), self.dimensions), dtype=np.int8)
+            scales = np.zeros(len(self.matrix), dtype=np.float32)
+            codes[:count], scales[:count] = quantize_rows(self.matrix[:count])
+            self.quantized = (codes, scales)
+        codes, scales = self.quantized
+
+        scores = np.empty(count, dtype=np.float32)
+        block = np.empty((min(QUANTIZED_BLOCK_ROWS, count), self.dimensions), dtype=np.float32)
+        for start in range(0, count, QUANTIZED_BLOCK_ROWS):
+            stop = min(count, start + QUANTIZED_BLOCK_ROWS)
+            np.copyto(block[:stop - start], codes[start:stop])
+            np.dot(block[:stop - start], query, out=scores[start:stop])
+        scores *= scales[:count]
+        return scores
+
+    def save(self, path):
+        """Write the vectors to path atomically and serve them from a map of that file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.vectors-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                np.save(temp_file, np.ascontiguousarray(self.matrix[:self.count]))
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self.matrix = np.load(path, mmap_mode='c')
+        self.active = self.active[:self.count].copy()
+        if self.quantized is not None:
+            self.quantized = (self.quantized[0][:self.count].copy(), self.quantized[1][:self.count].copy())
+        self.path = path
+        self.shared = False
+
+    @property
+    def nbytes(self):
+        """Bytes of vector storage: the float32 matrix plus the int8 copy when built"""
+        total = self.matrix[:self.count].nbytes
+        if self.quantized is not None:
+            total += self.quantized[0][:self.count].nbytes + self.quantized[1][:self.count].nbytes
+        return total
+
+
+def quantize_rows(vectors):
+    """Symmetric per-row int8 codes and scales (vector ~ codes * scale)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    codes = np.rint(vectors / safe[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def top_rows(scores, k):
+    """Row indices of the k highest scores, best first"""
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        rows = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+    else:
+        rows = np.arange(len(scores))
+    rows = rows[np.argsort(-scores[rows], kind='stable')]
+    return rows[np.isfinite(scores[rows])]
+
+
+def fuse_hits(lexical_hits, dense_hits, dense_weight=0.5, limit=3):
+    """Blend BM25 and cosine hits into one ranking
+
+    Each list is scaled by its best score so the two are comparable, then
+    mixed as (1 - dense_weight) * lexical + dense_weight * dense; a passage
+    missing from one list scores 0 there.
+    """
+    scores = {}
+    for hits, weight in ((lexical_hits, 1.0 - dense_weight), (dense_hits, dense_weight)):
+        best = max((score for doc_id, score in hits), default=0.0)
+        if best <= 0:
+            continue
+        for doc_id, score in hits:
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight * max(score, 0.0) / best
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def vectors_path(snapshot_path, generation):
+    """Vector file saved alongside a snapshot generation"""
+    return f"{snapshot_path}.vectors-{generation}.npy"
+
+
+def prune_vector_files(snapshot_path, keep):
+    """Delete vector files of generations not in keep (processes still mapping them are unaffected)"""
+    keep_paths = {vectors_path(snapshot_path, generation) for generation in keep}
+    for path in glob.glob(f"{glob.escape(snapshot_path)}.vectors-*.npy"):
+        if path not in keep_paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass